@@ -0,0 +1,59 @@
+
+import asyncio, csv, pytest
+from sprake import aio, newick, profiling, style, treeviz
+
+NWK = 'examples/scer-x-skud.nwk'
+STYLE = 'examples/scer-x-skud.style'
+DATA = 'examples/scer-x-skud.csv'
+
+def read_data():
+    return {row['ID'] : row for row in csv.DictReader(open(DATA))}
+
+def render_directly(filename, mode, format):
+    tree = newick.parse_string(open(NWK).read())
+    (text_legend, dot_legend) = style.apply_rules(tree, style.parse_style(STYLE),
+                                                  read_data())
+    render = treeviz.render_tree if mode == 'tree' else treeviz.render_straight
+    render(filename, tree, dot_legend = dot_legend, text_legend = text_legend,
+           format = format)
+    return open(filename, 'rb').read()
+
+def test_render(tmp_path):
+    rules = style.parse_style(STYLE)
+    text = open(NWK).read()
+
+    async def main():
+        return await asyncio.gather(
+            aio.render_tree(text, rules = rules, data_by_id = read_data()),
+            aio.render_straight(text, format = 'PNG', rules = rules,
+                                data_by_id = read_data()),
+            aio.render(text, str(tmp_path / 'out.pdf'), 'PDF'))
+
+    (svg, png, nothing) = asyncio.run(main())
+    assert svg == render_directly(str(tmp_path / 'direct.svg'), 'tree', 'SVG')
+    assert png == render_directly(str(tmp_path / 'direct.png'), 'straight', 'PNG')
+    assert nothing is None
+    assert open(str(tmp_path / 'out.pdf'), 'rb').read().startswith(b'%PDF')
+
+def test_errors():
+    with pytest.raises(AssertionError):
+        asyncio.run(aio.render('nothing'))
+    with pytest.raises(AssertionError):
+        asyncio.run(aio.render('(A,B);', format = 'TILES'))
+
+def test_cancel_between_phases():
+    async def main():
+        loop = asyncio.get_running_loop()
+        # cancels the render as the layout ends, from the worker thread
+        def cancel(record):
+            if record['name'] == 'layout':
+                loop.call_soon_threadsafe(task.cancel)
+        profile = profiling.Profile(callback = cancel)
+        task = asyncio.ensure_future(aio.render(open(NWK).read(),
+                                                profile = profile))
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return profile
+
+    profile = asyncio.run(main())
+    assert [record['name'] for record in profile.phases] == ['parse', 'layout']
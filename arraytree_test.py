@@ -0,0 +1,100 @@
+
+import csv, os, pytest
+from sprake import arraytree, newick, style, treeviz
+
+STYLE = 'examples/scer-x-skud.style'
+DATA = 'examples/scer-x-skud.csv'
+NWK = 'examples/scer-x-skud.nwk'
+
+def test_basic():
+    tree = arraytree.parse_string('(A,B,(C,D)E)F;')
+    root = tree.get_root()
+    assert len(tree) == 6
+    assert root.get_label() == 'F'
+    assert root.get_parent() == None
+
+    (a, b, e) = root.get_children()
+    assert a.get_label() == 'A'
+    assert b.get_label() == 'B'
+    assert e.get_label() == 'E'
+    assert e.get_parent() == root
+    assert [n.get_label() for n in e.get_children()] == ['C', 'D']
+    assert [n.get_label() for n in root.get_leaves()] == ['A', 'B', 'C', 'D']
+    assert [n.get_label() for n in root.iter_postorder()] == ['A', 'B', 'C', 'D', 'E', 'F']
+
+def test_distances_and_bootstrap():
+    tree = arraytree.parse_string('((A:0.1,B:0.2)I2:0.3[76],C:0.4)I4:0.0[75];')
+    root = tree.get_root()
+    assert root.get_bootstrap() == 75
+    assert root.get_distance() == 0.0
+    (i2, c) = root.get_children()
+    assert i2.get_bootstrap() == 76
+    assert c.get_bootstrap() == None
+    assert abs(root.get_distance_height() - 0.5) < 0.0000001
+    assert root.get_height() == 2
+    assert root.get_leaf_count() == 3
+    assert i2.get_leaf_range() == (0, 1)
+    assert c.get_leaf_range() == (2, 2)
+
+def test_missing_distance():
+    root = arraytree.parse_string('((A:0.1,B:0.2):0.3,C);').get_root()
+    assert root.get_distance_height() == None
+    assert abs(root.get_children()[0].get_distance_height() - 0.5) < 0.0000001
+
+def test_radians_before_drawing():
+    root = arraytree.parse_string('((A:1,B:1):1,C:1);').get_root()
+    with pytest.raises(AssertionError, match = 'no radians'):
+        root.summarize_radians()
+
+    for (ix, leaf) in enumerate(root.get_leaves()):
+        leaf.radians = ix
+    root.summarize_radians()
+    assert root.get_radian_span() == (0, 2)
+    assert root.get_average_radians() == 1
+
+def test_same_as_newick_node():
+    data = open(NWK).read()
+    tree = newick.parse_string(data)
+    root = arraytree.parse_string(data).get_root()
+    converted = arraytree.from_tree(tree).get_root()
+
+    for other in (root, converted):
+        nodes = tree.get_all_nodes()
+        views = other.get_all_nodes()
+        assert len(nodes) == len(views)
+        for (node, view) in zip(nodes, views):
+            assert node.get_label() == view.get_label()
+            assert node.get_distance() == view.get_distance()
+            assert node.get_height() == view.get_height()
+            assert node.get_leaf_count() == view.get_leaf_count()
+            assert node.get_distance_height() == view.get_distance_height()
+
+def test_styles():
+    root = arraytree.parse_string('(A,B,(C,D));').get_root()
+    (a, b, parent) = root.get_children()
+    a.textcolor = style.WHITE
+    assert a.textcolor == style.WHITE
+    assert b.textcolor == style.BLACK
+
+    for child in parent.get_children():
+        child.linestroke = 2
+    root.upmerge_linestyle()
+    assert parent.linestroke == 2
+    assert root.linestroke == 1
+
+def test_render_same_as_newick_node(tmp_path):
+    rules = style.parse_style(STYLE)
+    data_by_id = {row['ID'] : row for row in csv.DictReader(open(DATA))}
+
+    outputs = []
+    for (name, tree) in [('nodes', newick.parse_string(open(NWK).read())),
+                         ('arrays', arraytree.parse_string(open(NWK).read()).get_root())]:
+        (text_legend, dot_legend) = style.apply_rules(tree, rules, data_by_id)
+        tree_file = os.path.join(tmp_path, name + '-tree.svg')
+        treeviz.render_tree(tree_file, tree, text_legend = text_legend,
+                            dot_legend = dot_legend)
+        straight_file = os.path.join(tmp_path, name + '-straight.svg')
+        treeviz.render_straight(straight_file, tree, text_legend = text_legend)
+        outputs.append((open(tree_file).read(), open(straight_file).read()))
+
+    assert outputs[0] == outputs[1]
@@ -0,0 +1,68 @@
+
+import os
+from sprake import batch
+
+NWK = 'examples/scer-x-skud.nwk'
+TREE = '((A:0.1,B:0.2):0.1,C:0.3);'
+
+def test_rename():
+    assert batch.rename('trees/x.nwk', 'PDF') == 'trees/x.pdf'
+    assert batch.rename('trees/x.nwk', 'SVG', 12) == 'trees/x-0012.svg'
+    assert batch.rename('trees.d/x', 'PNG') == 'trees.d/x.png'
+
+def test_manifest(tmp_path):
+    manifest = tmp_path / 'trees.txt'
+    manifest.write_text('# bootstraps\n\none.nwk\ntwo.nwk   out/two.svg\n')
+    assert batch.read_manifest(str(manifest)) == [
+        (str(tmp_path / 'one.nwk'), None),
+        (str(tmp_path / 'two.nwk'), str(tmp_path / 'out/two.svg')),
+    ]
+
+def test_jobs(tmp_path):
+    (tmp_path / 'single.nwk').write_text(TREE)
+    (tmp_path / 'multi.nwk').write_text(TREE + '\n' + TREE + '\n' + TREE + '\n')
+    filenames = batch.find_tree_files([str(tmp_path / '*.nwk'), 'missing.nwk'])
+    entries = [(filename, None) for filename in filenames]
+
+    jobs = list(batch.iter_jobs(entries, 'SVG'))
+    assert [os.path.basename(outfile or '') for (name, outfile, tree) in jobs] == [
+        'multi-0001.svg', 'multi-0002.svg', 'multi-0003.svg', 'single.svg', ''
+    ]
+    assert isinstance(jobs[-1][2], OSError)
+    assert jobs[0][2] == TREE
+
+def test_render_all(tmp_path):
+    (tmp_path / 'multi.nwk').write_text(TREE + TREE + '(A:x,B);')
+    entries = [(str(tmp_path / 'multi.nwk'), None)]
+    renderer = batch.BatchRenderer(
+        stylefile = 'examples/scer-x-skud.style',
+        datafile = 'examples/scer-x-skud.csv'
+    )
+    reported = []
+    results = renderer.render_all(batch.iter_jobs(entries, 'SVG'),
+                                  progress = lambda result, count: reported.append(count))
+    assert [error is None for (name, outfile, error) in results] == [True, True, False]
+    assert reported == [1, 2, 3]
+    assert os.path.exists(str(tmp_path / 'multi-0002.svg'))
+
+def test_parallel_matches_serial(tmp_path):
+    (tmp_path / 'multi.nwk').write_text(open(NWK).read() * 4 + '(A:x,B);')
+    entries = [(str(tmp_path / 'multi.nwk'), None)]
+    settings = {
+        'stylefile' : 'examples/scer-x-skud.style',
+        'datafile' : 'examples/scer-x-skud.csv',
+    }
+
+    serial = batch.BatchRenderer(**settings).render_all(
+        batch.iter_jobs(entries, 'SVG'), formats = ['SVG', 'PDF'])
+    svg = open(str(tmp_path / 'multi-0003.svg')).read()
+    os.remove(str(tmp_path / 'multi-0003.svg'))
+
+    parallel = batch.render_parallel(batch.iter_jobs(entries, 'SVG'),
+                                     workers = 3, formats = ['SVG', 'PDF'],
+                                     **settings)
+    assert parallel == serial
+    assert len(parallel) == 10
+    assert [error is None for (name, outfile, error) in parallel] == [True] * 8 + [False] * 2
+    assert os.path.exists(str(tmp_path / 'multi-0004.pdf'))
+    assert open(str(tmp_path / 'multi-0003.svg')).read() == svg
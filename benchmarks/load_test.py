@@ -0,0 +1,133 @@
+'''
+Load test for the render server: several clients sending render
+requests at once, reporting the throughput and the latencies.
+
+  python -m benchmarks.load_test [--url URL | --socket PATH] [options]
+
+Without --url or --socket, a server is started in this process, with a
+style and metadata for the generated trees, named "bench". The trees
+are generated by treegen; --trees of them are sent in turn, so that the
+server sees trees it has rendered before, like a dashboard would.
+'''
+
+import argparse, sys, tempfile, threading, time
+from sprake import client, server
+from benchmarks import treegen
+
+STYLE_NAME = 'bench'
+
+def run_clients(make_client, trees, clients, requests, format, mode, stylename):
+    '''Sends requests from each of the clients, in threads. Returns a list
+    of (seconds, error) per request, where error is None, or the HTTP
+    status or exception name.'''
+    results = []
+    lock = threading.Lock()
+
+    def work(number):
+        renderer = make_client()
+        try:
+            for ix in range(requests):
+                data = trees[(number + ix) % len(trees)]
+                start = time.perf_counter()
+                error = None
+                try:
+                    renderer.render(data, format, mode, stylename)
+                except client.ServerError as e:
+                    error = e.status
+                except Exception as e:
+                    error = type(e).__name__
+                with lock:
+                    results.append((time.perf_counter() - start, error))
+        finally:
+            renderer.close()
+
+    threads = [threading.Thread(target = work, args = (number, ))
+               for number in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def report(results, seconds, out = sys.stdout):
+    times = sorted(elapsed for (elapsed, error) in results if error is None)
+    errors = {}
+    for (elapsed, error) in results:
+        if error is not None:
+            errors[error] = errors.get(error, 0) + 1
+
+    out.write('%s requests in %.2fs, %.1f/s, %s failed\n' %
+              (len(results), seconds, len(results) / max(seconds, 1e-9),
+               len(results) - len(times)))
+    if times:
+        out.write('latency: p50 %.3fs, p90 %.3fs, p99 %.3fs, max %.3fs\n' %
+                  (percentile(times, 50), percentile(times, 90),
+                   percentile(times, 99), times[-1]))
+    for (error, count) in sorted(errors.items(), key = str):
+        out.write('  %s: %s\n' % (error, count))
+
+def percentile(values, percent):
+    'The percentile of the sorted values, by the nearest rank.'
+    rank = int(round(percent / 100.0 * (len(values) - 1)))
+    return values[rank]
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = 'python -m benchmarks.load_test')
+    parser.add_argument('--url', help = 'a running server, like http://127.0.0.1:8123')
+    parser.add_argument('--socket', metavar = 'PATH',
+                        help = 'a running server on a Unix socket')
+    parser.add_argument('--style', help = 'the style to ask the running server for')
+    parser.add_argument('--clients', type = int, default = 8)
+    parser.add_argument('--requests', type = int, default = 10,
+                        help = 'requests per client')
+    parser.add_argument('--trees', type = int, default = 4,
+                        help = 'number of different trees')
+    parser.add_argument('--leaves', type = int, default = 500)
+    parser.add_argument('--shape', default = 'coalescent',
+                        choices = sorted(treegen.SHAPES))
+    parser.add_argument('--format', default = 'SVG')
+    parser.add_argument('--mode', default = 'tree')
+    parser.add_argument('--workers', type = int, default = 0,
+                        help = 'workers of the local server (0: one per core)')
+    parser.add_argument('--queue', type = int,
+                        help = 'queue of the local server')
+    args = parser.parse_args(argv)
+
+    trees = [treegen.SHAPES[args.shape](args.leaves, seed)
+             for seed in range(args.trees)]
+    local = None
+    stylename = args.style
+    with tempfile.TemporaryDirectory() as directory:
+        if args.url or args.socket:
+            make_client = lambda: client.RenderClient(args.url or '',
+                                                      socket_path = args.socket)
+        else:
+            (stylefile, datafile) = ('%s/bench.style' % directory,
+                                     '%s/bench.csv' % directory)
+            treegen.write_style(stylefile)
+            treegen.write_csv(datafile, args.leaves)
+            local = server.RenderServer(('127.0.0.1', 0),
+                                        workers = args.workers,
+                                        queue = args.queue,
+                                        styles = {STYLE_NAME : stylefile},
+                                        data = {STYLE_NAME : datafile})
+            local.start()
+            url = 'http://%s:%s' % local.server_address[ : 2]
+            make_client = lambda: client.RenderClient(url)
+            stylename = STYLE_NAME
+            sys.stderr.write('Started a server at %s with %s workers\n' %
+                             (url, local.workers))
+
+        try:
+            start = time.perf_counter()
+            results = run_clients(make_client, trees, args.clients,
+                                  args.requests, args.format, args.mode,
+                                  stylename)
+            report(results, time.perf_counter() - start)
+        finally:
+            if local:
+                local.shutdown()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
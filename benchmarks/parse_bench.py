@@ -0,0 +1,26 @@
+'''
+Compares the tokenizing Newick parser with the old character scanner.
+
+  python -m benchmarks.parse_bench [leaves ...]
+'''
+
+import sys, time
+from sprake import newick
+from benchmarks import reference, treegen
+
+def timed(parser, data):
+    start = time.perf_counter()
+    parser(data)
+    return time.perf_counter() - start
+
+def run(sizes):
+    print('%10s %10s %10s %10s %8s' % ('leaves', 'MB', 'naive', 'tokens', 'speedup'))
+    for leaves in sizes:
+        data = treegen.balanced_newick(leaves)
+        naive = timed(reference.parse_string_naive, data)
+        tokens = timed(newick.parse_string, data)
+        print('%10s %10.1f %9.2fs %9.2fs %7.1fx' %
+              (leaves, len(data) / 1000000.0, naive, tokens, naive / tokens))
+
+if __name__ == '__main__':
+    run([int(size) for size in sys.argv[1 : ]] or [100000, 1000000])
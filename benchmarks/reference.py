@@ -0,0 +1,86 @@
+'''
+Reference implementations that sprake has replaced with faster ones,
+kept for the benchmarks to compare with, and for the tests to check
+that the results are the same.
+'''
+
+from sprake import newick, style
+
+def parse_string_naive(data):
+    'The original Newick parser, scanning one character at a time.'
+    pos = 0
+    root = None
+    current = None
+    while data[pos] != ';':
+        if data[pos] == '(':
+            node = newick.NewickNode(current)
+            if current:
+                current.add_child(node)
+            current = node
+            if not root:
+                root = node
+            pos += 1
+
+        elif data[pos] == ')':
+            pos += 1
+
+            ix = newick.scan_while_not(data, pos, ':,);')
+            if ix != pos: # there was a label
+                current.set_label(data[pos : ix])
+                pos = ix
+
+            if data[pos] == ':':
+                ix = newick.scan_while_not(data, pos, ',);[')
+
+                if data[ix] == '[':
+                    ix2 = newick.scan_while_not(data, ix+1, ']')
+                    current.set_bootstrap(int(data[ix + 1 : ix2]))
+
+                current.set_distance(float(data[pos+1 : ix]))
+                # print float(data[pos+1 : ix]), current.get_label(), current
+
+                if data[ix] == '[':
+                    pos = ix2 + 1
+                else:
+                    pos = ix
+
+                if pos < len(data) and data[pos] == ',':
+                    pos += 1
+
+            current = current.get_parent()
+
+        elif data[pos] == ',':
+            pos += 1
+
+        else:
+            ix = newick.scan_while_not(data, pos, ':,)')
+            if data[ix] == ':':
+                label = data[pos : ix] or None
+                pos = ix + 1
+                ix = newick.scan_while_not(data, pos, ',)')
+                distance = float(data[pos : ix])
+            else:
+                label = data[pos : ix] or None
+                distance = None
+
+            pos = ix
+            node = newick.NewickNode(current, label, distance)
+            current.add_child(node)
+
+            if data[pos] == ',':
+                pos += 1
+
+            # pos now on either '(', ')' or a label
+
+    return root
+
+def apply_rules_naive(tree, rules, data_by_id):
+    'The original style engine, trying every rule on every node.'
+    for node in tree.iter_preorder():
+        data = data_by_id.get(node.get_label())
+        for rule in rules:
+            if rule.matches(data):
+                rule.update(node, data)
+
+    tree.upmerge_linestyle()
+    return style.get_legends(rules)
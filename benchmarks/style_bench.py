@@ -0,0 +1,37 @@
+'''
+Compares the indexed style engine with the old one, which tries every
+rule on every node.
+
+  python -m benchmarks.style_bench [leaves [rules]]
+'''
+
+import csv, os, sys, tempfile, time
+from sprake import newick, style
+from benchmarks import reference, treegen
+
+def timed(engine, data, rules, data_by_id):
+    tree = newick.parse_string(data)
+    start = time.perf_counter()
+    engine(tree, rules, data_by_id)
+    return time.perf_counter() - start
+
+def run(leaves, rule_count):
+    data = treegen.balanced_newick(leaves)
+    with tempfile.TemporaryDirectory() as directory:
+        (datafile, stylefile) = (os.path.join(directory, 'bench.csv'),
+                                 os.path.join(directory, 'bench.style'))
+        treegen.write_csv(datafile, leaves)
+        treegen.write_style(stylefile, rule_count)
+        rules = style.parse_style(stylefile)
+        with open(datafile) as inf:
+            data_by_id = {row['ID'] : row for row in csv.DictReader(inf)}
+
+    naive = timed(reference.apply_rules_naive, data, rules, data_by_id)
+    indexed = timed(style.apply_rules, data, rules, data_by_id)
+    print('%10s %6s %9s %9s %8s' % ('leaves', 'rules', 'naive', 'indexed', 'speedup'))
+    print('%10s %6s %8.2fs %8.2fs %7.1fx' %
+          (leaves, rule_count, naive, indexed, naive / indexed))
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1 : ]]
+    run(*(args + [100000, 200][len(args) : ]))
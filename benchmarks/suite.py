@@ -0,0 +1,236 @@
+'''
+Benchmark suite: times parsing, styling and rendering on generated
+trees of each shape and size, and writes the results as JSON, so that
+runs (say, before and after a release) can be compared.
+
+  python -m benchmarks.suite --sizes 100,1000,10000 --output new.json
+  python -m benchmarks.suite --compare old.json new.json
+
+Each benchmark is run --repeat times and the fastest time is kept. The
+peak memory is measured in one more run, under tracemalloc, which slows
+it down too much to time it. tracemalloc sees only the memory Python
+allocates, so the pixels of PNG images are left out.
+'''
+
+import argparse, datetime, json, os, platform, sys, tempfile, time, tracemalloc
+from sprake import newick, style, treeviz, metadata
+from benchmarks import treegen
+
+BENCHMARKS = ['parse', 'style', 'render_tree', 'render_straight']
+
+FORMATS = ['SVG', 'PDF', 'PNG']
+
+# the most leaves rendered in each format. PNG holds the whole picture in
+# memory, and a radial tree of 10000 leaves is some 35000 pixels wide
+MAX_LEAVES = {'PNG' : 2000}
+
+# a benchmark this much slower than before is reported as a regression
+THRESHOLD = 0.1
+
+RESULTS_VERSION = 1
+
+class Fixture:
+    'A generated tree, with its Newick text, metadata and style files.'
+
+    def __init__(self, directory, shape, leaves, seed = 0):
+        self.shape = shape
+        self.leaves = leaves
+        self.newick = treegen.SHAPES[shape](leaves, seed)
+        self.datafile = os.path.join(directory, '%s-%s.csv' % (shape, leaves))
+        self.stylefile = os.path.join(directory, '%s-%s.style' % (shape, leaves))
+        treegen.write_csv(self.datafile, leaves, seed)
+        treegen.write_style(self.stylefile, seed = seed)
+        self.rules = style.parse_style(self.stylefile)
+        self.data_by_id = metadata.Metadata(self.datafile,
+                                            fields = style.get_data_fields(self.rules))
+        len(self.data_by_id) # read it now, not while timing
+
+    def parse(self):
+        return newick.parse_string(self.newick)
+
+    def styled(self):
+        'A parsed tree with the rules applied, and the legends.'
+        tree = self.parse()
+        legends = style.apply_rules(tree, self.rules, self.data_by_id)
+        return (tree, legends)
+
+def get_benchmarks(fixture, names, formats, directory):
+    '''Yields (name, format, setup, run) for each benchmark on the
+    fixture. setup() returns the arguments for run, and is not timed.'''
+    if 'parse' in names:
+        yield ('parse', None, lambda: (fixture.newick, ), newick.parse_string)
+    if 'style' in names:
+        apply = lambda tree: style.apply_rules(tree, fixture.rules,
+                                               fixture.data_by_id)
+        yield ('style', None, lambda: (fixture.parse(), ), apply)
+
+    renders = [('render_tree', treeviz.render_tree),
+               ('render_straight', treeviz.render_straight)]
+    for (name, render) in renders:
+        if name not in names:
+            continue
+        for format in formats:
+            if fixture.leaves > MAX_LEAVES.get(format, fixture.leaves):
+                continue
+            outfile = os.path.join(directory, '%s.%s' % (name, format.lower()))
+            yield (name, format, fixture.styled,
+                   _get_render(render, outfile, format))
+
+def _get_render(render, outfile, format):
+    def run(tree, legends):
+        (text_legend, dot_legend) = legends
+        render(outfile, tree, dot_legend = dot_legend,
+               text_legend = text_legend, format = format)
+    return run
+
+def measure(setup, run, repeat = 3, memory = True):
+    '''Returns (the fastest time of repeat runs, in seconds, and the peak
+    memory of one run, in bytes, or None).'''
+    times = []
+    for ix in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        run(*args)
+        times.append(time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        args = setup()
+        tracemalloc.start()
+        try:
+            run(*args)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return (min(times), peak)
+
+def run_suite(shapes, sizes, names = BENCHMARKS, formats = FORMATS,
+              repeat = 3, memory = True, seed = 0, progress = None):
+    'Returns the results, as written by write_results.'
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for shape in shapes:
+            for leaves in sizes:
+                fixture = Fixture(directory, shape, leaves, seed)
+                for (name, format, setup, run) in get_benchmarks(
+                        fixture, names, formats, directory):
+                    (seconds, peak) = measure(setup, run, repeat, memory)
+                    result = {'shape' : shape, 'leaves' : leaves,
+                              'benchmark' : name, 'format' : format,
+                              'seconds' : seconds, 'peak_bytes' : peak}
+                    results.append(result)
+                    if progress:
+                        progress.write(format_result(result) + '\n')
+                        progress.flush()
+    return {'version' : RESULTS_VERSION,
+            'environment' : get_environment(repeat, seed),
+            'results' : results}
+
+def get_environment(repeat, seed):
+    return {'python' : platform.python_version(),
+            'implementation' : platform.python_implementation(),
+            'platform' : platform.platform(),
+            'processor' : platform.processor() or platform.machine(),
+            'date' : datetime.datetime.now().isoformat(timespec = 'seconds'),
+            'repeat' : repeat, 'seed' : seed}
+
+def write_results(results, filename):
+    with open(filename, 'w') as outf:
+        json.dump(results, outf, indent = 2)
+
+def read_results(filename):
+    with open(filename) as inf:
+        results = json.load(inf)
+    assert results.get('version') == RESULTS_VERSION, \
+           'Unknown results version in "%s"' % filename
+    return results
+
+def format_result(result):
+    peak = result['peak_bytes']
+    return '%-12s %8s %-16s %-4s %9.3fs %10s' % (
+        result['shape'], result['leaves'], result['benchmark'],
+        result['format'] or '', result['seconds'],
+        '' if peak is None else '%.1f MB' % (peak / 1000000.0))
+
+# ===========================================================================
+# COMPARING RUNS
+
+def get_key(result):
+    return (result['shape'], result['leaves'], result['benchmark'],
+            result['format'] or '')
+
+def compare(old, new, threshold = THRESHOLD):
+    '''Matches the benchmarks in two results. Returns a list of (key, old
+    result, new result, time ratio, is a regression), in the order of
+    new, for the benchmarks in both.'''
+    old_by_key = {get_key(result) : result for result in old['results']}
+    rows = []
+    for result in new['results']:
+        before = old_by_key.get(get_key(result))
+        if before is None:
+            continue
+        ratio = result['seconds'] / max(before['seconds'], 1e-9)
+        rows.append((get_key(result), before, result, ratio,
+                     ratio > 1 + threshold))
+    return rows
+
+def print_comparison(rows, out = sys.stdout):
+    out.write('%-12s %8s %-16s %-4s %10s %10s %7s %9s\n' %
+              ('shape', 'leaves', 'benchmark', 'fmt', 'old', 'new', 'ratio',
+               'memory'))
+    for (key, before, after, ratio, regression) in rows:
+        memory = ''
+        if before['peak_bytes'] and after['peak_bytes'] is not None:
+            memory = '%.2fx' % (after['peak_bytes'] / float(before['peak_bytes']))
+        out.write('%-12s %8s %-16s %-4s %9.3fs %9.3fs %6.2fx %9s%s\n' %
+                  (key + (before['seconds'], after['seconds'], ratio, memory,
+                          '  SLOWER' if regression else '')))
+
+# ===========================================================================
+# COMMAND LINE
+
+def _split(text):
+    return [part.strip() for part in text.split(',') if part.strip()]
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = 'python -m benchmarks.suite')
+    parser.add_argument('--shapes', default = ','.join(sorted(treegen.SHAPES)))
+    parser.add_argument('--sizes', default = '100,1000,10000',
+                        help = 'numbers of leaves, up to 1000000')
+    parser.add_argument('--benchmarks', default = ','.join(BENCHMARKS))
+    parser.add_argument('--formats', default = ','.join(FORMATS))
+    parser.add_argument('--repeat', type = int, default = 3)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--no-memory', action = 'store_true',
+                        help = 'skip the tracemalloc run')
+    parser.add_argument('--output', help = 'write the results to this JSON file')
+    parser.add_argument('--compare', nargs = 2, metavar = ('OLD', 'NEW'),
+                        help = 'compare two results files instead of running')
+    parser.add_argument('--threshold', type = float, default = THRESHOLD * 100,
+                        help = 'percent slower that counts as a regression')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        rows = compare(read_results(args.compare[0]),
+                       read_results(args.compare[1]), args.threshold / 100.0)
+        print_comparison(rows)
+        return 1 if any(row[4] for row in rows) else 0
+
+    shapes = _split(args.shapes)
+    for shape in shapes:
+        if shape not in treegen.SHAPES:
+            parser.error('unknown shape "%s"' % shape)
+    names = _split(args.benchmarks)
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error('unknown benchmark "%s"' % name)
+
+    results = run_suite(shapes, [int(size) for size in _split(args.sizes)],
+                        names, _split(args.formats), args.repeat,
+                        not args.no_memory, args.seed, progress = sys.stderr)
+    if args.output:
+        write_results(results, args.output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
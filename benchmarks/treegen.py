@@ -0,0 +1,108 @@
+'''
+Generators for synthetic trees in Newick format, for the benchmarks, and
+for metadata tables and style files to go with them. Everything is
+seeded, so the same arguments give the same output.
+
+The shapes are the extremes that matter for performance: balanced trees
+are shallow, caterpillars are as deep as they have leaves, and random
+coalescent trees are in between, like real ones.
+'''
+
+import random
+from sprake import style
+
+# the metadata columns, and the number of values in each
+FIELDS = [('Clade', 8), ('Source', 20), ('Country', 50), ('Year', 30)]
+
+def get_labels(leaves):
+    'The leaf labels of the generated trees, in order.'
+    return ['Saccharomyces_%07d' % ix for ix in range(leaves)]
+
+def balanced_newick(leaves, seed = 0):
+    'A roughly balanced binary tree with random branch lengths.'
+    rand = random.Random(seed)
+    labels = get_labels(leaves)
+
+    # build bottom-up by pairing neighbours, so no recursion is needed
+    level = ['%s:%s' % (label, _length(rand)) for label in labels]
+    while len(level) > 1:
+        paired = []
+        for ix in range(0, len(level) - 1, 2):
+            paired.append('(%s,%s):%s' % (level[ix], level[ix + 1], _length(rand)))
+        if len(level) % 2:
+            paired.append(level[-1])
+        level = paired
+
+    return level[0] + ';'
+
+def caterpillar_newick(leaves, seed = 0):
+    '''A caterpillar: each inner node has a leaf and the rest of the tree
+    as children, so the depth is the number of leaves.'''
+    rand = random.Random(seed)
+    labels = get_labels(leaves)
+    parts = ['(' * (leaves - 1), '%s:%s' % (labels[0], _length(rand))]
+    for label in labels[1 : ]:
+        parts.append(',%s:%s):%s' % (label, _length(rand), _length(rand)))
+    return ''.join(parts) + ';'
+
+def coalescent_newick(leaves, seed = 0):
+    '''A random tree from the Kingman coalescent: going back in time, two
+    lineages picked at random merge, sooner when there are many.'''
+    rand = random.Random(seed)
+    lineages = [(label, 0.0) for label in get_labels(leaves)] # (text, time)
+    time = 0.0
+    while len(lineages) > 1:
+        count = len(lineages)
+        time += rand.expovariate(count * (count - 1) / 2.0)
+        first = rand.randrange(count)
+        second = rand.randrange(count - 1)
+        if second >= first:
+            second += 1
+        merged = '(%s:%s,%s:%s)' % (
+            lineages[first][0], round(time - lineages[first][1], 6),
+            lineages[second][0], round(time - lineages[second][1], 6))
+
+        # remove the two by swapping in the last ones
+        (low, high) = sorted((first, second))
+        lineages[high] = lineages[-1]
+        lineages.pop()
+        lineages[low] = (merged, time)
+    return lineages[0][0] + ';'
+
+# shape -> generator
+SHAPES = {
+    'balanced' : balanced_newick,
+    'caterpillar' : caterpillar_newick,
+    'coalescent' : coalescent_newick,
+}
+
+def write_csv(filename, leaves, seed = 0):
+    'A metadata table for the leaves, with an ID and the FIELDS.'
+    rand = random.Random(seed)
+    with open(filename, 'w') as outf:
+        outf.write(','.join(['ID'] + [field for (field, values) in FIELDS]))
+        outf.write('\n')
+        for label in get_labels(leaves):
+            outf.write(','.join([label] + ['%s%s' % (field.lower(),
+                                                     rand.randrange(values))
+                                           for (field, values) in FIELDS]))
+            outf.write('\n')
+
+def write_style(filename, rules = 20, seed = 0):
+    '''A style file for the tables from write_csv, with a line width for
+    everything and about the given number of rules on the FIELDS.'''
+    rand = random.Random(seed)
+    lines = ['*, linewidth=1']
+    for ix in range(rules - 1):
+        (field, values) = FIELDS[ix % len(FIELDS)]
+        prop = ['textcolor', 'linecolor', 'dotcolor'][ix // len(FIELDS) % 3]
+        color = style.Color(rand.randrange(256), rand.randrange(256),
+                            rand.randrange(256))
+        lines.append('%s=%s%s, %s=%s' % (field, field.lower(),
+                                         rand.randrange(values), prop,
+                                         color.to_html_rgb()))
+    with open(filename, 'w') as outf:
+        outf.write('\n'.join(lines) + '\n')
+
+def _length(rand):
+    return round(rand.random() * 0.1, 6)
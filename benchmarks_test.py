@@ -0,0 +1,59 @@
+
+from sprake import newick, style, metadata
+from benchmarks import suite, treegen
+
+def get_depth(tree):
+    depth = 0
+    stack = [(tree, 0)]
+    while stack:
+        (node, level) = stack.pop()
+        depth = max(depth, level)
+        stack.extend((child, level + 1) for child in node.get_children())
+    return depth
+
+def test_shapes():
+    for (shape, generate) in treegen.SHAPES.items():
+        text = generate(300, seed = 1)
+        assert text == generate(300, seed = 1)
+        tree = newick.parse_string(text)
+        leaves = [node.get_label() for node in tree.iter_preorder()
+                  if not node.has_children()]
+        assert sorted(leaves) == treegen.get_labels(300), shape
+        assert all(len(node.get_children()) == 2 for node in tree.iter_preorder()
+                   if node.has_children()), shape
+
+    assert get_depth(newick.parse_string(treegen.caterpillar_newick(300))) == 299
+    assert get_depth(newick.parse_string(treegen.balanced_newick(256))) == 8
+
+def test_fixtures(tmp_path):
+    (datafile, stylefile) = (str(tmp_path / 'data.csv'), str(tmp_path / 'tree.style'))
+    treegen.write_csv(datafile, 50)
+    treegen.write_style(stylefile, rules = 10)
+    rules = style.parse_style(stylefile)
+    assert len(rules) == 10
+
+    tree = newick.parse_string(treegen.balanced_newick(50))
+    data_by_id = metadata.Metadata(datafile)
+    assert len(data_by_id) == 50
+    style.apply_rules(tree, rules, data_by_id)
+    # the rules match some of the leaves
+    assert any(node.textcolor != style.BLACK for node in tree.iter_preorder())
+
+def test_suite_and_compare(tmp_path):
+    results = suite.run_suite(['balanced', 'caterpillar'], [20],
+                              formats = ['SVG'], repeat = 1)
+    keys = [suite.get_key(result) for result in results['results']]
+    assert keys[ : 4] == [('balanced', 20, 'parse', ''),
+                          ('balanced', 20, 'style', ''),
+                          ('balanced', 20, 'render_tree', 'SVG'),
+                          ('balanced', 20, 'render_straight', 'SVG')]
+    assert len(keys) == 8
+    assert all(result['peak_bytes'] > 0 for result in results['results'])
+
+    filename = str(tmp_path / 'results.json')
+    suite.write_results(results, filename)
+    old = suite.read_results(filename)
+    results['results'][0]['seconds'] *= 2 # parsing the balanced tree
+    rows = suite.compare(old, results)
+    assert len(rows) == 8
+    assert [row[0] for row in rows if row[4]] == [('balanced', 20, 'parse', '')]
@@ -0,0 +1,78 @@
+
+import pickle
+from sprake import displaylist, layout, newick, style, treeviz
+from sprake.displaylist import DisplayList, simplify, batch_by_style
+from sprake.draw_svg import SVGDrawer
+
+NWK = 'examples/scer-x-skud.nwk'
+
+class CallLog:
+    'A drawer that remembers the calls made on it.'
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+def test_replay_keeps_ints():
+    display = DisplayList()
+    display.create(100, 200)
+    display.line((0, 0.5), (10, 0.5), stroke = 2, dash = True)
+    display.draw_text((5, 6), 'label', 45.5, style.WHITE)
+
+    log = CallLog()
+    display.replay(log)
+    assert log.calls == [
+        ('create', (100, 200), {}),
+        ('line', ((0, 0.5), (10, 0.5)),
+         {'color' : style.BLACK, 'stroke' : 2, 'dash' : True}),
+        ('draw_text', ((5, 6), 'label', 45.5, style.WHITE), {}),
+    ]
+    assert type(log.calls[1][1][0][0]) is int
+    assert display.count_ops() == {'CREATE' : 1, 'LINE' : 1, 'TEXT' : 1}
+
+def test_simplify():
+    display = DisplayList()
+    display.owner = 1
+    display.line((0, 0), (10, 0))
+    display.line((10, 0), (20, 0))
+    display.line((20, 0), (20, 0)) # empty
+    display.line((20, 0), (30, 0))
+    display.line((30, 0), (40, 5)) # other direction
+    display.owner = 2
+    display.line((40, 5), (50, 10)) # other owner
+    display.circle_segment(0, 0, 1.0, 1.0, 5) # empty
+
+    simplified = simplify(display)
+    assert len(simplified) == 3
+    assert simplified.get_args(0) == [0, 0, 30, 0, 1]
+    assert list(simplified.owners) == [1, 1, 2]
+
+def test_batch_by_style():
+    display = DisplayList()
+    display.create(10, 10)
+    display.line((0, 0), (1, 1), color = style.WHITE)
+    display.line((1, 1), (2, 2))
+    display.line((2, 2), (3, 3), color = style.WHITE)
+
+    batched = batch_by_style(display)
+    assert batched.ops[0] == displaylist.CREATE
+    assert [batched.get_color(ix) for ix in range(1, 4)] == \
+        [style.WHITE, style.WHITE, style.BLACK]
+
+def test_pickle_and_replay_matches_direct(tmp_path):
+    tree = newick.parse_string(open(NWK).read())
+    direct = str(tmp_path / 'direct.svg')
+    treeviz.render_tree(direct, tree)
+
+    tree = newick.parse_string(open(NWK).read())
+    drawer = SVGDrawer(str(tmp_path / 'replayed.svg'), treeviz.FONT_SIZE)
+    radial = layout.radial_layout(tree, drawer)
+    display = treeviz.build_radial(radial, tree, drawer)
+    assert set(display.owners) == set(range(-1, len(tree.get_all_nodes())))
+
+    display = pickle.loads(pickle.dumps(display))
+    display.replay(drawer)
+    drawer.save()
+    assert open(str(tmp_path / 'replayed.svg')).read() == open(direct).read()
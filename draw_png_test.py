@@ -0,0 +1,54 @@
+
+from sprake import style, draw_png
+from sprake.draw_png import PNGDrawer
+
+from PIL import Image
+
+def test_rgb_tuple():
+    assert style.Color(1, 2, 3).to_rgb_tuple() == (1, 2, 3)
+
+def test_shapes(tmp_path):
+    filename = str(tmp_path / 'out.png')
+    drawer = PNGDrawer(filename, 12)
+    drawer.create(100, 200)
+    drawer.line((0, 10), (200, 10), color = style.Color(255, 0, 0))
+    drawer.circle_segment(100, 50, 0, 3.14159, 40,
+                          color = style.Color(0, 0, 255), stroke = 3)
+    drawer.save()
+
+    image = Image.open(filename).convert('RGB')
+    assert image.size == (200, 100) # width, height
+    assert image.getpixel((100, 10)) == (255, 0, 0)
+    assert image.getpixel((100, 90)) == (0, 0, 255) # bottom of the arc
+    assert image.getpixel((100, 50)) == (255, 255, 255)
+
+def test_scale(tmp_path):
+    filename = str(tmp_path / 'out.png')
+    drawer = PNGDrawer(filename, 12, scale = 2)
+    drawer.create(100, 200)
+    drawer.line((0, 10), (200, 10), stroke = 4)
+    drawer.save()
+
+    image = Image.open(filename).convert('RGB')
+    assert image.size == (200, 100)
+    assert max(image.getpixel((100, 10))) < 32
+
+def test_glyphs_reused(tmp_path):
+    draw_png.GLYPHS.clear()
+    (rendered, cached) = draw_png.GLYPHS.get_stats()
+    drawer = PNGDrawer(str(tmp_path / 'out.png'), 12)
+    drawer.create(100, 100)
+    drawer.draw_text((10, 50), 'Label', 45, style.Color(255, 0, 0))
+    drawer.draw_text((50, 50), 'Label', 45.2, style.Color(0, 255, 0))
+    drawer.draw_text((50, 50), 'Label', 0)
+    assert len(draw_png.GLYPHS) == 2
+    assert draw_png.GLYPHS.get_stats() == (rendered + 2, cached + 1)
+
+def test_text_anchor(tmp_path):
+    drawer = PNGDrawer(str(tmp_path / 'out.png'), 20)
+    drawer.create(200, 200)
+    drawer.draw_text((100, 100), 'MMMM', 90)
+    (mask, (dx, dy)) = draw_png.GLYPHS.get_glyph(drawer._drawfont, 'MMMM', 90)
+    # rotated counterclockwise, the text goes up from the anchor
+    assert mask.height > mask.width
+    assert 0 <= dx <= mask.width and dy > mask.height / 2
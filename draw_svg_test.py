@@ -0,0 +1,76 @@
+
+import gzip, os
+import xml.etree.ElementTree as ET
+from sprake import newick, style, treeviz
+from sprake.draw_svg import CompactSVGDrawer, num
+
+NWK = 'examples/scer-x-skud.nwk'
+SVG = '{http://www.w3.org/2000/svg}'
+
+def test_num():
+    assert num(12) == '12'
+    assert num(12.0) == '12'
+    assert num(12.125) == '12.12'
+    assert num(0.5) == '0.5'
+    assert num(-0.001) == '0'
+
+def test_merged_path(tmp_path):
+    filename = str(tmp_path / 'out.svg')
+    drawer = CompactSVGDrawer(filename, 12)
+    drawer.create(100, 100)
+    drawer.line((0, 0), (10, 0))
+    drawer.line((10, 0), (10, 10))
+    drawer.line((20, 20), (30, 30))
+    drawer.line((30, 30), (40, 40), color = style.WHITE)
+    drawer.draw_text((5, 5), 'A')
+    drawer.save()
+
+    root = ET.parse(filename).getroot()
+    paths = root.findall(SVG + 'path')
+    assert len(paths) == 2
+    assert paths[0].get('d') == 'M0 0L10 0L10 10M20 20L30 30'
+    assert paths[0].get('class') != paths[1].get('class')
+    assert root.find(SVG + 'text').get('transform') == None
+
+def test_compact_render(tmp_path):
+    sizes = []
+    for compact in (False, True):
+        filename = str(tmp_path / ('%s.svg' % compact))
+        tree = newick.parse_string(open(NWK).read())
+        treeviz.render_tree(filename, tree, drawer_options = {'compact' : compact})
+        root = ET.parse(filename).getroot() # must be well-formed
+        sizes.append(os.path.getsize(filename))
+
+        texts = root.findall(SVG + 'text')
+        assert len(texts) == len(tree.get_leaves())
+
+    assert sizes[1] < sizes[0]
+
+def test_compact_banner():
+    tree = newick.parse_string(open(NWK).read())
+    leaves = tree.get_leaves()
+    data = treeviz.render_tree(None, tree,
+                               banners = [(leaves[0], leaves[2], 'T', style.BLACK)],
+                               drawer_options = {'compact' : True})
+    root = ET.fromstring(data) # the banner must be inside the <svg>
+    curve = root.find(SVG + 'text/' + SVG + 'textPath').get('href')[1 : ]
+    assert [path for path in root.findall(SVG + 'path')
+            if path.get('id') == curve]
+
+def test_svgz(tmp_path):
+    plain = str(tmp_path / 'out.svg')
+    tree = newick.parse_string(open(NWK).read())
+    treeviz.render_tree(plain, tree)
+    for compact in (False, True):
+        filename = str(tmp_path / ('%s.svgz' % compact))
+        tree = newick.parse_string(open(NWK).read())
+        treeviz.render_tree(filename, tree, format = 'SVGZ', drawer_options = {
+            'compact' : compact, 'compresslevel' : 9
+        })
+        with gzip.open(filename, 'rt', encoding = 'utf-8') as inf:
+            root = ET.fromstring(inf.read())
+        assert root.tag == SVG + 'svg'
+        assert os.path.getsize(filename) < os.path.getsize(plain) / 3
+
+    with gzip.open(str(tmp_path / 'False.svgz'), 'rt') as inf:
+        assert inf.read() == open(plain).read()
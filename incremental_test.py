@@ -0,0 +1,98 @@
+
+import csv
+from sprake import arraytree, incremental, newick, style, treeviz
+
+NWK = 'examples/scer-x-skud.nwk'
+STYLE = 'examples/scer-x-skud.style'
+DATA = 'examples/scer-x-skud.csv'
+
+def read_data():
+    return {row['ID'] : row for row in csv.DictReader(open(DATA))}
+
+def write_style(path, text):
+    with open(path, 'w') as outf:
+        outf.write(text)
+    return style.parse_style(path)
+
+def render_from_scratch(filename, mode, rules, data):
+    tree = newick.parse_string(open(NWK).read())
+    (text_legend, dot_legend) = style.apply_rules(tree, rules, data)
+    if mode == 'tree':
+        treeviz.render_tree(filename, tree, dot_legend = dot_legend,
+                            text_legend = text_legend)
+    else:
+        treeviz.render_straight(filename, tree, dot_legend = dot_legend,
+                                text_legend = text_legend)
+
+def test_matches_full_render(tmp_path):
+    data = read_data()
+    base = open(STYLE).read()
+    changes = [
+        # a line color further down, which moves up to other nodes
+        base.replace('linecolor=#07b825', 'linecolor=#ff0000'),
+        # only a text color
+        base.replace('textcolor=#b3059e', 'textcolor=#000080'),
+        # line widths everywhere, and back
+        base.replace('linewidth=3', 'linewidth=1'),
+        base,
+    ]
+    for mode in ('tree', 'straight'):
+        renderer = incremental.IncrementalRenderer(
+            newick.parse_string(open(NWK).read()), mode)
+        out = str(tmp_path / 'incremental.svg')
+        renderer.render(out, style.parse_style(STYLE), data)
+        assert renderer.redrawn is None
+
+        for (ix, text) in enumerate(changes):
+            rules = write_style(str(tmp_path / ('%s.style' % ix)), text)
+            renderer.render(out, rules, data)
+            assert renderer.redrawn is not None
+
+            expected = str(tmp_path / 'full.svg')
+            render_from_scratch(expected, mode, rules, data)
+            assert open(out).read() == open(expected).read(), (mode, ix)
+
+def test_redraws_only_changed(tmp_path):
+    data = read_data()
+    tree = newick.parse_string(open(NWK).read())
+    renderer = incremental.IncrementalRenderer(tree)
+    out = str(tmp_path / 'out.svg')
+    renderer.render(out, style.parse_style(STYLE), data)
+
+    rules = write_style(str(tmp_path / 'new.style'),
+                        open(STYLE).read().replace('#b3059e', '#000080'))
+    renderer.render(out, rules, data)
+    wine = [row['ID'] for row in data.values() if row['Clade'] == 'Wine']
+    assert renderer.redrawn == len([node for node in tree.iter_preorder()
+                                    if node.get_label() in wine])
+
+    # the same rules again change nothing
+    renderer.render(out, rules, data)
+    assert renderer.redrawn == 0
+
+def test_legend_change_renders_all(tmp_path):
+    data = read_data()
+    renderer = incremental.IncrementalRenderer(
+        newick.parse_string(open(NWK).read()))
+    out = str(tmp_path / 'out.svg')
+    renderer.render(out, style.parse_style(STYLE), data)
+    rules = write_style(str(tmp_path / 'new.style'),
+                        open(STYLE).read().replace('Clade=Wine', 'Clade=Cider'))
+    renderer.render(out, rules, data)
+    assert renderer.redrawn is None
+
+def test_array_tree(tmp_path):
+    data = read_data()
+    base = open(STYLE).read()
+    renderer = incremental.IncrementalRenderer(
+        arraytree.parse_string(open(NWK).read()).get_root())
+    out = str(tmp_path / 'incremental.svg')
+    expected = str(tmp_path / 'full.svg')
+    # a full render, a restyle, and a full render again over the old styles
+    for (ix, text) in enumerate([base,
+                                 base.replace('textcolor=#b3059e', 'textcolor=#000080'),
+                                 '*,linewidth=2\n']):
+        rules = write_style(str(tmp_path / ('%s.style' % ix)), text)
+        renderer.render(out, rules, data)
+        render_from_scratch(expected, 'tree', rules, data)
+        assert open(out).read() == open(expected).read(), ix
@@ -0,0 +1,40 @@
+
+from sprake import layout, newick, treeviz
+from sprake.draw_svg import SVGDrawer
+
+NWK = 'examples/scer-x-skud.nwk'
+
+def test_radial_layout(tmp_path):
+    tree = newick.parse_string('(A:1,B:1,(C:1,D:1):1):1;')
+    drawer = SVGDrawer(str(tmp_path / 'dummy.svg'), 12)
+    radial = layout.radial_layout(tree, drawer)
+
+    assert radial.get_node_count() == 6
+    assert list(radial.parents) == [-1, 0, 0, 0, 3, 3]
+    assert list(radial.leaves) == [1, 2, 4, 5]
+    assert radial.angles[4] == radial.deg_step * 2
+    assert radial.angles[3] == radial.deg_step * 2.5
+    assert radial.angles[0] == radial.deg_step * 1.5
+    assert radial.arc_low[3] == radial.angles[4]
+    assert radial.arc_high[3] == radial.angles[5]
+    assert radial.used[4] == radial.used[3] + radial.step
+
+def test_plain_same_as_vectorized(tmp_path, monkeypatch):
+    tree = newick.parse_string(open(NWK).read())
+    drawer = SVGDrawer(str(tmp_path / 'dummy.svg'), 12)
+    radial = layout.radial_layout(tree, drawer)
+    monkeypatch.setattr(layout, 'numpy', None)
+    plain = layout.radial_layout(tree, drawer)
+
+    for name in ('parents', 'leaves', 'outer_x', 'outer_y', 'text_x', 'text_y'):
+        assert list(getattr(radial, name)) == list(getattr(plain, name)), name
+    for name in ('angles', 'used', 'arc_low', 'arc_high', 'degrees'):
+        for (a, b) in zip(getattr(radial, name), getattr(plain, name)):
+            assert abs(a - b) < 0.0000001, name
+
+def test_constants_set_in_treeviz(tmp_path, monkeypatch):
+    tree = newick.parse_string(open(NWK).read())
+    drawer = SVGDrawer(str(tmp_path / 'dummy.svg'), 12)
+    radius = layout.radial_layout(tree, drawer).radius
+    monkeypatch.setattr(treeviz, 'MIN_CIRCUMFERENCE', treeviz.MIN_CIRCUMFERENCE * 2)
+    assert layout.radial_layout(tree, drawer).radius > radius
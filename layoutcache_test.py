@@ -0,0 +1,79 @@
+
+import csv, os
+from sprake import layout, layoutcache, newick, profiling, style, treeviz
+from sprake.draw_svg import SVGDrawer
+
+STYLE = 'examples/scer-x-skud.style'
+DATA = 'examples/scer-x-skud.csv'
+NWK = 'examples/scer-x-skud.nwk'
+
+def test_key_changes_with_tree(tmp_path):
+    drawer = SVGDrawer(str(tmp_path / 'dummy.svg'), 12)
+    key = layoutcache.layout_key('radial', newick.parse_string('(A:1,B:1);'), drawer)
+
+    assert key == layoutcache.layout_key('radial', newick.parse_string('(A:1,B:1);'), drawer)
+    assert key != layoutcache.layout_key('straight', newick.parse_string('(A:1,B:1);'), drawer)
+    assert key != layoutcache.layout_key('radial', newick.parse_string('(A:1,B:2);'), drawer)
+    assert key != layoutcache.layout_key('radial', newick.parse_string('(A:1,C:1);'), drawer)
+    assert key != layoutcache.layout_key('radial', newick.parse_string('((A:1,B:1));'), drawer)
+    assert key != layoutcache.layout_key('radial', newick.parse_string('(A:1,B:1);'),
+                                         SVGDrawer(str(tmp_path / 'dummy.svg'), 14))
+
+def test_memory_cache(tmp_path):
+    cache = layoutcache.LayoutCache()
+    drawer = SVGDrawer(str(tmp_path / 'dummy.svg'), 12)
+    tree = newick.parse_string(open(NWK).read())
+
+    first = cache.get_layout(layout.radial_layout, tree, drawer)
+    assert cache.get_layout(layout.radial_layout, tree, drawer) is first
+    assert cache.get_layout(layout.straight_layout, tree, drawer) is not first
+
+def test_memory_cache_is_bounded():
+    cache = layoutcache.LayoutCache(max_entries = 2)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, key)
+    assert cache.get('a') == None
+    assert cache.get('c') == 'c'
+
+def test_disk_cache_restyle(tmp_path):
+    directory = str(tmp_path / 'cache')
+    rules = style.parse_style(STYLE)
+    data_by_id = {row['ID'] : row for row in csv.DictReader(open(DATA))}
+
+    outputs = []
+    for cached in (False, True):
+        # a new cache object each time, so the second one reads from disk
+        cache = layoutcache.LayoutCache(directory)
+        tree = newick.parse_string(open(NWK).read())
+        (text_legend, dot_legend) = style.apply_rules(tree, rules, data_by_id)
+        filename = str(tmp_path / ('%s.svg' % cached))
+        treeviz.render_tree(filename, tree, text_legend = text_legend,
+                            layout_cache = cache)
+        outputs.append(open(filename).read())
+
+    assert len(os.listdir(directory)) == 1
+    assert outputs[0] == outputs[1]
+
+def test_key_changes_with_layout_version(tmp_path, monkeypatch):
+    drawer = SVGDrawer(str(tmp_path / 'dummy.svg'), 12)
+    tree = newick.parse_string('(A:1,B:1);')
+    key = layoutcache.layout_key('radial', tree, drawer)
+    monkeypatch.setattr(layout, 'LAYOUT_VERSION', layout.LAYOUT_VERSION + 1)
+    assert key != layoutcache.layout_key('radial', tree, drawer)
+
+def test_old_layouts_are_not_loaded(tmp_path, monkeypatch):
+    # a straight layout cached before it had the scale in it
+    directory = str(tmp_path / 'cache')
+    tree = newick.parse_string(open(NWK).read())
+    drawer = SVGDrawer(str(tmp_path / 'dummy.svg'), 12)
+    straight = layout.straight_layout(tree, drawer)
+    del straight.autoscale, straight.scale_max, straight.scale_step
+    with monkeypatch.context() as patch:
+        patch.setattr(layout, 'LAYOUT_VERSION', 1)
+        layoutcache.LayoutCache(directory).put(
+            layoutcache.layout_key('straight_layout', tree, drawer), straight)
+
+    treeviz.render_straight(str(tmp_path / 'out.svg'), tree,
+                            layout_cache = layoutcache.LayoutCache(directory),
+                            profile = profiling.Profile())
+    assert len(os.listdir(directory)) == 2
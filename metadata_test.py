@@ -0,0 +1,66 @@
+
+import os, pytest
+from sprake import metadata, newick, style
+
+CSV = 'examples/scer-x-skud.csv'
+
+def write_table(tmp_path, name, delimiter):
+    filename = str(tmp_path / name)
+    with open(filename, 'w') as outf:
+        for row in [['ID', 'Clade', 'Notes', 'Year'],
+                    ['A', 'Bread', 'x', '2001'],
+                    ['B', 'Wine', 'y', '2002'],
+                    ['C', 'Bread', 'z']]:
+            outf.write(delimiter.join(row) + '\n')
+    return filename
+
+def test_only_needed_columns_and_rows(tmp_path):
+    filename = write_table(tmp_path, 'data.csv', ',')
+    data = metadata.Metadata(filename, 'ID', fields = ['Clade', 'Year'],
+                             ids = ['A', 'C', 'D'])
+    assert len(data) == 2
+    assert data.get('A') == {'ID' : 'A', 'Clade' : 'Bread', 'Year' : '2001'}
+    assert data.get('C') == {'ID' : 'C', 'Clade' : 'Bread'}
+    assert 'B' not in data
+    assert data.get('B') == None
+
+def test_tsv(tmp_path):
+    filename = write_table(tmp_path, 'data.tsv', '\t')
+    data = metadata.Metadata(filename, 'ID', fields = ['Clade'])
+    assert data.get('B') == {'ID' : 'B', 'Clade' : 'Wine'}
+
+def test_lazy(tmp_path):
+    filename = write_table(tmp_path, 'data.csv', ',')
+    data = metadata.Metadata(filename, 'ID')
+    os.remove(filename)
+    with pytest.raises(FileNotFoundError):
+        data.get('A')
+
+def test_same_styling_as_full_rows():
+    import csv
+
+    rules = style.parse_style('examples/scer-x-skud.style')
+    assert style.get_data_fields(rules) == {'Clade'}
+
+    tree = newick.parse_string(open('examples/scer-x-skud.nwk').read())
+    data = metadata.Metadata(CSV, 'ID', fields = style.get_data_fields(rules),
+                             ids = metadata.get_tree_ids(tree))
+    full = {row['ID'] : row for row in csv.DictReader(open(CSV))}
+    for ident in metadata.get_tree_ids(tree):
+        if ident in full:
+            assert data.get(ident) == {'ID' : ident, 'Clade' : full[ident]['Clade']}
+
+def test_parquet(tmp_path):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.parquet, pyarrow.feather
+
+    table = pyarrow.table({'ID' : [1, 2, 3], 'Clade' : ['Bread', 'Wine', None],
+                           'Notes' : ['x', 'y', 'z']})
+    for (name, write) in [('data.parquet', pyarrow.parquet.write_table),
+                          ('data.arrow', pyarrow.feather.write_feather)]:
+        filename = str(tmp_path / name)
+        write(table, filename)
+        data = metadata.Metadata(filename, 'ID', fields = ['Clade'], ids = ['1', '3'])
+        assert len(data) == 2
+        assert data.get('1') == {'ID' : '1', 'Clade' : 'Bread'}
+        assert data.get('3') == {'ID' : '3', 'Clade' : None}
@@ -1,7 +1,8 @@
 # encoding=utf-8
 
-import io, unittest
+import bz2, gzip, io, unittest
 from sprake import newick
+from benchmarks import reference
 
 def test_basic():
     tree = newick.parse_string('(A,B,(C,D));')
@@ -189,6 +190,133 @@ def test_non_ascii():
     assert c.get_label() == 'C'
     assert d.get_label() == 'D'
 
+# ===========================================================================
+# subtree summaries
+
+def test_summaries():
+    tree = newick.parse_string('(A:0.1,B:0.2,(C:0.3,D:0.4):0.5):0.0;')
+    (a, b, parent) = tree.get_children()
+
+    assert tree.get_leaf_count() == 4
+    assert parent.get_leaf_count() == 2
+    assert tree.get_height() == 2
+    assert parent.get_height() == 1
+    assert a.get_height() == 0
+    assert abs(tree.get_distance_height() - 0.9) < 0.0000001
+    assert tree.get_leaf_range() == (0, 3)
+    assert parent.get_leaf_range() == (2, 3)
+    assert b.get_leaf_range() == (1, 1)
+
+def test_summaries_missing_distance():
+    tree = newick.parse_string('(A:0.1,B:0.2,(C:0.3,D:0.4):0.5);')
+    assert tree.get_distance_height() == None
+    assert tree.get_children()[2].get_distance_height() == 0.9
+
+def test_summaries_invalidated():
+    tree = newick.parse_string('(A:0.1,B:0.2,(C:0.3,D:0.4):0.5):0.0;')
+    (a, b, parent) = tree.get_children()
+    assert tree.get_leaf_count() == 4
+    assert parent.get_leaf_range() == (2, 3)
+
+    a.add_child(newick.NewickNode(a, 'E', 1.0))
+    a.add_child(newick.NewickNode(a, 'F', 2.0))
+    assert tree.get_leaf_count() == 5
+    assert tree.get_height() == 2
+    assert parent.get_leaf_range() == (3, 4)
+    assert abs(tree.get_distance_height() - 2.1) < 0.0000001
+
+    b.set_distance(5.0)
+    assert tree.get_distance_height() == 5.0
+
+def test_radian_summaries():
+    tree = newick.parse_string('(A,B,(C,D));')
+    for (ix, leaf) in enumerate(tree.get_leaves()):
+        leaf.radians = ix * 1.0
+    tree.summarize_radians()
+
+    parent = tree.get_children()[2]
+    assert tree.get_average_radians() == 1.5
+    assert tree.get_radian_span() == (0.0, 3.0)
+    assert parent.get_average_radians() == 2.5
+    assert parent.get_radian_span() == (2.0, 3.0)
+
+def test_traversal_order():
+    tree = newick.parse_string('(A,B,(C,D)E)F;')
+    assert [n.get_label() for n in tree.iter_preorder()] == ['F', 'A', 'B', 'E', 'C', 'D']
+    assert [n.get_label() for n in tree.iter_postorder()] == ['A', 'B', 'C', 'D', 'E', 'F']
+
+def test_deep_tree():
+    depth = 5000
+    data = '(' * depth + 'L0' + ''.join([',L%s)' % ix for ix in range(1, depth + 1)]) + ';'
+    tree = newick.parse_string(data)
+
+    assert tree.get_height() == depth
+    assert tree.get_leaf_count() == depth + 1
+    assert len(tree.get_all_nodes()) == depth * 2 + 1
+
+    outf = io.StringIO()
+    newick.to_newick(outf, tree)
+    assert data == outf.getvalue()
+
+def test_same_as_naive_parser():
+    for data in ['(A,B,(C,D));',
+                 '(:0.1,:0.2,(:0.3,:0.4):0.5):0.0;',
+                 '(A,B,(C,D)E)F;',
+                 '((BE017,(ABI1525,ABI1606)),(BR005,XXX));',
+                 '((E_coli_O6:0.00000,E_coli_K12:0.00022)I2:0.00022[76],(S_2a_2457T:0.00000,S_2a_301:0.00000)I3:0.00266[100])I4:0.00000[75];']:
+        tree = newick.parse_string(data)
+        naive = reference.parse_string_naive(data)
+
+        nodes = tree.get_all_nodes()
+        naive_nodes = naive.get_all_nodes()
+        assert len(nodes) == len(naive_nodes)
+        for (node, naive_node) in zip(nodes, naive_nodes):
+            assert node.get_label() == naive_node.get_label()
+            assert node.get_distance() == naive_node.get_distance()
+            assert node.get_bootstrap() == naive_node.get_bootstrap()
+            assert len(node.get_children()) == len(naive_node.get_children())
+
+# ===========================================================================
+# streaming
+
+TREES = '(A,B,(C,D));\n(A:0.1,B:0.2,(C:0.3,D:0.4):0.5);\n((BE017,(ABI1525,ABI1606)),(BR005,XXX));\n'
+
+def test_iter_trees_text():
+    trees = list(newick.iter_trees(io.StringIO(TREES)))
+    assert len(trees) == 3
+    assert [len(tree.get_leaves()) for tree in trees] == [4, 4, 5]
+    assert trees[1].get_children()[1].get_distance() == 0.2
+
+def test_iter_trees_small_chunks():
+    trees = list(newick.iter_trees(io.StringIO(TREES), chunk_size = 5))
+    assert [len(tree.get_leaves()) for tree in trees] == [4, 4, 5]
+
+def test_iter_trees_binary():
+    trees = list(newick.iter_trees(io.BytesIO(TREES.encode('utf-8')), chunk_size = 7))
+    assert [len(tree.get_leaves()) for tree in trees] == [4, 4, 5]
+
+def test_iter_trees_non_ascii():
+    data = '(A,Bøø,(C,D));'.encode('utf-8')
+    (tree, ) = newick.iter_trees(io.BytesIO(data), chunk_size = 5)
+    assert tree.get_children()[1].get_label() == 'Bøø'
+
+def test_iter_trees_gzip():
+    data = gzip.compress(TREES.encode('utf-8'))
+    trees = list(newick.iter_trees(io.BytesIO(data), chunk_size = 10))
+    assert [len(tree.get_leaves()) for tree in trees] == [4, 4, 5]
+
+def test_iter_trees_bz2(tmp_path):
+    filename = str(tmp_path / 'trees.nwk.bz2')
+    with open(filename, 'wb') as outf:
+        outf.write(bz2.compress(TREES.encode('utf-8')))
+
+    trees = list(newick.iter_trees(filename))
+    assert [len(tree.get_leaves()) for tree in trees] == [4, 4, 5]
+
+def test_iter_trees_no_final_semicolon():
+    trees = list(newick.iter_trees(io.StringIO('(A,B);\n(C,D,E)\n')))
+    assert [len(tree.get_leaves()) for tree in trees] == [2, 3]
+
 # ===========================================================================
 # utilities
 
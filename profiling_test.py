@@ -0,0 +1,68 @@
+
+import json
+from sprake import newick, profiling, style, treeviz
+
+NWK = '((A:0.1,B:0.2):0.05,(C:0.3,(D:0.1,E:0.1):0.2):0.1);'
+
+def get_phases(profile):
+    return [record['name'] for record in profile.phases]
+
+def test_render_phases(tmp_path, capsys):
+    profile = profiling.Profile()
+    tree = newick.parse_string(NWK)
+    rules = [style.EqualsRule('ID', 'A', 'textcolor', style.Color(255, 0, 0))]
+    style.apply_rules(tree, rules, {'A' : {'ID' : 'A'}}, profile)
+    treeviz.render_straight(str(tmp_path / 'out.svg'), tree, profile = profile)
+    assert get_phases(profile) == ['apply rules', 'upmerge line styles',
+                                   'layout', 'draw', 'save']
+    assert all(record['seconds'] >= 0 for record in profile.phases)
+
+    draw = profile.phases[3]
+    assert draw['counts']['texts'] >= 5
+    assert draw['counts']['lines'] >= 8
+    [scale] = profile.notes
+    assert (scale['name'], scale['phase'], scale['autoscale']) == \
+           ('scale', 'layout', True)
+    assert scale['scale_max'] >= 0.4
+    # the layout records the scale, instead of printing it
+    assert capsys.readouterr().out == ''
+
+def test_formats_and_json(tmp_path):
+    profile = profiling.Profile(memory = True)
+    tree = newick.parse_string(NWK)
+    targets = [(str(tmp_path / 'out.svg'), 'SVG'), (str(tmp_path / 'out.png'), 'PNG')]
+    treeviz.render_tree_formats(targets, tree, profile = profile)
+    profile.stop()
+    assert get_phases(profile) == ['layout', 'record', 'draw SVG', 'save SVG',
+                                   'draw PNG', 'save PNG']
+    assert profile.phases[2]['counts'] == profile.phases[4]['counts']
+    assert profile.phases[2]['counts']['arcs'] > 0
+    assert all(record['peak_bytes'] > 0 for record in profile.phases)
+
+    filename = str(tmp_path / 'profile.json')
+    profile.write_json(filename)
+    assert json.load(open(filename))['phases'][0]['name'] == 'layout'
+
+def test_nested_phases():
+    ended = []
+    profile = profiling.Profile(memory = True, callback = ended.append)
+    with profile.phase('outer'):
+        with profile.phase('inner'):
+            data = [0] * 100000
+            profile.count('lines', 3)
+        del data
+    profile.stop()
+    assert [record['name'] for record in ended] == ['inner', 'outer']
+    (outer, inner) = profile.phases
+    assert (outer['depth'], inner['depth']) == (0, 1)
+    assert inner['counts'] == {'lines' : 3}
+    assert outer['counts'] == {}
+    # the outer phase includes the peak of the inner one
+    assert outer['peak_bytes'] >= inner['peak_bytes'] >= 800000
+    assert outer['seconds'] >= inner['seconds']
+
+def test_no_profile():
+    with profiling.phase(None, 'nothing'):
+        profiling.note(None, 'nothing', value = 1)
+    drawer = object()
+    assert profiling.count_primitives(None, drawer) is drawer
@@ -0,0 +1,85 @@
+
+import csv, os, pytest
+from sprake import client, newick, server, style, treeviz
+
+NWK = 'examples/scer-x-skud.nwk'
+STYLE = 'examples/scer-x-skud.style'
+DATA = 'examples/scer-x-skud.csv'
+
+SETTINGS = {'styles' : {'yeast' : STYLE}, 'data' : {'yeast' : DATA}}
+
+def render_directly(tmp_path, format, mode = 'tree'):
+    tree = newick.parse_string(open(NWK).read())
+    data = {row['ID'] : row for row in csv.DictReader(open(DATA))}
+    (text_legend, dot_legend) = style.apply_rules(tree, style.parse_style(STYLE),
+                                                  data)
+    render = treeviz.render_tree if mode == 'tree' else treeviz.render_straight
+    filename = str(tmp_path / ('direct.' + format.lower()))
+    render(filename, tree, dot_legend = dot_legend, text_legend = text_legend,
+           format = format)
+    return open(filename, 'rb').read()
+
+def test_service(tmp_path):
+    service = server.RenderService(**SETTINGS)
+    text = open(NWK).read()
+    for mode in ('tree', 'straight'):
+        assert service.render(text, 'SVG', mode, 'yeast') == \
+               render_directly(tmp_path, 'SVG', mode)
+    # again, from the warm tree
+    assert service.render(text, 'SVG', 'tree', 'yeast') == \
+           render_directly(tmp_path, 'SVG')
+    assert service.get_info()['trees'] == 2
+    assert service.render(text, 'PNG').startswith(b'\x89PNG')
+
+    for args in [('SVG', 'tree', 'nope'), ('GIF', ), ('SVG', 'flat'),
+                 ('SVG', 'tree', 'yeast', 'nope')]:
+        with pytest.raises(server.RequestError):
+            service.render(text, *args)
+    with pytest.raises(server.RequestError):
+        service.render('nothing', 'SVG')
+
+@pytest.fixture(scope = 'module')
+def running():
+    srv = server.RenderServer(('127.0.0.1', 0), workers = 1, queue = 2,
+                              **SETTINGS)
+    srv.start()
+    yield srv
+    srv.shutdown()
+
+def test_server(running, tmp_path):
+    renderer = client.RenderClient('http://%s:%s' % running.server_address[ : 2])
+    text = open(NWK).read()
+    try:
+        assert renderer.render(text, 'SVG', style = 'yeast') == \
+               render_directly(tmp_path, 'SVG')
+        assert renderer.render(text, 'PNG', 'straight').startswith(b'\x89PNG')
+        assert renderer.health()['styles'] == ['yeast']
+
+        with pytest.raises(client.ServerError) as error:
+            renderer.render(text, 'GIF')
+        assert error.value.status == 400
+        assert 'Unknown format' in error.value.message
+
+        # too busy
+        running._active = running.workers + running.queue
+        try:
+            with pytest.raises(client.ServerError) as error:
+                renderer.render(text)
+            assert error.value.status == 503
+        finally:
+            running._active = 0
+        assert b'<svg' in renderer.render(text)
+    finally:
+        renderer.close()
+
+def test_unix_socket(tmp_path):
+    path = str(tmp_path / 'sprake.sock')
+    srv = server.RenderServer(socket_path = path, workers = 1)
+    srv.start()
+    try:
+        renderer = client.RenderClient(socket_path = path)
+        assert renderer.render('((A:1,B:2):1,C:1);', 'PDF').startswith(b'%PDF')
+        renderer.close()
+    finally:
+        srv.shutdown()
+    assert not os.path.exists(path)
@@ -0,0 +1,90 @@
+
+import math
+from sprake import layout, newick, spatial, treeviz
+from sprake.spatial import GridIndex
+from sprake.displaylist import DisplayList
+from sprake.draw_svg import SVGDrawer
+
+NWK = 'examples/scer-x-skud.nwk'
+
+def test_query():
+    index = GridIndex(10)
+    index.insert(0, (0, 0, 5, 5))
+    index.insert(1, (8, 8, 25, 12))
+    index.insert(2, (100, 100, 101, 101))
+    assert len(index) == 3
+    assert index.query((0, 0, 9, 9)) == [0, 1]
+    assert index.query((20, 0, 30, 10)) == [1]
+    assert index.query((50, 50, 60, 60)) == []
+    assert index.query_point(100.5, 100.5) == [2]
+    assert index.query((-1000, -1000, 1000, 1000)) == [0, 1, 2]
+
+def test_large_items():
+    index = GridIndex(1)
+    index.insert('big', (0, 0, 1000, 1000))
+    index.insert('small', (5, 5, 6, 6))
+    assert index.query((500, 500, 501, 501)) == ['big']
+    assert index.query((5, 5, 5, 5)) == ['big', 'small']
+
+def test_arc_bounds():
+    display = DisplayList()
+    # the quarter from 3 to 6 o'clock, and one across 3 o'clock
+    display.circle_segment(0, 0, 0, math.pi / 2, 10, stroke = 2)
+    display.circle_segment(0, 0, 1.5 * math.pi, 2.5 * math.pi, 10, stroke = 0)
+    assert close(display.get_bounds(0), (-1, -1, 11, 11))
+    assert close(display.get_bounds(1), (0, -10, 10, 10))
+
+def close(box1, box2):
+    return all(abs(a - b) < 1e-9 for (a, b) in zip(box1, box2))
+
+def test_hit_test_radial(tmp_path):
+    tree = newick.parse_string(open(NWK).read())
+    radial = layout.radial_layout(tree, SVGDrawer(str(tmp_path / 'dummy.svg'), 12))
+    index = radial.get_index()
+    assert index is radial.get_index()
+
+    for (pos, leaf) in enumerate(radial.leaves):
+        # the middle of the label
+        (left, top, right, bottom) = spatial.get_text_bounds(
+            int(radial.text_x[pos]), int(radial.text_y[pos]),
+            radial.degrees[pos], (radial.text_height, radial.label_widths[pos]))
+        assert index.hit_test((left + right) / 2, (top + bottom) / 2) == leaf
+
+    # the middle of the branches that are long enough to point at
+    for ix in range(1, radial.get_node_count()):
+        (x1, y1) = radial.point(radial.angles[ix], radial.used[radial.parents[ix]])
+        (x2, y2) = (radial.outer_x[ix], radial.outer_y[ix])
+        if math.hypot(x2 - x1, y2 - y1) > 10:
+            assert index.hit_test((x1 + x2) / 2, (y1 + y2) / 2) == ix
+    assert index.hit_test(-100, -100) is None
+
+def test_nodes_in_region(tmp_path):
+    tree = newick.parse_string(open(NWK).read())
+    straight = layout.straight_layout(tree, SVGDrawer(str(tmp_path / 'dummy.svg'), 12))
+    index = straight.get_index()
+    count = straight.get_node_count()
+    assert index.get_nodes((0, 0, straight.width, straight.height)) == \
+        list(range(count))
+    assert index.get_nodes((-100, -100, -50, -50)) == []
+
+    # the top half has the first leaves, and not the last
+    middle = straight.height / 2
+    nodes = index.get_nodes((0, 0, straight.width, middle))
+    assert straight.leaves[0] in nodes and straight.leaves[-1] not in nodes
+
+def test_render_viewport(tmp_path):
+    data = open(NWK).read()
+    filename = str(tmp_path / 'out.svg')
+    treeviz.render_straight(filename, newick.parse_string(data))
+    everything = open(filename).read().count('<text')
+    treeviz.render_straight(filename, newick.parse_string(data),
+                            viewport = (0, 0, 2000, 100))
+    assert 0 < open(filename).read().count('<text') < everything
+
+def test_line_cells():
+    index = GridIndex(10)
+    assert index.get_line_cells((5, 5), (35, 5)) == [(0, 0), (1, 0), (2, 0), (3, 0)]
+    assert index.get_line_cells((5, 5), (-5, -5))[-1] == (-1, -1)
+    # a diagonal passes through a cell next to it on each step
+    cells = index.get_line_cells((1, 2), (29, 28))
+    assert cells[0] == (0, 0) and cells[-1] == (2, 2) and len(cells) == 5
@@ -1,29 +1,102 @@
 
-import csv, argparse
-from sprake import newick, treeviz, style
-
-def rename(infile, format):
-    suffix = {
-        'SVG' : '.svg',
-        'PNG' : '.png',
-        'PDF' : '.pdf',
-    }[format]
-
-    ix = infile.rfind('.')
-    return infile[ : ix] + suffix
+import argparse, sys
+from sprake import newick, treeviz, style, layoutcache, metadata, batch, \
+    profiling
+from sprake.batch import rename
 
 parser = argparse.ArgumentParser()
-parser.add_argument('infile', nargs = 1)
+parser.add_argument('infile', nargs = '*')
 parser.add_argument('--id-field', default = 'ID')
 parser.add_argument('--style')
-parser.add_argument('--data')
+parser.add_argument('--data',
+                    help = 'metadata table: CSV, TSV, or Parquet/Arrow with pyarrow')
 parser.add_argument('--mode', choices = ['tree', 'straight'], default = 'tree')
-parser.add_argument('--format', default = 'SVG')
+parser.add_argument('--format', default = 'SVG',
+                    help = 'SVG, SVGZ, PDF or PNG, or several separated by '
+                    'commas, like SVG,PDF,PNG, to lay out the tree only once')
 parser.add_argument('--dump', action='store_true')
+parser.add_argument('--layout-cache', metavar = 'DIR',
+                    help = 'reuse layouts stored in DIR when only styles change')
+parser.add_argument('--compact-svg', action = 'store_true',
+                    help = 'write smaller SVG, with CSS classes and merged paths')
+parser.add_argument('--compress-level', type = int, choices = range(1, 10),
+                    metavar = '1-9', help = 'gzip compression level for SVGZ')
+parser.add_argument('--png-scale', type = int, default = 1, metavar = 'N',
+                    help = 'draw PNG at N times the size and scale it down, '
+                    'for smoother lines')
+parser.add_argument('--batch', action = 'store_true',
+                    help = 'render every tree in the input files (which may be '
+                    'glob patterns) in one process')
+parser.add_argument('--manifest', action = 'append', default = [],
+                    help = 'file listing tree files (and output files) to '
+                    'render in batch mode')
+parser.add_argument('--workers', type = int, default = 1,
+                    help = 'number of processes for batch mode (0: one per core)')
+parser.add_argument('--profile', nargs = '?', const = '-', metavar = 'FILE',
+                    help = 'time each phase of the render, and print a summary, '
+                    'or write it to FILE as JSON')
+parser.add_argument('--profile-memory', action = 'store_true',
+                    help = 'with --profile, also trace the peak memory of '
+                    'each phase (slow)')
 
 args = parser.parse_args()
 
-tree = newick.parse_string(open(args.infile[0]).read())
+formats = [format.strip() for format in args.format.split(',')]
+for format in formats:
+    if format not in batch.SUFFIXES:
+        parser.error('unknown format "%s"' % format)
+
+layout_cache = None
+if args.layout_cache:
+    layout_cache = layoutcache.LayoutCache(args.layout_cache)
+
+drawer_options = {}
+if args.compact_svg:
+    drawer_options['compact'] = True
+if args.compress_level:
+    drawer_options['compresslevel'] = args.compress_level
+if args.png_scale > 1:
+    drawer_options['scale'] = args.png_scale
+
+profile = None
+if args.profile or args.profile_memory:
+    if args.batch or args.manifest:
+        parser.error('--profile works for one tree, not in batch mode')
+    profile = profiling.Profile(memory = args.profile_memory)
+
+if args.batch or args.manifest:
+    entries = [(filename, None) for filename in batch.find_tree_files(args.infile)]
+    for manifest in args.manifest:
+        entries += batch.read_manifest(manifest)
+
+    settings = {
+        'mode' : args.mode,
+        'format' : formats[0],
+        'stylefile' : args.style,
+        'datafile' : args.data,
+        'id_field' : args.id_field,
+        'layout_cache' : layout_cache,
+        'drawer_options' : drawer_options,
+    }
+    jobs = batch.iter_jobs(entries, formats[0])
+    if args.workers == 1:
+        renderer = batch.BatchRenderer(**settings)
+        results = renderer.render_all(jobs, progress = batch.ProgressReport(),
+                                      formats = formats)
+    else:
+        results = batch.render_parallel(jobs, workers = args.workers,
+                                        progress = batch.ProgressReport(),
+                                        formats = formats, **settings)
+    failed = [result for result in results if result[2]]
+    sys.stderr.write('Rendered %s trees, %s failed\n' %
+                     (len(results) - len(failed), len(failed)))
+    sys.exit(1 if failed else 0)
+
+if len(args.infile) != 1:
+    parser.error('give one input file, or use --batch')
+
+with profiling.phase(profile, 'parse'):
+    tree = next(newick.iter_trees(args.infile[0]))
 if args.dump:
     newick.dump_tree(tree)
 
@@ -31,24 +104,64 @@ text_legend = None
 dot_legend = None
 if args.style and args.data:
     rules = style.parse_style(args.style)
-    data_by_id = {row[args.id_field] : row for row in csv.DictReader(open(args.data))}
-    (text_legend, dot_legend) = style.apply_rules(tree, rules, data_by_id)
+    with profiling.phase(profile, 'load metadata'):
+        data_by_id = metadata.Metadata(args.data, args.id_field,
+                                       fields = style.get_data_fields(rules),
+                                       ids = metadata.get_tree_ids(tree))
+        len(data_by_id) # it's read on first use
+    (text_legend, dot_legend) = style.apply_rules(tree, rules, data_by_id,
+                                                  profile)
 
 banners = []
-if args.mode == 'tree':
+targets = [(rename(args.infile[0], format), format) for format in formats]
+if args.mode == 'tree' and len(targets) > 1:
+    treeviz.render_tree_formats(
+        targets,
+        tree,
+        text_legend = text_legend,
+        dot_legend = dot_legend,
+        banners = banners,
+        layout_cache = layout_cache,
+        drawer_options = drawer_options,
+        profile = profile
+    )
+elif args.mode == 'tree':
     treeviz.render_tree(
-        rename(args.infile[0], args.format),
+        targets[0][0],
         tree,
         text_legend = text_legend,
         dot_legend = dot_legend,
-        format = args.format,
-        banners = banners
+        format = formats[0],
+        banners = banners,
+        layout_cache = layout_cache,
+        drawer_options = drawer_options,
+        profile = profile
+    )
+elif len(targets) > 1:
+    treeviz.render_straight_formats(
+        targets,
+        tree,
+        text_legend = text_legend,
+        dot_legend = dot_legend,
+        layout_cache = layout_cache,
+        drawer_options = drawer_options,
+        profile = profile
     )
 else:
     treeviz.render_straight(
-        rename(args.infile[0], args.format),
+        targets[0][0],
         tree,
         text_legend = text_legend,
         dot_legend = dot_legend,
-        format = args.format
+        format = formats[0],
+        layout_cache = layout_cache,
+        drawer_options = drawer_options,
+        profile = profile
     )
+
+if profile:
+    profile.stop()
+    if args.profile in (None, '-'):
+        profile.write_summary(sys.stderr)
+    else:
+        profile.write_json(args.profile)
@@ -0,0 +1,67 @@
+
+import argparse, signal, sys
+from sprake import server
+
+def parse_names(parser, values, option):
+    'NAME=FILE arguments, as a dict.'
+    files = {}
+    for value in values:
+        if '=' not in value:
+            parser.error('%s takes NAME=FILE, not "%s"' % (option, value))
+        (name, filename) = value.split('=', 1)
+        files[name] = filename
+    return files
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--host', default = '127.0.0.1')
+parser.add_argument('--port', type = int, default = 8123)
+parser.add_argument('--socket', metavar = 'PATH',
+                    help = 'listen on a Unix socket instead of TCP')
+parser.add_argument('--style', action = 'append', default = [],
+                    metavar = 'NAME=FILE',
+                    help = 'a style file that requests can use by name')
+parser.add_argument('--data', action = 'append', default = [],
+                    metavar = 'NAME=FILE',
+                    help = 'a metadata table that requests can use by name; '
+                    'by default a style uses the table of the same name')
+parser.add_argument('--id-field', default = 'ID')
+parser.add_argument('--workers', type = int, default = 0,
+                    help = 'number of render processes (0: one per core)')
+parser.add_argument('--queue', type = int,
+                    help = 'requests that may wait for a worker before the '
+                    'server answers 503 (default: 4 per worker)')
+parser.add_argument('--compact-svg', action = 'store_true')
+parser.add_argument('--png-scale', type = int, default = 1, metavar = 'N')
+parser.add_argument('--verbose', action = 'store_true',
+                    help = 'log every request')
+
+args = parser.parse_args()
+
+drawer_options = {}
+if args.compact_svg:
+    drawer_options['compact'] = True
+if args.png_scale > 1:
+    drawer_options['scale'] = args.png_scale
+
+service = server.RenderServer(
+    (args.host, args.port),
+    socket_path = args.socket,
+    workers = args.workers,
+    queue = args.queue,
+    verbose = args.verbose,
+    styles = parse_names(parser, args.style, '--style'),
+    data = parse_names(parser, args.data, '--data'),
+    id_field = args.id_field,
+    drawer_options = drawer_options
+)
+sys.stderr.write('Serving on %s with %s workers\n' %
+                 (args.socket or 'http://%s:%s' % service.server_address[ : 2],
+                  service.workers))
+# stop cleanly when killed, too
+signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+try:
+    service.serve_forever()
+except KeyboardInterrupt:
+    pass
+finally:
+    service.shutdown()
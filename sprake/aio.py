@@ -0,0 +1,116 @@
+'''
+Rendering from asyncio code, without blocking the event loop.
+
+The pipeline runs in an executor (the loop's default thread pool unless
+one is given), one phase at a time: parsing, applying the style rules,
+layout, drawing and saving. Each phase is awaited on its own, so a
+render that is cancelled (say by asyncio.wait_for, or because the
+client went away) stops at the end of the phase it's in, instead of
+running on to the end and holding up the renders behind it.
+
+  data = await aio.render(newick_text, format = 'PNG', rules = rules,
+                          data_by_id = data_by_id)
+
+The renders share the process-wide caches (text sizes, fonts, rendered
+labels), which are thread-safe, as is a layoutcache.LayoutCache given
+to several renders. Since the phases are Python code, renders
+in threads don't run in parallel; for that, see server.
+'''
+
+import asyncio
+from sprake import newick, style, treeviz, layout, profiling
+
+MODES = {
+    'tree' : (layout.radial_layout, treeviz.draw_radial),
+    'straight' : (layout.straight_layout, treeviz.draw_straight),
+}
+
+async def render(tree, outfile = None, format = 'SVG', mode = 'tree',
+                 rules = None, data_by_id = None, layout_cache = None,
+                 drawer_options = None, executor = None, profile = None):
+    '''Renders tree, which is Newick text or a parsed tree, to outfile, a
+    filename or a file object, which is written to from the executor.
+    Without an outfile, returns the rendered file as bytes. rules are the
+    style rules, or a RuleIndex, applied with the metadata data_by_id.
+    The other arguments are like for treeviz.render_tree.'''
+    assert mode in MODES, 'Unknown mode "%s"' % mode
+    (target, buffer) = treeviz.get_target(outfile, format)
+    run = lambda function, *args: _run(executor, function, *args)
+    if isinstance(tree, str):
+        tree = await run(_parse, tree, profile)
+
+    text_legend = None
+    dot_legend = None
+    if rules:
+        (text_legend, dot_legend) = await run(style.apply_rules, tree, rules,
+                                              data_by_id or {}, profile)
+
+    (compute, draw) = MODES[mode]
+    (drawer, thelayout) = await run(_lay_out, compute, tree, target, format,
+                                    text_legend, layout_cache, drawer_options,
+                                    profile)
+    if mode == 'tree':
+        await run(_draw, profile, draw, thelayout, tree, drawer, dot_legend,
+                  text_legend)
+    else:
+        await run(_draw, profile, draw, thelayout, tree, drawer)
+    await run(_save, drawer, profile)
+
+    if buffer is not None:
+        return buffer.getvalue()
+
+async def render_tree(tree, outfile = None, format = 'SVG', **options):
+    'Like render, in the tree mode.'
+    return await render(tree, outfile, format, 'tree', **options)
+
+async def render_straight(tree, outfile = None, format = 'SVG', **options):
+    'Like render, in the straight mode.'
+    return await render(tree, outfile, format, 'straight', **options)
+
+async def parse(data, executor = None):
+    'Parses the Newick text in the executor.'
+    return await _run(executor, _parse, data, None)
+
+async def write_file(filename, data, executor = None):
+    'Writes the bytes to filename, in the executor.'
+    await _run(executor, _write, filename, data)
+
+async def _run(executor, function, *args):
+    # if the render is cancelled, a phase that hasn't started is dropped,
+    # and one that has runs to its end in its thread
+    return await asyncio.get_running_loop().run_in_executor(executor, function,
+                                                            *args)
+
+# the phases, which run in the executor
+
+def _parse(data, profile):
+    with profiling.phase(profile, 'parse'):
+        tree = newick.parse_string(data)
+    assert tree is not None, 'No tree in the data'
+    return tree
+
+def _lay_out(compute, tree, outfile, format, text_legend, layout_cache,
+             drawer_options, profile):
+    'Makes the drawer, which measures the text, and the layout.'
+    drawer = treeviz.get_drawer(outfile, format, treeviz.FONT_SIZE,
+                                drawer_options)
+    if compute is layout.straight_layout:
+        thelayout = treeviz.compute_straight_layout(tree, drawer, text_legend,
+                                                    layout_cache, profile)
+    else:
+        with profiling.phase(profile, 'layout'):
+            thelayout = treeviz.compute_layout(compute, tree, drawer,
+                                               text_legend, layout_cache)
+    return (drawer, thelayout)
+
+def _draw(profile, draw, thelayout, tree, drawer, *args):
+    with profiling.phase(profile, 'draw'):
+        draw(thelayout, tree, profiling.count_primitives(profile, drawer), *args)
+
+def _save(drawer, profile):
+    with profiling.phase(profile, 'save'):
+        drawer.save()
+
+def _write(filename, data):
+    with open(filename, 'wb') as outf:
+        outf.write(data)
@@ -0,0 +1,418 @@
+'''
+Compact array-backed representation of trees, for very large phylogenies.
+
+The nodes are numbered in preorder and stored as columns, so a node costs
+a few dozen bytes instead of a full Python object. ArrayNode is a view
+onto one node with the same interface as newick.NewickNode, so that the
+style engine and the renderers can work on both.
+'''
+
+import math
+from array import array
+from sprake import newick, style
+
+NO_NODE = -1
+NO_BOOTSTRAP = -2 ** 31
+
+# a style is (textcolor, linecolor, linestroke, dotcolour, bannercolor),
+# stored once in a table and referred to by id from the nodes
+TEXTCOLOR, LINECOLOR, LINESTROKE, DOTCOLOUR, BANNERCOLOR = range(5)
+DEFAULT_STYLE = (style.BLACK, style.BLACK, 1, None, None)
+
+class ArrayTree:
+
+    def __init__(self):
+        self._parent = array('i')
+        self._first_child = array('i')
+        self._next_sibling = array('i')
+        self._last_child = array('i') # only used while building
+        self._distance = array('d') # NaN if no distance
+        self._bootstrap = array('i')
+        self._label_start = array('q') # offsets into the label pool
+        self._label_end = array('q')
+        self._pool = []  # joined into one string by _finish()
+        self._pool_size = 0
+        self._relabeled = {}  # index -> label, for labels changed later
+        self._style_id = array('I')
+        self._styles = [DEFAULT_STYLE]
+        self._style_ids = {DEFAULT_STYLE : 0}
+        self._columns = {}  # drawing positions, created when first set
+        self._summary = None
+        self._radian_summary = None
+
+    def __len__(self):
+        return len(self._parent)
+
+    def get_root(self):
+        return ArrayNode(self, 0)
+
+    # --- building
+
+    def _add_node(self, parent, label = None, distance = None, bootstrap = None):
+        ix = len(self._parent)
+        self._parent.append(parent)
+        self._first_child.append(NO_NODE)
+        self._next_sibling.append(NO_NODE)
+        self._last_child.append(NO_NODE)
+        self._distance.append(math.nan if distance is None else distance)
+        self._bootstrap.append(NO_BOOTSTRAP if bootstrap is None else bootstrap)
+        self._label_start.append(0)
+        self._label_end.append(0)
+        self._style_id.append(0)
+        if label:
+            self._set_pool_label(ix, label)
+
+        if parent != NO_NODE:
+            last = self._last_child[parent]
+            if last == NO_NODE:
+                self._first_child[parent] = ix
+            else:
+                self._next_sibling[last] = ix
+            self._last_child[parent] = ix
+        return ix
+
+    def _set_pool_label(self, ix, label):
+        self._pool.append(label)
+        self._label_start[ix] = self._pool_size
+        self._pool_size += len(label)
+        self._label_end[ix] = self._pool_size
+
+    def _finish(self):
+        self._pool = ''.join(self._pool)
+        self._last_child = None
+        return self
+
+    # --- node data
+
+    def get_label(self, ix):
+        if ix in self._relabeled:
+            return self._relabeled[ix]
+        start = self._label_start[ix]
+        end = self._label_end[ix]
+        return self._pool[start : end] if end > start else None
+
+    def set_label(self, ix, label):
+        self._relabeled[ix] = label
+
+    def get_distance(self, ix):
+        distance = self._distance[ix]
+        return None if math.isnan(distance) else distance
+
+    def set_distance(self, ix, distance):
+        self._distance[ix] = math.nan if distance is None else distance
+        self._summary = None
+
+    def get_bootstrap(self, ix):
+        bootstrap = self._bootstrap[ix]
+        return None if bootstrap == NO_BOOTSTRAP else bootstrap
+
+    def set_bootstrap(self, ix, bootstrap):
+        self._bootstrap[ix] = NO_BOOTSTRAP if bootstrap is None else bootstrap
+
+    def get_children(self, ix):
+        children = []
+        child = self._first_child[ix]
+        while child != NO_NODE:
+            children.append(child)
+            child = self._next_sibling[child]
+        return children
+
+    def get_style(self, ix, field):
+        return self._styles[self._style_id[ix]][field]
+
+    def set_style(self, ix, field, value):
+        current = self._styles[self._style_id[ix]]
+        self._style_id[ix] = self._intern_style(
+            current[ : field] + (value, ) + current[field + 1 : ])
+
+    def _intern_style(self, style):
+        if style not in self._style_ids:
+            self._style_ids[style] = len(self._styles)
+            self._styles.append(style)
+        return self._style_ids[style]
+
+    def get_column(self, name, ix):
+        column = self._columns.get(name)
+        if column is None or math.isnan(column[ix]):
+            return None
+        return column[ix]
+
+    def set_column(self, name, ix, value):
+        if name not in self._columns:
+            self._columns[name] = array('d', [math.nan]) * len(self)
+        self._columns[name][ix] = math.nan if value is None else value
+
+    # --- summaries
+
+    # (subtree size, leaf count, first leaf, height, distance height) per
+    # node, computed in one pass and cleared when a distance is changed.
+    # because the nodes are in preorder, walking the indexes backwards
+    # visits all children before their parent.
+
+    def get_summary(self):
+        if self._summary is None:
+            self._summarize()
+        return self._summary
+
+    def _summarize(self):
+        count = len(self)
+        size = array('i', [1]) * count
+        leaf_count = array('i', [0]) * count
+        height = array('i', [0]) * count
+        distance_height = array('d', [-math.inf]) * count
+        for ix in range(count - 1, -1, -1):
+            distance = self._distance[ix]
+            if self._first_child[ix] == NO_NODE:
+                leaf_count[ix] = 1
+                distance_height[ix] = distance
+            else:
+                # children have already set their maximum, NaN if missing
+                distance_height[ix] += distance
+
+            parent = self._parent[ix]
+            if parent != NO_NODE:
+                size[parent] += size[ix]
+                leaf_count[parent] += leaf_count[ix]
+                height[parent] = max(height[parent], height[ix] + 1)
+                sub = distance_height[ix]
+                current = distance_height[parent]
+                if not math.isnan(current) and (math.isnan(sub) or sub > current):
+                    distance_height[parent] = sub
+
+        first_leaf = array('i', [0]) * count
+        next_leaf = 0
+        for ix in range(count):
+            first_leaf[ix] = next_leaf
+            if self._first_child[ix] == NO_NODE:
+                next_leaf += 1
+
+        self._summary = (size, leaf_count, first_leaf, height, distance_height)
+
+    def summarize_radians(self):
+        assert 'radians' in self._columns, \
+               'The tree has no radians, since it has not been drawn'
+        radians = self._columns['radians']
+        count = len(self)
+        lowest = array('d', [math.inf]) * count
+        highest = array('d', [-math.inf]) * count
+        total = array('d', [0.0]) * count
+        for ix in range(count - 1, -1, -1):
+            if self._first_child[ix] == NO_NODE:
+                lowest[ix] = highest[ix] = total[ix] = radians[ix]
+
+            parent = self._parent[ix]
+            if parent != NO_NODE:
+                lowest[parent] = min(lowest[parent], lowest[ix])
+                highest[parent] = max(highest[parent], highest[ix])
+                total[parent] += total[ix]
+
+        self._radian_summary = (lowest, highest, total)
+
+    def get_radian_summary(self):
+        if self._radian_summary is None:
+            self.summarize_radians()
+        return self._radian_summary
+
+    def upmerge_linestyle(self):
+        for ix in range(len(self) - 1, -1, -1):
+            child = self._first_child[ix]
+            if child == NO_NODE:
+                continue
+
+            style = self._get_linestyle(child)
+            child = self._next_sibling[child]
+            while child != NO_NODE:
+                if style != self._get_linestyle(child):
+                    style = None
+                    break
+                child = self._next_sibling[child]
+
+            if style:
+                (linestroke, linecolor) = style
+                self.set_style(ix, LINESTROKE, linestroke)
+                self.set_style(ix, LINECOLOR, linecolor)
+
+    def _get_linestyle(self, ix):
+        style = self._styles[self._style_id[ix]]
+        return (style[LINESTROKE], style[LINECOLOR])
+
+# ===========================================================================
+# NODE VIEW
+
+def _style_property(field):
+    def get(self):
+        return self._tree.get_style(self._ix, field)
+    def set(self, value):
+        self._tree.set_style(self._ix, field, value)
+    return property(get, set)
+
+def _column_property(name):
+    def get(self):
+        return self._tree.get_column(name, self._ix)
+    def set(self, value):
+        self._tree.set_column(name, self._ix, value)
+    return property(get, set)
+
+class ArrayNode:
+    'View of one node in an ArrayTree, with the API of NewickNode.'
+    __slots__ = ('_tree', '_ix')
+
+    def __init__(self, tree, ix):
+        self._tree = tree
+        self._ix = ix
+
+    def __eq__(self, other):
+        return (isinstance(other, ArrayNode) and other._tree is self._tree
+                and other._ix == self._ix)
+
+    def __hash__(self):
+        return hash(self._ix)
+
+    def get_index(self):
+        return self._ix
+
+    def get_parent(self):
+        parent = self._tree._parent[self._ix]
+        return ArrayNode(self._tree, parent) if parent != NO_NODE else None
+
+    def has_children(self):
+        return self._tree._first_child[self._ix] != NO_NODE
+
+    def get_children(self):
+        return [ArrayNode(self._tree, ix) for ix in self._tree.get_children(self._ix)]
+
+    def get_label(self):
+        return self._tree.get_label(self._ix)
+
+    def get_distance(self):
+        return self._tree.get_distance(self._ix)
+
+    def get_bootstrap(self):
+        return self._tree.get_bootstrap(self._ix)
+
+    def get_distance_height(self):
+        distance_height = self._tree.get_summary()[4][self._ix]
+        return None if math.isnan(distance_height) else distance_height
+
+    def set_label(self, label):
+        self._tree.set_label(self._ix, label)
+
+    def set_distance(self, distance):
+        self._tree.set_distance(self._ix, distance)
+
+    def set_bootstrap(self, bootstrap):
+        self._tree.set_bootstrap(self._ix, bootstrap)
+
+    def get_leaves(self):
+        first_child = self._tree._first_child
+        return [ArrayNode(self._tree, ix) for ix in self._subtree()
+                if first_child[ix] == NO_NODE]
+
+    def get_all_nodes(self):
+        return list(self.iter_preorder())
+
+    def iter_preorder(self):
+        tree = self._tree
+        for ix in self._subtree():
+            yield ArrayNode(tree, ix)
+
+    def iter_postorder(self):
+        tree = self._tree
+        stack = [(self._ix, tree._first_child[self._ix])]
+        while stack:
+            (ix, child) = stack[-1]
+            if child == NO_NODE:
+                stack.pop()
+                yield ArrayNode(tree, ix)
+            else:
+                stack[-1] = (ix, tree._next_sibling[child])
+                stack.append((child, tree._first_child[child]))
+
+    def _subtree(self):
+        # a subtree is a contiguous range in preorder
+        size = self._tree.get_summary()[0][self._ix]
+        return range(self._ix, self._ix + size)
+
+    def get_height(self):
+        return self._tree.get_summary()[3][self._ix]
+
+    def get_leaf_count(self):
+        return self._tree.get_summary()[1][self._ix]
+
+    def get_leaf_range(self):
+        (_, leaf_count, first_leaf, _, _) = self._tree.get_summary()
+        first = first_leaf[self._ix]
+        return (first, first + leaf_count[self._ix] - 1)
+
+    # graphical stuff
+
+    degrees = _column_property('degrees')
+    radians = _column_property('radians')
+    x = _column_property('x')
+    y = _column_property('y')
+
+    textcolor = _style_property(TEXTCOLOR)
+    linecolor = _style_property(LINECOLOR)
+    linestroke = _style_property(LINESTROKE)
+    dotcolour = _style_property(DOTCOLOUR)
+    bannercolor = _style_property(BANNERCOLOR)
+
+    def get_radian_span(self):
+        (lowest, highest, _) = self._tree.get_radian_summary()
+        return (lowest[self._ix], highest[self._ix])
+
+    def get_average_radians(self):
+        (_, _, total) = self._tree.get_radian_summary()
+        return total[self._ix] / self.get_leaf_count()
+
+    def summarize_radians(self):
+        self._tree.summarize_radians()
+
+    def upmerge_linestyle(self):
+        self._tree.upmerge_linestyle()
+
+# ===========================================================================
+# CONSTRUCTION
+
+def parse_string(data):
+    'Parses Newick straight into an ArrayTree, with no NewickNode objects.'
+    tree = ArrayTree()
+    current = NO_NODE
+    closed = NO_NODE # the node just closed with ')', which gets the next text
+    tokens = newick.TOKENIZER.split(data)
+    for ix in range(0, len(tokens) - 1, 2):
+        text = tokens[ix]
+        if text:
+            (label, distance, bootstrap) = newick.parse_node_text(text)
+            if closed != NO_NODE:
+                if label:
+                    tree._set_pool_label(closed, label)
+                tree.set_distance(closed, distance)
+                tree.set_bootstrap(closed, bootstrap)
+            else:
+                tree._add_node(current, label, distance)
+
+        punct = tokens[ix + 1]
+        if punct == '(':
+            current = tree._add_node(current)
+            closed = NO_NODE
+        elif punct == ',':
+            closed = NO_NODE
+        elif punct == ')':
+            closed = current
+            current = tree._parent[current]
+        else: # ';'
+            break
+
+    return tree._finish()
+
+def from_tree(root):
+    'Converts a tree of NewickNode objects into an ArrayTree.'
+    tree = ArrayTree()
+    index = {} # id(node) -> index
+    for node in root.iter_preorder():
+        parent = index[id(node.get_parent())] if node is not root else NO_NODE
+        index[id(node)] = tree._add_node(parent, node.get_label(),
+                                         node.get_distance(),
+                                         node.get_bootstrap())
+    return tree._finish()
@@ -0,0 +1,250 @@
+'''
+Rendering of many trees in one process.
+
+The inputs are Newick files, glob patterns, or manifest files listing
+the tree files (and optionally the output files). A Newick file with
+several trees, like a set of bootstrap trees, gives one output per
+tree. The style rules and the metadata are loaded once for the whole
+batch.
+'''
+
+import concurrent.futures, glob, os, sys, time
+from sprake import newick, treeviz, style, metadata
+
+SUFFIXES = {
+    'SVG'  : '.svg',
+    'SVGZ' : '.svgz',
+    'PNG'  : '.png',
+    'PDF'  : '.pdf',
+    'TILES': '-tiles', # a directory
+}
+
+def rename(infile, format, number = None):
+    '''The output file for infile. number is for files with several
+    trees, so that each tree gets its own output.'''
+    ix = infile.rfind('.')
+    base = infile[ : ix] if ix > infile.rfind(os.sep) else infile
+    if number is not None:
+        base = '%s-%04d' % (base, number)
+    return base + SUFFIXES[format]
+
+def find_tree_files(patterns):
+    'Expands the glob patterns, keeping names that are not patterns.'
+    filenames = []
+    for pattern in patterns:
+        if any(ch in pattern for ch in '*?['):
+            filenames += sorted(glob.glob(pattern))
+        else:
+            filenames.append(pattern)
+    return filenames
+
+def read_manifest(filename):
+    '''Reads a manifest: one tree file per line, optionally followed by
+    whitespace and the output file. Paths are relative to the manifest,
+    and blank lines and lines starting with # are ignored. Returns a list
+    of (treefile, outfile), where outfile may be None.'''
+    directory = os.path.dirname(filename)
+    entries = []
+    for line in open(filename):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        parts = line.split(None, 1)
+        treefile = os.path.join(directory, parts[0])
+        outfile = os.path.join(directory, parts[1]) if len(parts) > 1 else None
+        entries.append((treefile, outfile))
+    return entries
+
+def iter_jobs(entries, format):
+    '''Yields (name, outfile, data) for every tree in the (treefile,
+    outfile) entries, where data is the Newick text of the tree. The files
+    are read one tree at a time. If a file can't be read, the exception is
+    given instead of the text.'''
+    for (treefile, outfile) in entries:
+        try:
+            yield from _iter_file_jobs(treefile, outfile, format)
+        except Exception as e:
+            yield (treefile, outfile, e)
+
+def _iter_file_jobs(treefile, outfile, format):
+    trees = newick.iter_tree_strings(treefile)
+    first = next(trees, None)
+    second = next(trees, None)
+    if first is None:
+        return
+    elif second is None:
+        yield (treefile, outfile or rename(treefile, format), first)
+        return
+
+    # several trees: number the outputs
+    for (number, data) in enumerate(_chain(first, second, trees), 1):
+        yield ('%s#%s' % (treefile, number),
+               rename(outfile or treefile, format, number), data)
+
+def _chain(first, second, rest):
+    yield first
+    yield second
+    yield from rest
+
+def iter_tasks(jobs, formats):
+    '''Yields (name, targets, data) for each job, where targets is a list
+    of (outfile, format) with the outfile suffix changed to match each of
+    the formats.'''
+    for (name, outfile, data) in jobs:
+        yield (name, [(outfile and rename(outfile, format), format)
+                      for format in formats], data)
+
+class BatchRenderer:
+    '''Renders trees with the same settings. The style rules are compiled
+    and the metadata is loaded once, and reused for every tree.'''
+
+    def __init__(self, mode = 'tree', format = 'SVG', stylefile = None,
+                 datafile = None, id_field = 'ID', layout_cache = None,
+                 drawer_options = None):
+        self._mode = mode
+        self._format = format
+        self._layout_cache = layout_cache
+        self._drawer_options = drawer_options
+        self._rules = None
+        self._data = None
+        if stylefile and datafile:
+            rules = style.parse_style(stylefile)
+            self._rules = style.compile_rules(rules)
+            # the IDs of all the trees aren't known up front, so all rows
+            # are kept, but only the columns the rules use
+            self._data = metadata.Metadata(datafile, id_field,
+                                           fields = style.get_data_fields(rules))
+
+    def render(self, tree, outfile, format = None):
+        self.render_targets(tree, [(outfile, format or self._format)])
+
+    def render_targets(self, tree, targets):
+        '''Renders the tree to each (outfile, format) in targets. With more
+        than one, the layout and the drawing are done once for all.'''
+        text_legend = None
+        dot_legend = None
+        if self._rules:
+            (text_legend, dot_legend) = style.apply_rules(tree, self._rules,
+                                                          self._data)
+
+        if len(targets) == 1:
+            ((outfile, format), ) = targets
+            if self._mode == 'tree':
+                treeviz.render_tree(outfile, tree, dot_legend = dot_legend,
+                                    text_legend = text_legend,
+                                    format = format,
+                                    layout_cache = self._layout_cache,
+                                    drawer_options = self._drawer_options)
+            else:
+                treeviz.render_straight(outfile, tree, dot_legend = dot_legend,
+                                        text_legend = text_legend,
+                                        format = format,
+                                        layout_cache = self._layout_cache,
+                                        drawer_options = self._drawer_options)
+        elif self._mode == 'tree':
+            treeviz.render_tree_formats(targets, tree, dot_legend = dot_legend,
+                                        text_legend = text_legend,
+                                        layout_cache = self._layout_cache,
+                                        drawer_options = self._drawer_options)
+        else:
+            treeviz.render_straight_formats(targets, tree,
+                                            dot_legend = dot_legend,
+                                            text_legend = text_legend,
+                                            layout_cache = self._layout_cache,
+                                            drawer_options = self._drawer_options)
+
+    def render_task(self, task):
+        '''Parses and renders one (name, targets, data) from iter_tasks.
+        Returns a (name, outfile, error) for each target, where error is
+        None if the tree was rendered.'''
+        (name, targets, data) = task
+        try:
+            if isinstance(data, Exception):
+                raise data
+            self.render_targets(newick.parse_string(data), targets)
+            error = None
+        except Exception as e:
+            error = '%s: %s' % (type(e).__name__, e)
+        return [(name, outfile, error) for (outfile, format) in targets]
+
+    def render_all(self, jobs, progress = None, formats = None):
+        '''Renders every (name, outfile, data) from iter_jobs, in each of
+        the formats (by default just the renderer's). A tree that fails
+        doesn't stop the batch. Returns a list of (name, outfile, error)
+        from render_task.'''
+        results = []
+        for task in iter_tasks(jobs, formats or [self._format]):
+            for result in self.render_task(task):
+                results.append(result)
+                if progress:
+                    progress(result, len(results))
+        return results
+
+# ===========================================================================
+# PARALLEL RENDERING
+
+# the renderer of a worker process, made once by _init_worker
+_worker_renderer = None
+
+def _init_worker(settings):
+    global _worker_renderer
+    _worker_renderer = BatchRenderer(**settings)
+
+def _render_in_worker(task):
+    return _worker_renderer.render_task(task)
+
+def render_parallel(jobs, workers = None, progress = None, formats = None,
+                    **settings):
+    '''Like BatchRenderer.render_all, but spreads the trees over worker
+    processes. settings are the BatchRenderer arguments; each
+    worker makes its renderer once, so the style and the metadata are
+    loaded once per worker. The results are in the order of the jobs,
+    whatever the number of workers and the order they finish in.'''
+    workers = workers or os.cpu_count() or 1
+    tasks = iter_tasks(jobs, formats or [settings.get('format', 'SVG')])
+    results = {} # task number -> results for its targets
+    count = 0
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers = workers, initializer = _init_worker,
+            initargs = (settings, )) as executor:
+        # only a few tasks per worker are submitted at a time, so that
+        # huge batches aren't all read into memory at once
+        pending = {}
+        for (number, task) in enumerate(tasks):
+            pending[executor.submit(_render_in_worker, task)] = number
+            if len(pending) >= workers * 4:
+                count = _collect(pending, results, count, progress,
+                                 concurrent.futures.FIRST_COMPLETED)
+        _collect(pending, results, count, progress,
+                 concurrent.futures.ALL_COMPLETED)
+
+    return [result for number in range(len(results))
+            for result in results[number]]
+
+def _collect(pending, results, count, progress, return_when):
+    (done, _) = concurrent.futures.wait(pending, return_when = return_when)
+    for future in done:
+        results[pending.pop(future)] = future.result()
+        for result in future.result():
+            count += 1
+            if progress:
+                progress(result, count)
+    return count
+
+class ProgressReport:
+    'Reports every rendered tree on stderr, with the rate so far.'
+
+    def __init__(self, out = None):
+        self._out = out or sys.stderr
+        self._start = time.perf_counter()
+
+    def __call__(self, result, count):
+        (name, outfile, error) = result
+        elapsed = time.perf_counter() - self._start
+        if error:
+            self._out.write('%6d  FAILED %s: %s\n' % (count, name, error))
+        else:
+            self._out.write('%6d  %s  (%.1f trees/s)\n' %
+                            (count, outfile, count / max(elapsed, 1e-9)))
+        self._out.flush()
@@ -0,0 +1,70 @@
+'''
+Client for the render server in server.py, over TCP or a Unix socket.
+'''
+
+import http.client, json, socket, urllib.parse
+
+class ServerError(Exception):
+    'A request the server answered with an error. status is the HTTP status.'
+
+    def __init__(self, status, message):
+        Exception.__init__(self, '%s: %s' % (status, message))
+        self.status = status
+        self.message = message
+
+class RenderClient:
+    '''Talks to a render server at url (like http://127.0.0.1:8123), or on
+    the Unix socket at socket_path. One connection is kept open, so a
+    client must not be shared between threads.'''
+
+    def __init__(self, url = 'http://127.0.0.1:8123', socket_path = None,
+                 timeout = 300):
+        if socket_path:
+            self._connection = _UnixHTTPConnection(socket_path, timeout)
+        else:
+            parts = urllib.parse.urlsplit(url)
+            self._connection = http.client.HTTPConnection(
+                parts.hostname, parts.port or 80, timeout = timeout)
+
+    def render(self, data, format = 'SVG', mode = 'tree', style = None,
+               metadata = None):
+        '''Renders the Newick text data, returning the file as bytes.
+        style and metadata are the names the server knows them by.'''
+        query = {'format' : format, 'mode' : mode}
+        if style:
+            query['style'] = style
+        if metadata:
+            query['data'] = metadata
+        return self._request('POST', '/render?' + urllib.parse.urlencode(query),
+                             data.encode('utf-8'))
+
+    def health(self):
+        return json.loads(self._request('GET', '/health').decode('utf-8'))
+
+    def close(self):
+        self._connection.close()
+
+    def _request(self, method, path, body = None):
+        try:
+            self._connection.request(method, path, body)
+            response = self._connection.getresponse()
+        except (http.client.HTTPException, ConnectionError):
+            # the server may have closed the connection, so try a new one
+            self._connection.close()
+            self._connection.request(method, path, body)
+            response = self._connection.getresponse()
+        result = response.read()
+        if response.status != 200:
+            raise ServerError(response.status, result.decode('utf-8').strip())
+        return result
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, socket_path, timeout):
+        http.client.HTTPConnection.__init__(self, 'localhost', timeout = timeout)
+        self._socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._socket_path)
@@ -0,0 +1,416 @@
+'''
+Display lists: the drawing operations for a tree, between treeviz and
+the drawers.
+
+treeviz draws into a DisplayList, which has the same methods as the
+drawers, and the list is then replayed into the real drawers. The
+operations are kept in flat arrays, so that a list is compact, can be
+rewritten by optimisation passes, and can be pickled and replayed
+later without redoing the layout.
+
+Every operation records its owner, which is the index of the node (in
+preorder) that it was drawn for, or a negative number for the rest,
+like NO_OWNER.
+
+Recording costs a couple of microseconds per op, so a single render
+draws straight into its drawer, and display lists are used where the
+drawing is replayed: into several formats, or from a cache. The
+optimisation passes are optional, since they change the output (though
+not what it looks like).
+'''
+
+import array, math
+from sprake import spatial, style
+
+# op codes
+CREATE       = 0 # args: two sizes, passed on as they were given
+LINE         = 1 # args: x1, y1, x2, y2, stroke
+CIRCLE       = 2 # args: x, y, r
+ARC          = 3 # args: cx, cy, start, end, r, stroke. string: id or None
+TEXT         = 4 # args: x, y, degree. string: the text
+TEXT_ON_PATH = 5 # args: font size. string: (text, curve id)
+
+OP_NAMES = ['CREATE', 'LINE', 'CIRCLE', 'ARC', 'TEXT', 'TEXT_ON_PATH']
+
+ARGS = 6 # number of arg slots per op
+
+# flags: bits 0-5 mark args that were ints, so that they are replayed as
+# ints, and drawers write them out the same way
+DASH = 1 << 6
+INT_ARGS = DASH - 1
+LINE_INT_STROKE = 1 << 4 # flags of a line with only the stroke an int
+
+NO_OWNER = -1
+
+class DisplayList:
+
+    def __init__(self, measurer = None):
+        'measurer is the drawer measuring text while the list is drawn.'
+        self._measurer = measurer
+        self.owner = NO_OWNER # owner of the ops being added
+
+        self.ops = array.array('B')
+        self.owners = array.array('l')
+        self.args = array.array('d') # ARGS per op
+        self.flags = array.array('B')
+        self.colors = array.array('l') # index into color_table
+        self.strings = array.array('l') # index into string_table
+        self.color_table = [None] # index 0 is for no color
+        self.string_table = [None]
+        self._color_ix = {None : 0} # color -> index
+        self._string_ix = {None : 0}
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __getstate__(self):
+        # the lookup dicts are rebuilt, and the measurer isn't needed
+        state = dict(self.__dict__)
+        for key in ('_measurer', '_color_ix', '_string_ix'):
+            del state[key]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._measurer = None
+        self._color_ix = {color : ix for (ix, color) in enumerate(self.color_table)}
+        self._string_ix = {string : ix
+                           for (ix, string) in enumerate(self.string_table)}
+
+    # --- THE DRAWER METHODS, WHICH RECORD
+
+    def get_font_size(self):
+        return self._measurer.get_font_size()
+
+    def get_text_size(self, text):
+        '(height, width)'
+        return self._measurer.get_text_size(text)
+
+    def create(self, first, second):
+        self.add(CREATE, (first, second))
+
+    def line(self, start, end, color = style.BLACK, stroke = 1, dash = False):
+        # the most common op, so this is add() unrolled
+        args = (start[0], start[1], end[0], end[1], stroke)
+        types = tuple(map(type, args))
+        int_flags = _INT_FLAGS.get(types)
+        if int_flags is None:
+            int_flags = _get_int_flags(types)
+        color_ix = self._color_ix.get(color)
+        if color_ix is None:
+            color_ix = self._add_color(color)
+
+        self.ops.append(LINE)
+        self.owners.append(self.owner)
+        self.args.extend(args + _PADDING[5])
+        self.flags.append(int_flags | DASH if dash else int_flags)
+        self.colors.append(color_ix)
+        self.strings.append(0)
+
+    def circle(self, pos, r, color = style.BLACK):
+        self.add(CIRCLE, (pos[0], pos[1], r), color)
+
+    def circle_segment(self, x, y, start, end, r, color = style.BLACK,
+                       stroke = 1, id = None):
+        self.add(ARC, (x, y, start, end, r, stroke), color, id)
+
+    def draw_text(self, pos, text, degree = 0, color = style.BLACK):
+        self.add(TEXT, (pos[0], pos[1], degree), color, text)
+
+    def draw_text_on_path(self, text, curve_id, font_size):
+        self.add(TEXT_ON_PATH, (font_size, ), None, (text, curve_id))
+
+    def add(self, op, args, color = None, string = None, flags = 0,
+            owner = None):
+        'Appends an op. args are numbers, at most ARGS of them.'
+        # this is called for every op, so it avoids loops over the args
+        types = tuple(map(type, args))
+        int_flags = _INT_FLAGS.get(types)
+        if int_flags is None:
+            int_flags = _get_int_flags(types)
+        color_ix = self._color_ix.get(color)
+        if color_ix is None:
+            color_ix = self._add_color(color)
+        string_ix = self._string_ix.get(string)
+        if string_ix is None:
+            string_ix = self._string_ix[string] = len(self.string_table)
+            self.string_table.append(string)
+
+        self.ops.append(op)
+        self.owners.append(self.owner if owner is None else owner)
+        self.args.extend(args + _PADDING[len(args)])
+        self.flags.append(flags | int_flags)
+        self.colors.append(color_ix)
+        self.strings.append(string_ix)
+
+    def _add_color(self, color):
+        ix = self._color_ix[color] = len(self.color_table)
+        self.color_table.append(color)
+        return ix
+
+    # --- READING
+
+    def get_args(self, ix):
+        'The args of op ix, as they were given.'
+        values = self.args[ix * ARGS : ix * ARGS + _ARG_COUNTS[self.ops[ix]]]
+        return _restore_ints(values, self.flags[ix])
+
+    def get_color(self, ix):
+        return self.color_table[self.colors[ix]]
+
+    def get_string(self, ix):
+        return self.string_table[self.strings[ix]]
+
+    def get_bounds(self, ix):
+        '''The (left, top, right, bottom) box that op ix draws within, or
+        None for ops that aren't drawn at a place (CREATE and
+        TEXT_ON_PATH). The text boxes are measured with the measurer, with
+        room below the baseline, so they're a bit bigger than the text.'''
+        op = self.ops[ix]
+        base = ix * ARGS
+        if op == LINE:
+            (x1, y1, x2, y2, stroke) = self.args[base : base + 5]
+            half = stroke / 2.0
+            return (min(x1, x2) - half, min(y1, y2) - half,
+                    max(x1, x2) + half, max(y1, y2) + half)
+        elif op == TEXT:
+            (x, y, degree) = self.args[base : base + 3]
+            size = self.get_text_size(self.get_string(ix))
+            return spatial.get_text_bounds(x, y, degree, size)
+        elif op == ARC:
+            (cx, cy, start, end, r, stroke) = self.args[base : base + 6]
+            return spatial.get_arc_bounds(cx, cy, start, end, r, stroke)
+        elif op == CIRCLE:
+            (x, y, r) = self.args[base : base + 3]
+            return (x - r, y - r, x + r, y + r)
+        return None
+
+    def replay(self, drawer, ops = None):
+        'Makes the drawing calls on drawer, for all ops or just some of them.'
+        (args, flags) = (self.args, self.flags)
+        (colors, color_table) = (self.colors, self.color_table)
+        (strings, string_table) = (self.strings, self.string_table)
+        (line, draw_text) = (drawer.line, drawer.draw_text)
+        for ix in (range(len(self.ops)) if ops is None else ops):
+            op = self.ops[ix]
+            base = ix * ARGS
+            values = args[base : base + _ARG_COUNTS[op]]
+            int_flags = flags[ix] & INT_ARGS
+            if op == LINE and int_flags == LINE_INT_STROKE:
+                # the usual line, with only the stroke an int
+                (x1, y1, x2, y2, stroke) = values
+                line((x1, y1), (x2, y2), color = color_table[colors[ix]],
+                     stroke = int(stroke), dash = bool(flags[ix] & DASH))
+                continue
+            elif int_flags:
+                values = _restore_ints(values, int_flags)
+
+            if op == LINE:
+                (x1, y1, x2, y2, stroke) = values
+                line((x1, y1), (x2, y2), color = color_table[colors[ix]],
+                     stroke = stroke, dash = bool(flags[ix] & DASH))
+            elif op == TEXT:
+                (x, y, degree) = values
+                draw_text((x, y), string_table[strings[ix]], degree,
+                          color_table[colors[ix]])
+            elif op == ARC:
+                (x, y, start, end, r, stroke) = values
+                drawer.circle_segment(x, y, start, end, r,
+                                      color = color_table[colors[ix]],
+                                      stroke = stroke,
+                                      id = string_table[strings[ix]])
+            elif op == CIRCLE:
+                (x, y, r) = values
+                drawer.circle((x, y), r, color_table[colors[ix]])
+            elif op == CREATE:
+                drawer.create(values[0], values[1])
+            elif op == TEXT_ON_PATH:
+                (text, curve_id) = string_table[strings[ix]]
+                drawer.draw_text_on_path(text, curve_id, values[0])
+            else:
+                assert False, 'Unknown op %s' % op
+
+    def count_ops(self):
+        'Returns a dict of op name -> number of ops.'
+        counts = {}
+        for op in self.ops:
+            counts[OP_NAMES[op]] = counts.get(OP_NAMES[op], 0) + 1
+        return counts
+
+    def new_patch(self):
+        '''An empty list sharing the colors and strings of this one, for
+        drawing ops to put in with replace_owners.'''
+        patch = DisplayList(self._measurer)
+        patch.color_table = self.color_table
+        patch.string_table = self.string_table
+        patch._color_ix = self._color_ix
+        patch._string_ix = self._string_ix
+        return patch
+
+    def select(self, keep):
+        'Returns a new list with the ops whose indexes are in keep, in order.'
+        selected = self.new_patch()
+        selected.ops = array.array('B', [self.ops[ix] for ix in keep])
+        selected.owners = array.array('l', [self.owners[ix] for ix in keep])
+        selected.flags = array.array('B', [self.flags[ix] for ix in keep])
+        selected.colors = array.array('l', [self.colors[ix] for ix in keep])
+        selected.strings = array.array('l', [self.strings[ix] for ix in keep])
+        (args, extend) = (self.args, selected.args.extend)
+        for ix in keep:
+            extend(args[ix * ARGS : (ix + 1) * ARGS])
+        return selected
+
+    def _extend(self, other, start, end):
+        'Appends ops start to end of other, which shares the tables.'
+        self.ops.extend(other.ops[start : end])
+        self.owners.extend(other.owners[start : end])
+        self.args.extend(other.args[start * ARGS : end * ARGS])
+        self.flags.extend(other.flags[start : end])
+        self.colors.extend(other.colors[start : end])
+        self.strings.extend(other.strings[start : end])
+
+_ARG_COUNTS = [2, 5, 3, 6, 3, 1]
+_PADDING = [(0.0, ) * (ARGS - count) for count in range(ARGS + 1)]
+_INT_FLAGS = {} # tuple of arg types -> flags for the ints
+
+def _get_int_flags(types):
+    flags = _INT_FLAGS[types] = sum(1 << ix for (ix, kind) in enumerate(types)
+                                    if kind is int)
+    return flags
+
+def _restore_ints(values, flags):
+    return [int(value) if flags & (1 << pos) else value
+            for (pos, value) in enumerate(values)]
+
+# ===========================================================================
+# EDITING
+
+# the groups of ops of a node that are drawn apart: the labels and dots
+# before the tree, the branches, and the arcs after the node's children
+_GROUPS = {TEXT : 0, CIRCLE : 0, ARC : 2}
+
+def replace_owners(display, patch, owners):
+    '''Returns a list with the ops of the owners replaced by their ops in
+    patch, which must come from display.new_patch(). The labels and dots
+    of an owner, its arcs, and its other ops, each go where the old ones
+    were, so the result is in the order the whole tree would be drawn in.'''
+    groups = {} # (owner, group) -> indexes of its ops in patch
+    for ix in range(len(patch)):
+        key = (patch.owners[ix], _GROUPS.get(patch.ops[ix], 1))
+        groups.setdefault(key, []).append(ix)
+
+    result = display.new_patch()
+    (ops, old_owners) = (display.ops, display.owners)
+    start = 0 # the first old op not yet copied
+    for ix in range(len(ops)):
+        owner = old_owners[ix]
+        if owner not in owners:
+            continue
+        result._extend(display, start, ix)
+        start = ix + 1
+        for patch_ix in groups.pop((owner, _GROUPS.get(ops[ix], 1)), ()):
+            result._extend(patch, patch_ix, patch_ix + 1)
+    result._extend(display, start, len(ops))
+
+    # ops of a kind the owner didn't have before go last
+    for ixs in groups.values():
+        for patch_ix in ixs:
+            result._extend(patch, patch_ix, patch_ix + 1)
+    return result
+
+# ===========================================================================
+# OPTIMISATION PASSES
+
+# each pass takes a display list and returns an optimised one
+
+def cull_empty(display):
+    'Drops lines of zero length and arcs of zero angle, which draw nothing.'
+    return _simplify(display, cull = True, merge = False)
+
+def merge_collinear(display):
+    '''Joins consecutive lines where one continues the other in the same
+    direction, with the same style and owner.'''
+    return _simplify(display, cull = False, merge = True)
+
+def simplify(display):
+    'cull_empty and merge_collinear in one pass.'
+    return _simplify(display, cull = True, merge = True)
+
+def _simplify(display, cull, merge):
+    (ops, args) = (display.ops, display.args)
+    keep = []
+    ends = {} # kept line -> the line whose end it now has
+    last = None # the last kept op, if it's a line
+    (end_x, end_y) = (None, None) # where that line ends
+    for ix in range(len(ops)):
+        op = ops[ix]
+        base = ix * ARGS
+        if op == LINE:
+            (x1, y1, x2, y2) = args[base : base + 4]
+            if cull and x1 == x2 and y1 == y2:
+                continue
+            if merge and x1 == end_x and y1 == end_y and \
+               _continues(display, last, ends.get(last, last), ix):
+                ends[last] = ix
+            else:
+                keep.append(ix)
+                last = ix
+            (end_x, end_y) = (x2, y2)
+            continue
+        elif cull and op == ARC and args[base + 2] == args[base + 3]:
+            continue
+
+        keep.append(ix)
+        (last, end_x, end_y) = (None, None, None)
+
+    if len(keep) == len(ops):
+        return display
+
+    simplified = display.select(keep)
+    for (pos, ix) in enumerate(keep):
+        if ix in ends:
+            end = ends[ix]
+            base = pos * ARGS
+            simplified.args[base + 2 : base + 4] = \
+                args[end * ARGS + 2 : end * ARGS + 4]
+            simplified.flags[pos] = (simplified.flags[pos] & ~0b1100) | \
+                                    (display.flags[end] & 0b1100)
+    return simplified
+
+def _continues(display, first, last, ix):
+    '''Whether line ix continues the line from the start of line first to
+    the end of line last.'''
+    if display.owners[first] != display.owners[ix] or \
+       display.colors[first] != display.colors[ix] or \
+       display.flags[first] & DASH != display.flags[ix] & DASH:
+        return False
+
+    args = display.args
+    (x1, y1) = args[first * ARGS : first * ARGS + 2]
+    (x2, y2) = args[last * ARGS + 2 : last * ARGS + 4]
+    (x3, y3, x4, y4, stroke) = args[ix * ARGS : ix * ARGS + 5]
+    if stroke != args[first * ARGS + 4] or (x2, y2) != (x3, y3):
+        return False
+
+    # same direction, not doubling back
+    (dx1, dy1, dx2, dy2) = (x2 - x1, y2 - y1, x4 - x3, y4 - y3)
+    cross = dx1 * dy2 - dy1 * dx2
+    scale = math.hypot(dx1, dy1) * math.hypot(dx2, dy2)
+    return abs(cross) <= 1e-9 * scale and dx1 * dx2 + dy1 * dy2 > 0
+
+def batch_by_style(display):
+    '''Reorders the ops so that ops of the same kind and style follow each
+    other, which lets drawers like CompactSVGDrawer merge them. This
+    changes which op is painted on top where they overlap. CREATE stays
+    first.'''
+    def sort_key(ix):
+        op = display.ops[ix]
+        stroke = display.args[ix * ARGS + 4] if op in (LINE, ARC) else 0
+        return (op != CREATE, op, display.colors[ix], stroke,
+                display.flags[ix] & DASH)
+    return display.select(sorted(range(len(display.ops)), key = sort_key))
+
+def optimize(display, passes):
+    for optimization in passes:
+        display = optimization(display)
+    return display
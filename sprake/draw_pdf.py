@@ -1,6 +1,7 @@
 
 import math
-from sprake import style
+from sprake import style, textmetrics
+from sprake.displaylist import NO_OWNER
 
 def rad2deg(rad):
     return (rad / math.pi) * 180
@@ -8,14 +9,14 @@ def rad2deg(rad):
 import fpdf
 class PDFDrawer:
 
+    # see SVGDrawer.owner
+    owner = NO_OWNER
+
     def __init__(self, outfile, fontsize):
         self._outfile = outfile
         self._fontsize = fontsize
-
-        # this is a dummy we just use for font size calculations
-        # we overwrite it with a correctly sized one afterwards
-        self._pdf = fpdf.FPDF('P', 'mm', format = 'A4')
-        self._pdf.set_font('Helvetica', size = self._fontsize)
+        self._height = None
+        self._pdf = None
 
     def create(self, width, height):
         # instead of A4 we can compute the size and have (width, height)
@@ -29,11 +30,21 @@ class PDFDrawer:
 
     def get_text_size(self, text):
         'Returns (height, width)'
-
-        # trying to estimate
-        height = self._pdf.get_string_width('X')
-
-        return (self._unconv(height), self._unconv(self._pdf.get_string_width(text)))
+        return textmetrics.METRICS.get_text_size(('PDF', self._fontsize), text,
+                                                 self._measure_text)
+
+    def _measure_text(self, text):
+        if self._pdf is None:
+            # this is a dummy we just use for font size calculations
+            # we overwrite it with a correctly sized one afterwards. it's
+            # only needed for text that isn't in textmetrics already
+            self._pdf = fpdf.FPDF('P', 'mm', format = 'A4')
+            self._pdf.set_font('Helvetica', size = self._fontsize)
+        if self._height is None:
+            # trying to estimate
+            self._height = self._unconv(self._pdf.get_string_width('X'))
+
+        return (self._height, self._unconv(self._pdf.get_string_width(text)))
 
     # degree: actually in degrees
     def draw_text(self, pos, text, degree = 0, color = style.BLACK):
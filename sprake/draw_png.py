@@ -1,58 +1,165 @@
 
-import platform
-from sprake import style
+import collections, functools, math, platform, threading
+from sprake import style, textmetrics
+from sprake.displaylist import NO_OWNER
+
+from PIL import Image, ImageDraw, ImageFont
+
+# labels are rotated to the nearest multiple of this, in degrees, so that
+# rendered labels can be reused
+ANGLE_STEP = 1
 
-from PIL import Image, ImageDraw, ImageFont, ImageOps
 class PNGDrawer:
 
-    def __init__(self, outfile, fontsize):
+    # see SVGDrawer.owner
+    owner = NO_OWNER
+
+    # scale: draw at this many times the size and scale down when saving,
+    # which antialiases the lines and arcs
+    def __init__(self, outfile, fontsize, scale = 1):
         self._font = locate_font(fontsize)
         self._outfile = outfile
         self._fontsize = fontsize
+        self._scale = scale
+        self._drawfont = locate_font(max(1, fontsize * scale))
 
     def get_font_size(self):
         return self._fontsize
 
     def get_text_size(self, text):
         '(height, width)'
+        return textmetrics.METRICS.get_text_size(
+            ('PNG', self._font.path, self._fontsize), text, self._measure_text)
+
+    def _measure_text(self, text):
         (left, top, right, bottom) = self._font.getbbox(text)
         return (bottom - top, right - left)
 
+    # the arguments are in the same order as for SVGDrawer
     def create(self, height, width):
-        self._image = Image.new('RGB', (int(height), int(width)), (255, 255, 255))
+        self._size = (int(width), int(height))
+        self._image = Image.new('RGB', (int(width) * self._scale,
+                                        int(height) * self._scale),
+                                (255, 255, 255))
         self._realdraw = ImageDraw.Draw(self._image)
 
+    # pos: left edge and baseline of the text, before rotating
     def draw_text(self, pos, text, degree = 0, color = style.BLACK):
-        size = self.get_text_size(text)
-        buffer = Image.new('L', size)
-        draw = ImageDraw.Draw(buffer)
-        draw.text(
-            (0, 0),
-            text = text,
-            fill = 255,
-            font = self._font,
-        )
-
-        buffer = buffer.rotate(int(round(degree)), expand = True)
-        # FIXME: need to adjust for expansion of rotated image
-        self._image.paste(ImageOps.colorize(buffer, (0,0,0), (0,0,0)), tuple(map(int, pos)), buffer)
+        # upside-down labels are flipped, like in the other drawers
+        if degree > 90 and degree < 270:
+            degree = degree - 180
+
+        bucket = int(round(degree / ANGLE_STEP)) % (360 // ANGLE_STEP)
+        (mask, (dx, dy)) = GLYPHS.get_glyph(self._drawfont, text, bucket)
+        (x, y) = self._conv(pos)
+        self._image.paste(color.to_rgb_tuple(),
+                          (int(round(x - dx)), int(round(y - dy))), mask)
 
     def circle(self, pos, r, color):
-        (x, y) = pos
-        self._realdraw.ellipse((x - r, y - r, x + r, y + r), fill = color.to_rgb_tuple())
+        (x, y) = self._conv(pos)
+        r = r * self._scale
+        self._realdraw.ellipse((x - r, y - r, x + r, y + r),
+                               fill = color.to_rgb_tuple())
 
+    # x,y: center of circle
+    # start, end: angles in radians, clockwise from 3 o'clock
     def circle_segment(self, x, y, start, end, r, color = style.BLACK,
                        stroke = 1, id = None):
-        pass
+        (x, y) = self._conv((x, y))
+        r = r * self._scale
+        # width grows inwards from the bounding box, so it's centered on r
+        half = stroke * self._scale / 2.0
+        self._realdraw.arc((x - r - half, y - r - half, x + r + half, y + r + half),
+                           math.degrees(start), math.degrees(end),
+                           fill = color.to_rgb_tuple(),
+                           width = max(1, int(round(stroke * self._scale))))
 
-    def line(self, start, end, color = 'black', stroke = 1, dash = False):
-        self._realdraw.line([start, end], fill = color.to_rgb_tuple(), width = stroke)
+    def line(self, start, end, color = style.BLACK, stroke = 1, dash = False):
+        self._realdraw.line([self._conv(start), self._conv(end)],
+                            fill = color.to_rgb_tuple(),
+                            width = max(1, int(round(stroke * self._scale))))
+
+    def _conv(self, pos):
+        return (pos[0] * self._scale, pos[1] * self._scale)
 
     def save(self):
-        self._image.save(self._outfile, 'PNG')
+        image = self._image
+        if self._scale != 1:
+            image = image.resize(self._size, Image.LANCZOS)
+        image.save(self._outfile, 'PNG')
+
+class GlyphCache:
+    '''Rendered labels, as masks, by (font, text, angle bucket). The same
+    labels at the same angles come back when similar trees are rendered,
+    and rendering and rotating text is the slowest part of drawing PNGs.'''
+
+    def __init__(self, max_entries = 50000):
+        self._max_entries = max_entries
+        self._glyphs = collections.OrderedDict() # least recently used first
+        self._lock = threading.Lock()
+        self._rendered = 0
+        self._cached = 0
+
+    def get_glyph(self, font, text, bucket):
+        '''Returns (mask, (dx, dy)), where (dx, dy) is the position in the
+        mask of the left end of the baseline.'''
+        key = (font.path, font.size, text, bucket)
+        with self._lock:
+            glyph = self._glyphs.get(key)
+            if glyph is not None:
+                self._glyphs.move_to_end(key)
+                self._cached += 1
+                return glyph
 
+        glyph = render_glyph(font, text, bucket * ANGLE_STEP)
+        with self._lock:
+            self._rendered += 1
+            self._glyphs[key] = glyph
+            if len(self._glyphs) > self._max_entries:
+                self._glyphs.popitem(last = False)
+        return glyph
+
+    def get_stats(self):
+        '(labels rendered, labels found in the cache), since the start.'
+        return (self._rendered, self._cached)
+
+    def clear(self):
+        with self._lock:
+            self._glyphs.clear()
+
+    def __len__(self):
+        return len(self._glyphs)
+
+GLYPHS = GlyphCache()
+
+def render_glyph(font, text, degree):
+    'Renders text rotated degree counterclockwise. Returns like get_glyph.'
+    (left, top, right, bottom) = font.getbbox(text, anchor = 'ls')
+    mask = Image.new('L', (max(1, right - left), max(1, bottom - top)))
+    ImageDraw.Draw(mask).text((-left, -top), text, fill = 255, font = font,
+                              anchor = 'ls')
+    (ax, ay) = (-left, -top) # the anchor in the mask
+    if not degree:
+        return (mask, (ax, ay))
+
+    # rotate() turns around the center, and expand grows the image
+    # around it, so the anchor is found relative to the centers
+    (cx, cy) = (mask.width / 2.0, mask.height / 2.0)
+    rotated = mask.rotate(degree, resample = Image.BICUBIC, expand = True)
+    rad = math.radians(degree)
+    (rx, ry) = (ax - cx, ay - cy)
+    return (rotated, (rotated.width / 2.0 + rx * math.cos(rad) + ry * math.sin(rad),
+                      rotated.height / 2.0 - rx * math.sin(rad) + ry * math.cos(rad)))
+
+# loading the font file is slow, so fonts are shared between drawers
+@functools.lru_cache(maxsize = None)
 def locate_font(fontsize):
-    try:
-        return ImageFont.truetype('Arial.ttf', fontsize)
-    except OSError:
-        return ImageFont.truetype('resources/cruft.ttf', fontsize)
+    for name in FONTS:
+        try:
+            return ImageFont.truetype(name, fontsize)
+        except OSError:
+            pass
+    return ImageFont.truetype('resources/cruft.ttf', fontsize)
+
+# tried in order, before the bundled font, which is slow to render
+FONTS = ['Arial.ttf', 'DejaVuSans.ttf']
@@ -1,48 +1,68 @@
 
-import string, math
-from sprake import style
+import gzip, io, string, math
+from sprake import style, textmetrics
+from sprake.displaylist import NO_OWNER
 
 UPPERCASE = ''.join(chr(i) for i in range(65, 91))
 LOWERCASE = ''.join(chr(i) for i in range(97, 123))
 DIGITS    = string.digits
 
+def estimate_char_width(ch):
+    'Width of the character relative to the font size, roughly.'
+    if ch in 'O52':
+        return 0.9
+    elif ch in 'MCGE-0O':
+        return 0.8
+    elif ch in 'QBPR_SDA61483 TH':
+        return 0.75
+    elif ch in 'FLY':
+        return 0.6
+    elif ch in '9I':
+        return 0.5
+    elif ch in UPPERCASE or ch in '#nma' or ch in DIGITS:
+        return 0.38
+    elif ch in 'il(),:[]':
+        return 0.2
+    elif ch in LOWERCASE:
+        return 0.3
+    else:
+        return DEFAULT_CHAR_WIDTH
+
+DEFAULT_CHAR_WIDTH = 0.4
+CHAR_WIDTHS = {chr(i) : estimate_char_width(chr(i)) for i in range(128)}
+
 def get_circle_point(cx, cy, deg, r):
     return (int(round(cx + math.cos(deg) * r)),
             int(round(cy + math.sin(deg) * r)))
 
 class SVGDrawer:
 
-    def __init__(self, outfile, fontsize):
+    # the node being drawn, set by treeviz. only a DisplayList records
+    # it, the drawers just declare it
+    owner = NO_OWNER
+
+    # outfile: a filename, or a file object, text or binary, which is
+    # left open. compresslevel: if set, write gzip-compressed SVGZ with
+    # this level (1-9), which needs a binary file
+    def __init__(self, outfile, fontsize, compresslevel = None):
         self._fontsize = fontsize
-        self._out = open(outfile, 'w')
+        (self._out, self._finish) = open_output(outfile, compresslevel)
 
     def get_font_size(self):
         return self._fontsize
 
     def get_text_size(self, text):
+        return textmetrics.METRICS.get_text_size(('SVG', self._fontsize), text,
+                                                 self._estimate_text_size)
+
+    def _estimate_text_size(self, text):
         spacer = 0.06
         spaces = max(0, len(text) - 1) * spacer * self._fontsize
 
         width = 0
+        get_width = CHAR_WIDTHS.get
         for ch in text:
-            if ch in 'O52':
-                width += 0.9
-            elif ch in 'MCGE-0O':
-                width += 0.8
-            elif ch in 'QBPR_SDA61483 TH':
-                width += 0.75
-            elif ch in 'FLY':
-                width += 0.6
-            elif ch in '9I':
-                width += 0.5
-            elif ch in UPPERCASE or ch in '#nma' or ch in DIGITS:
-                width += 0.38
-            elif ch in 'il(),:[]':
-                width += 0.2
-            elif ch in LOWERCASE:
-                width += 0.3
-            else:
-                width += 0.4
+            width += get_width(ch, DEFAULT_CHAR_WIDTH)
 
         return (self._fontsize, self._fontsize * width + spaces)
 
@@ -110,4 +130,151 @@ class SVGDrawer:
 
     def save(self):
         self._out.write('</svg>\n')
-        self._out.close()
+        self._finish()
+
+class CompactSVGDrawer(SVGDrawer):
+    '''Writes smaller SVG, faster. The output is collected in a list and
+    written with a single join at the end. Styling goes into CSS classes
+    instead of being repeated on every element, and consecutive lines and
+    arcs with the same style are merged into a single <path>.'''
+
+    def __init__(self, outfile, fontsize, compresslevel = None):
+        SVGDrawer.__init__(self, outfile, fontsize, compresslevel)
+        self._parts = []
+        self._classes = {} # CSS declarations -> class name
+        self._path_class = None # class of the path being built
+        self._path = []    # segments of the path being built
+        self._path_end = None # where the last segment ended
+
+    def create(self, height, width, background_color = None):
+        self._header = (height, width, background_color)
+
+    def circle(self, pos, r, color = style.BLACK, stroke = 1):
+        self._flush_path()
+        color = color.to_html_rgb()
+        cls = self._get_class('fill:%s;stroke:%s;stroke-width:%s' % (color, color, stroke))
+        (cx, cy) = pos
+        self._parts.append('<circle cx="%s" cy="%s" r="%s" class="%s"/>\n' %
+                           (num(cx), num(cy), num(r), cls))
+
+    def line(self, start, end, color = style.BLACK, stroke = 1, dash = False):
+        start = '%s %s' % (num(start[0]), num(start[1]))
+        self._add_segment(color, stroke, start, 'L', '%s %s' % (num(end[0]), num(end[1])))
+
+    def circle_segment(self, cx, cy, start_angle, end_angle, r,
+                       color = style.BLACK, stroke = 1, id = None):
+        (sx, sy) = get_circle_point(cx, cy, start_angle, r)
+        (ex, ey) = get_circle_point(cx, cy, end_angle, r)
+
+        r = num(r)
+        if id:
+            # must be a separate element, since it's referred to
+            self._flush_path()
+            cls = self._get_class('fill:none;stroke:%s;stroke-width:%s' %
+                                  (color.to_html_rgb(), num(stroke)))
+            self._parts.append('<path d="M%s %sA%s %s 0 0 0 %s %s" class="%s" id="%s"/>\n' %
+                               (ex, ey, r, r, sx, sy, cls, id))
+            return
+
+        self._add_segment(color, stroke, '%s %s' % (ex, ey),
+                          'A%s %s 0 0 0' % (r, r), '%s %s' % (sx, sy))
+
+    def _add_segment(self, color, stroke, start, command, end):
+        cls = self._get_class('fill:none;stroke:%s;stroke-width:%s' %
+                              (color.to_html_rgb(), num(stroke)))
+        if cls != self._path_class:
+            self._flush_path()
+            self._path_class = cls
+
+        if start != self._path_end:
+            self._path.append('M' + start)
+        self._path.append(command + end)
+        self._path_end = end
+
+    def _flush_path(self):
+        if self._path:
+            self._parts.append('<path d="%s" class="%s"/>\n' %
+                               (''.join(self._path), self._path_class))
+        self._path_class = None
+        self._path = []
+        self._path_end = None
+
+    def draw_text(self, pos, text, degree = 0, color = style.BLACK):
+        self._flush_path()
+
+        # something strange about rotation in SVG requires this
+        if degree > 90 and degree < 270:
+            degree = degree - 180
+
+        (x, y) = (num(pos[0]), num(pos[1]))
+        cls = self._get_class('fill:%s;font-size:%spt' %
+                              (color.to_html_rgb(), self._fontsize))
+        transform = ''
+        if degree:
+            transform = ' transform="rotate(%s %s %s)"' % (num(degree * -1), x, y)
+        self._parts.append('<text x="%s" y="%s"%s class="%s">%s</text>\n' %
+                           (x, y, transform, cls, text))
+
+    def draw_text_on_path(self, text, curve_id, fontsize = None):
+        self._flush_path()
+        self._parts.append('<text style="font-size: %spt"><textPath href="#%s" side="right" startOffset="40%%">%s</textPath></text>\n' %
+                           (fontsize, curve_id, text))
+
+    def _get_class(self, css):
+        cls = self._classes.get(css)
+        if not cls:
+            cls = 'c%s' % len(self._classes)
+            self._classes[css] = cls
+        return cls
+
+    def save(self):
+        self._flush_path()
+
+        (height, width, background_color) = self._header
+        bkg = ''
+        if background_color:
+            bkg = ' style="background-color: %s"' % background_color.to_html_rgb()
+        classes = ''.join(['.%s{%s}\n' % (cls, css) for (css, cls) in self._classes.items()])
+
+        self._parts.insert(0, '<svg xmlns="http://www.w3.org/2000/svg" width="%s" height="%s" viewBox="0 0 %s %s"%s>\n<style>\npath:hover{stroke-width:5}\n%s</style>\n' %
+                           (width, height, width, height, bkg, classes))
+        self._parts.append('</svg>\n')
+        self._out.write(''.join(self._parts))
+        self._finish()
+
+def open_output(outfile, compresslevel = None):
+    '''Opens outfile for writing text. Returns the stream, and a function
+    that finishes the output, which closes what was opened here, but not
+    a file object that was passed in.'''
+    if compresslevel is not None:
+        # a GzipFile on a file object leaves the file object open
+        out = gzip.open(outfile, 'wt', compresslevel = compresslevel,
+                        encoding = 'utf-8')
+        return (out, out.close)
+    elif isinstance(outfile, io.TextIOBase):
+        return (outfile, outfile.flush)
+    elif hasattr(outfile, 'write'):
+        out = _Encoder(outfile)
+        return (out, out.flush)
+    out = open(outfile, 'w')
+    return (out, out.close)
+
+class _Encoder:
+    'Writes text to a binary file object, as UTF-8.'
+
+    def __init__(self, outfile):
+        self._outfile = outfile
+
+    def write(self, text):
+        self._outfile.write(text.encode('utf-8'))
+
+    def flush(self):
+        if hasattr(self._outfile, 'flush'):
+            self._outfile.flush()
+
+def num(value):
+    'Formats a coordinate with at most two decimals.'
+    if isinstance(value, int):
+        return str(value)
+    value = ('%.2f' % value).rstrip('0').rstrip('.')
+    return '0' if value == '-0' else value
@@ -0,0 +1,181 @@
+'''
+Tiled raster output, for browsing huge trees in a zoomable viewer.
+
+A big tree needs a raster far too large to hold in memory as one
+image, so the drawing is recorded in a display list, and then drawn
+into fixed-size PNG tiles at several zoom levels, each half the size of
+the next. The ops are put in a spatial index, and each tile only draws
+the ops that intersect it, so memory is bounded by the tile size (and
+the display list).
+
+The tiles are written in the XYZ layout used by web map viewers, like
+Leaflet with CRS.Simple: DIR/zoom/x/y.png, where zoom 0 fits the whole
+picture in one tile. DIR/tiles.json describes the pyramid.
+'''
+
+import io, json, math, os
+from sprake import spatial, style
+from sprake.displaylist import DisplayList, CREATE
+from sprake.draw_png import PNGDrawer
+
+from PIL import Image, ImageDraw
+
+TILE_SIZE = 256
+
+# labels drawn smaller than this, in pixels, are left out
+MIN_FONT_SIZE = 5
+
+# big arcs are drawn as lines about this long, in pixels
+ARC_STEP = 2
+
+class TiledDrawer(DisplayList):
+    '''A drawer writing a tile pyramid to the directory outfile. It
+    records the drawing, measuring text like PNGDrawer, and draws the
+    tiles when saved. max_zoom is the zoom of the most detailed level,
+    where 1 is the size of the picture.'''
+
+    def __init__(self, outfile, fontsize, tile_size = TILE_SIZE, max_zoom = 1):
+        DisplayList.__init__(self, PNGDrawer(None, fontsize))
+        self._outdir = outfile
+        self._tile_size = tile_size
+        self._max_zoom = max_zoom
+
+    def save(self):
+        write_pyramid(self, self._outdir, self._tile_size, self._max_zoom)
+
+class TileDrawer(PNGDrawer):
+    '''Draws the part of the picture in one tile: the square of tile_size
+    pixels with its top left corner at origin in the picture, zoomed.'''
+
+    def __init__(self, outfile, fontsize, zoom, origin, tile_size = TILE_SIZE):
+        PNGDrawer.__init__(self, outfile, fontsize, scale = zoom)
+        self._origin = origin
+        self._tile_size = tile_size
+
+    def create(self, height, width):
+        'Makes the tile. The size of the picture is ignored.'
+        self._image = Image.new('RGB', (self._tile_size, self._tile_size),
+                                (255, 255, 255))
+        self._realdraw = ImageDraw.Draw(self._image)
+
+    def draw_text(self, pos, text, degree = 0, color = style.BLACK):
+        if self._fontsize * self._scale >= MIN_FONT_SIZE:
+            PNGDrawer.draw_text(self, pos, text, degree, color)
+
+    def circle_segment(self, x, y, start, end, r, color = style.BLACK,
+                       stroke = 1, id = None):
+        if r * self._scale <= self._tile_size:
+            PNGDrawer.circle_segment(self, x, y, start, end, r, color, stroke, id)
+            return
+
+        # PIL takes time by the radius, even for a short arc, so for big
+        # arcs only the part in the tile is drawn, as short lines
+        if end < start:
+            end += 2 * math.pi
+        width = max(1, int(round(stroke * self._scale)))
+        for (low, high) in self._get_visible_angles(x, y, start, end, stroke):
+            steps = int(math.ceil(r * self._scale * (high - low) / ARC_STEP))
+            angles = [low + (high - low) * step / max(1, steps)
+                      for step in range(steps + 1)]
+            self._realdraw.line([self._conv((x + r * math.cos(angle),
+                                             y + r * math.sin(angle)))
+                                 for angle in angles],
+                                fill = color.to_rgb_tuple(), width = width)
+
+    def _get_visible_angles(self, cx, cy, start, end, stroke):
+        'The parts of the arc from start to end that may be in the tile.'
+        span = self._tile_size / self._scale
+        (left, top) = (self._origin[0] - stroke, self._origin[1] - stroke)
+        (right, bottom) = (left + span + 2 * stroke, top + span + 2 * stroke)
+        if left <= cx <= right and top <= cy <= bottom:
+            return [(start, end)]
+
+        # seen from the center, which is outside, the tile is less than
+        # half a turn wide, so the corners give the angles it covers
+        corners = [math.atan2(y - cy, x - cx) for x in (left, right)
+                   for y in (top, bottom)]
+        offsets = [(angle - corners[0] + math.pi) % (2 * math.pi) - math.pi
+                   for angle in corners]
+        (low, high) = (corners[0] + min(offsets), corners[0] + max(offsets))
+        parts = []
+        for turns in range(-2, 3):
+            part = (max(start, low + turns * 2 * math.pi),
+                    min(end, high + turns * 2 * math.pi))
+            if part[0] < part[1]:
+                parts.append(part)
+        return parts
+
+    def _conv(self, pos):
+        return ((pos[0] - self._origin[0]) * self._scale,
+                (pos[1] - self._origin[1]) * self._scale)
+
+    def save(self):
+        self._image.save(self._outfile, 'PNG')
+
+def get_levels(width, height, tile_size = TILE_SIZE, max_zoom = 1):
+    '''The zoom of each level, from the one where the picture fits in a
+    tile up to max_zoom.'''
+    zooms = [float(max_zoom)]
+    while max(width, height) * zooms[0] > tile_size:
+        zooms.insert(0, zooms[0] / 2)
+    return zooms
+
+def build_index(display, cell_size):
+    'A spatial.GridIndex of the ops in the display list, by op index.'
+    index = spatial.GridIndex(cell_size)
+    for ix in range(len(display)):
+        bounds = display.get_bounds(ix)
+        if bounds is not None:
+            index.insert(ix, bounds)
+    return index
+
+def write_pyramid(display, outdir, tile_size = TILE_SIZE, max_zoom = 1):
+    '''Draws the display list into tiles in outdir. The display list must
+    still have its measurer, for the sizes of the labels. Returns the
+    number of tiles written.'''
+    ops = display.ops
+    create = [ix for ix in range(len(ops)) if ops[ix] == CREATE]
+    assert create, 'Nothing was drawn'
+    (height, width) = display.get_args(create[0])
+    fontsize = display.get_font_size()
+    zooms = get_levels(width, height, tile_size, max_zoom)
+    # the cells are the tiles of the most detailed level
+    index = build_index(display, tile_size / float(max_zoom))
+
+    blank = None # the encoded empty tile, written wherever nothing is drawn
+    count = 0
+    for (level, zoom) in enumerate(zooms):
+        span = tile_size / zoom # picture units per tile
+        cols = int(math.ceil(width * zoom / tile_size))
+        rows = int(math.ceil(height * zoom / tile_size))
+        for col in range(cols):
+            directory = os.path.join(outdir, str(level), str(col))
+            os.makedirs(directory, exist_ok = True)
+            for row in range(rows):
+                filename = os.path.join(directory, '%s.png' % row)
+                (left, top) = (col * span, row * span)
+                tile_ops = index.query((left, top, left + span, top + span))
+                if not tile_ops:
+                    if blank is None:
+                        blank = _encode_blank(tile_size)
+                    with open(filename, 'wb') as outf:
+                        outf.write(blank)
+                else:
+                    tile = TileDrawer(filename, fontsize, zoom, (left, top),
+                                      tile_size)
+                    tile.create(tile_size, tile_size)
+                    display.replay(tile, tile_ops)
+                    tile.save()
+                count += 1
+
+    with open(os.path.join(outdir, 'tiles.json'), 'w') as outf:
+        json.dump({'width' : width, 'height' : height,
+                   'tile_size' : tile_size, 'levels' : len(zooms),
+                   'max_zoom' : max_zoom, 'path' : '{z}/{x}/{y}.png'},
+                  outf, indent = 2)
+    return count
+
+def _encode_blank(tile_size):
+    out = io.BytesIO()
+    Image.new('RGB', (tile_size, tile_size), (255, 255, 255)).save(out, 'PNG')
+    return out.getvalue()
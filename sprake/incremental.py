@@ -0,0 +1,205 @@
+'''
+Incremental re-rendering of a tree whose style changes.
+
+When only the style rules or the metadata change, the layout stays the
+same, and most nodes look the same. IncrementalRenderer keeps the
+layout, the style the rules gave each node, and the display list of the
+last render. The next render compares the new styles with the old,
+redoes upmerge_linestyle only up from the nodes that changed, and
+redraws only the nodes that look different, replacing their ops in the
+display list. The output file is still written in full.
+
+Everything is redone the first time, and when the rules set labels or
+the names in the legends change, since those change the layout. When
+only the colours in the legends change, the legends are redrawn.
+'''
+
+import heapq
+from sprake import layout, newick, style, treeviz
+from sprake.displaylist import replace_owners
+
+# the node attributes the rules set, besides the label. the last two are
+# the line style, which upmerge_linestyle moves up the tree
+STYLE_ATTRIBUTES = ('textcolor', 'dotcolour', 'linestroke', 'linecolor')
+
+# mode -> (layout, build the display list, draw a leaf, draw a node)
+MODES = {
+    'tree' : (layout.radial_layout, treeviz.build_radial,
+              treeviz.draw_radial_leaf, treeviz.draw_radial_node),
+    'straight' : (layout.straight_layout, treeviz.build_straight,
+                  treeviz.draw_straight_leaf, treeviz.draw_straight_node),
+}
+
+class IncrementalRenderer:
+    '''Renders one tree again and again, with different styles. redrawn
+    is the number of nodes the last render drew again, or None if it
+    drew everything.'''
+
+    def __init__(self, tree, mode = 'tree', format = 'SVG',
+                 drawer_options = None, layout_cache = None):
+        assert mode in MODES, 'Unknown mode "%s"' % mode
+        self._tree = tree
+        self._mode = mode
+        self._format = format
+        self._drawer_options = drawer_options
+        self._layout_cache = layout_cache
+        self._nodes = tree.get_all_nodes()
+        self._labels = [node.get_label() for node in self._nodes]
+        self._styles = None # per node, the STYLE_ATTRIBUTES the rules set
+        self._legends = None
+        self._sets_labels = False
+        self._layout = None
+        self._layout_key = None # (text legend names, labels) of the layout
+        self._display = None
+        self.redrawn = None
+
+    def render(self, outfile, rules, data_by_id):
+        '''rules is a list of rules, or a RuleIndex from compile_rules.
+        Returns the output as bytes if outfile is None.'''
+        index = rules if isinstance(rules, style.RuleIndex) \
+                else style.compile_rules(rules)
+        (target, buffer) = treeviz.get_target(outfile, self._format)
+        drawer = treeviz.get_drawer(target, self._format, treeviz.FONT_SIZE,
+                                    self._drawer_options)
+        legends = style.get_legends(index.rules)
+        sets_labels = index.sets_labels()
+        if self._display is None or sets_labels or self._sets_labels or \
+           _get_names(legends) != _get_names(self._legends):
+            self._render_all(drawer, index, data_by_id, legends)
+        else:
+            self._restyle(get_styles(self._nodes, index, data_by_id), legends)
+
+        self._sets_labels = sets_labels
+        self._display.replay(drawer)
+        drawer.save()
+        if buffer is not None:
+            return buffer.getvalue()
+
+    def _render_all(self, drawer, index, data_by_id, legends):
+        for (node, label) in zip(self._nodes, self._labels):
+            node.set_label(label) # the last rules may have changed it
+            for attribute in STYLE_ATTRIBUTES:
+                setattr(node, attribute, getattr(newick.NewickNode, attribute))
+        self._styles = apply_styles(self._nodes, index, data_by_id)
+        self._tree.upmerge_linestyle()
+
+        (text_legend, dot_legend) = legends
+        (compute, build, draw_leaf, draw_node) = MODES[self._mode]
+        key = (list(text_legend), [node.get_label() for node in self._nodes])
+        if key != self._layout_key:
+            self._layout = treeviz.compute_layout(compute, self._tree, drawer,
+                                                  text_legend,
+                                                  self._layout_cache)
+            self._layout_key = key
+        if self._mode == 'tree':
+            self._display = build(self._layout, self._tree, drawer,
+                                  dot_legend, text_legend)
+        else:
+            self._display = build(self._layout, self._tree, drawer)
+        self._legends = legends
+        self.redrawn = None
+
+    def _restyle(self, styles, legends):
+        nodes = self._nodes
+        parents = self._layout.parents
+        children = self._get_children()
+        (old, self._styles) = (self._styles, styles)
+
+        redraw = set()
+        dirty = [] # heap of -ix, for the nodes whose line style is redone
+        for ix in range(len(nodes)):
+            if styles[ix] == old[ix]:
+                continue
+            if styles[ix][ : 2] != old[ix][ : 2]:
+                (nodes[ix].textcolor, nodes[ix].dotcolour) = styles[ix][ : 2]
+                redraw.add(ix)
+            if styles[ix][2 : ] != old[ix][2 : ]:
+                heapq.heappush(dirty, -ix)
+
+        # upmerge_linestyle, up from the nodes that changed. children come
+        # after their parents in preorder, so the highest index goes first
+        while dirty:
+            ix = -heapq.heappop(dirty)
+            while dirty and dirty[0] == -ix:
+                heapq.heappop(dirty)
+
+            node = nodes[ix]
+            line = styles[ix][2 : ]
+            if children[ix]:
+                first = nodes[children[ix][0]]
+                merged = (first.linestroke, first.linecolor)
+                if all((nodes[child].linestroke, nodes[child].linecolor) == merged
+                       for child in children[ix][1 : ]):
+                    line = merged
+            if line != (node.linestroke, node.linecolor):
+                (node.linestroke, node.linecolor) = line
+                # the branches of the children are drawn in this style
+                redraw.add(ix)
+                redraw.update(children[ix])
+                if parents[ix] != -1:
+                    heapq.heappush(dirty, -parents[ix])
+
+        (compute, build, draw_leaf, draw_node) = MODES[self._mode]
+        leaf_positions = {leaf : pos
+                          for (pos, leaf) in enumerate(self._layout.leaves)}
+        patch = self._display.new_patch()
+        for ix in sorted(redraw):
+            patch.owner = ix
+            if ix in leaf_positions:
+                draw_leaf(self._layout, patch, nodes, leaf_positions[ix])
+            draw_node(self._layout, patch, nodes, ix)
+        self.redrawn = len(redraw)
+
+        # the straight mode draws no legends
+        if legends != self._legends and self._mode == 'tree':
+            (text_legend, dot_legend) = legends
+            treeviz.draw_radial_legends(self._layout, patch, dot_legend,
+                                        text_legend)
+            redraw.add(treeviz.LEGEND_OWNER)
+        self._legends = legends
+        self._display = replace_owners(self._display, patch, redraw)
+
+    def _get_children(self):
+        children = [[] for node in self._nodes]
+        for (ix, parent) in enumerate(self._layout.parents):
+            if parent != -1:
+                children[parent].append(ix)
+        return children
+
+def _get_names(legends):
+    'The names in the legends, in the order they are drawn.'
+    return tuple(list(legend) for legend in legends)
+
+class _Scratch:
+    'Takes the attributes the rules set, starting from the node defaults.'
+    textcolor = newick.NewickNode.textcolor
+    dotcolour = newick.NewickNode.dotcolour
+    linestroke = newick.NewickNode.linestroke
+    linecolor = newick.NewickNode.linecolor
+
+def get_styles(nodes, index, data_by_id):
+    '''The STYLE_ATTRIBUTES the rules in the RuleIndex set on each node,
+    without changing the nodes. The rules must not set labels.'''
+    scratch = _Scratch()
+    styles = []
+    for node in nodes:
+        scratch.__dict__.clear()
+        data = data_by_id.get(node.get_label())
+        for (order, setter) in index.get_setters(data):
+            setter(scratch, data)
+        styles.append(_get_style(scratch))
+    return styles
+
+def apply_styles(nodes, index, data_by_id):
+    '''Like style.apply_rules, without upmerge_linestyle. Returns the
+    STYLE_ATTRIBUTES the rules set on each node.'''
+    styles = []
+    for node in nodes:
+        data = data_by_id.get(node.get_label())
+        for (order, setter) in index.get_setters(data):
+            setter(node, data)
+        styles.append(_get_style(node))
+    return styles
+
+def _get_style(node):
+    return (node.textcolor, node.dotcolour, node.linestroke, node.linecolor)
@@ -0,0 +1,385 @@
+'''
+Layout of trees, computed separately from the drawing.
+
+The layout holds only geometry, in arrays indexed by the preorder number
+of each node, so it doesn't depend on the styling of the nodes. If numpy
+is installed the arrays are numpy arrays, computed in vectorized form,
+otherwise they are lists.
+'''
+
+import math
+from decimal import Decimal
+from sprake import spatial
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# the layout constants (SCALE_FACTOR and so on) are in treeviz, and are
+# read from there on each layout, so that setting them there works
+
+# version of the layout classes, part of the layoutcache keys: change it
+# whenever RadialLayout or StraightLayout change, so that layouts pickled
+# by an older version aren't loaded
+LAYOUT_VERSION = 2 # 2: StraightLayout.autoscale, scale_max, scale_step
+
+class RadialLayout:
+    '''Geometry of a circular tree. Per node, indexed by preorder number:
+
+      parents: index of the parent, -1 for the root
+      angles:  angle in radians, average of the leaves for inner nodes
+      used:    radius where the node ends, and its children start
+      outer_x, outer_y: outer end of the branch leading to the node
+      arc_low, arc_high: angles spanned by the children
+
+    Per leaf, in order: leaves (preorder number), text_x, text_y, degrees,
+    label_widths.'''
+
+    def get_node_count(self):
+        return len(self.parents)
+
+    def get_index(self):
+        'A spatial.LayoutIndex of the nodes, made on first use.'
+        if getattr(self, '_index', None) is None:
+            self._index = spatial.index_radial(self)
+        return self._index
+
+    def point(self, angle, r):
+        return (int(round(self.center + math.cos(angle) * r)),
+                int(round(self.center + math.sin(angle) * r)))
+
+def radial_layout(tree, drawer, text_legend = None):
+    'Lays out the tree in a circle, using drawer to measure text.'
+    from sprake import treeviz
+    radial = RadialLayout()
+
+    (parents, distances, labels) = flatten(tree)
+    count = len(parents)
+    is_leaf = [True] * count
+    for parent in parents[1 : ]:
+        is_leaf[parent] = False
+    leaves = [ix for ix in range(count) if is_leaf[ix]]
+    labels = [labels[ix] for ix in leaves]
+
+    # measure the text
+    (text_height, text_width) = drawer.get_text_size('A')
+    (legend_h, legend_w) = compute_legend_size(drawer, text_legend)
+    label_widths = [drawer.get_text_size(label)[1] for label in labels]
+    text_width = max([text_width] + label_widths)
+    text_width = max(text_width, legend_h, legend_w) # ensure room for legend
+
+    gap = text_height * treeviz.TEXT_SPACING_FACTOR
+    circumference = len(leaves) * (text_height + gap) * treeviz.SCALE_FACTOR
+    circumference = max(treeviz.MIN_CIRCUMFERENCE, circumference)
+
+    radial.width = int(circumference + (text_width * 2) + gap * 2) + 250
+    radial.center = radial.width / 2
+    radial.radius = circumference / 2
+    radial.circumference = circumference
+    radial.text_height = text_height
+    radial.text_width = text_width
+    radial.gap = gap
+
+    # degrees to step further from node to center text on node
+    radial.text_step = ((math.pi * text_height) / circumference) * 0.3
+    radial.auto_dotsize = (circumference / len(leaves)) * 1.4
+    radial.deg_step = (math.pi * 2) / len(leaves)
+    radial.empty_part = radial.radius * treeviz.EMPTY_CENTER_FACTOR
+
+    # per node: leaf count, first leaf, and radius. these need tree walks.
+    # the leaves are numbered in preorder, so each subtree has a
+    # contiguous range of leaf numbers, and its average angle is the middle
+    leaf_count = [1 if leaf else 0 for leaf in is_leaf]
+    for ix in range(count - 1, 0, -1):
+        leaf_count[parents[ix]] += leaf_count[ix]
+
+    first_leaf = [0] * count
+    next_leaf = 0
+    for ix in range(count):
+        first_leaf[ix] = next_leaf
+        next_leaf += is_leaf[ix]
+
+    height = get_tree_height(tree)
+    radial.step = (radial.radius - radial.empty_part) / float(height)
+    used = [radial.empty_part] * count
+    for ix in range(1, count):
+        parent = parents[ix]
+        distance = distances[parent]
+        used[ix] = used[parent] + radial.step * (distance if distance != None else 1.0)
+
+    radial.parents = parents
+    radial.leaves = leaves
+    radial.label_widths = label_widths
+    if numpy:
+        _vectorized_radial(radial, leaf_count, first_leaf, used, label_widths)
+    else:
+        _plain_radial(radial, leaf_count, first_leaf, used, label_widths)
+    return radial
+
+def _vectorized_radial(radial, leaf_count, first_leaf, used, label_widths):
+    parents = numpy.array(radial.parents)
+    first = numpy.array(first_leaf, dtype = float)
+    angles = radial.deg_step * (first + (numpy.array(leaf_count) - 1) / 2.0)
+    used = numpy.array(used)
+
+    outer = numpy.minimum(used, radial.radius - radial.auto_dotsize)
+    outer[0] = radial.empty_part
+    (outer_x, outer_y) = _vectorized_points(radial.center, angles, outer)
+
+    arc_low = numpy.full(len(parents), 10.0)
+    arc_high = numpy.zeros(len(parents))
+    numpy.minimum.at(arc_low, parents[1 : ], angles[1 : ])
+    numpy.maximum.at(arc_high, parents[1 : ], angles[1 : ])
+
+    # the leaf labels. on the left half they're flipped, so they must end
+    # at the node rather than start there
+    leaf_angles = angles[radial.leaves]
+    degrees = 360 - (leaf_angles / (math.pi * 2)) * 360
+    flipped = (degrees > 90) & (degrees < 270)
+    text_angles = numpy.where(flipped, leaf_angles - radial.text_step * 0.5,
+                              leaf_angles + radial.text_step)
+    text_r = radial.radius + radial.auto_dotsize + 2 + \
+             numpy.where(flipped, numpy.array(label_widths), 0)
+    (text_x, text_y) = _vectorized_points(radial.center, text_angles, text_r)
+
+    radial.angles = angles
+    radial.used = used
+    radial.outer_x = outer_x
+    radial.outer_y = outer_y
+    radial.arc_low = arc_low
+    radial.arc_high = arc_high
+    radial.text_x = text_x
+    radial.text_y = text_y
+    radial.degrees = degrees
+
+def _vectorized_points(center, angles, radii):
+    return (numpy.rint(center + numpy.cos(angles) * radii).astype(int),
+            numpy.rint(center + numpy.sin(angles) * radii).astype(int))
+
+def _plain_radial(radial, leaf_count, first_leaf, used, label_widths):
+    count = len(radial.parents)
+    angles = [radial.deg_step * (first_leaf[ix] + (leaf_count[ix] - 1) / 2.0)
+              for ix in range(count)]
+
+    limit = radial.radius - radial.auto_dotsize
+    outer = [radial.point(angles[0], radial.empty_part)]
+    outer += [radial.point(angles[ix], min(used[ix], limit))
+              for ix in range(1, count)]
+
+    arc_low = [10.0] * count
+    arc_high = [0.0] * count
+    for ix in range(1, count):
+        parent = radial.parents[ix]
+        arc_low[parent] = min(arc_low[parent], angles[ix])
+        arc_high[parent] = max(arc_high[parent], angles[ix])
+
+    degrees = []
+    text = []
+    for (leaf, width) in zip(radial.leaves, label_widths):
+        angle = angles[leaf]
+        degree = 360 - (angle / (math.pi * 2)) * 360
+        degrees.append(degree)
+        r = radial.radius + radial.auto_dotsize + 2
+        if degree > 90 and degree < 270:
+            text.append(radial.point(angle - (radial.text_step * 0.5), r + width))
+        else:
+            text.append(radial.point(angle + radial.text_step, r))
+
+    radial.angles = angles
+    radial.used = used
+    radial.outer_x = [x for (x, y) in outer]
+    radial.outer_y = [y for (x, y) in outer]
+    radial.arc_low = arc_low
+    radial.arc_high = arc_high
+    radial.text_x = [x for (x, y) in text]
+    radial.text_y = [y for (x, y) in text]
+    radial.degrees = degrees
+
+# ===========================================================================
+# STRAIGHT LAYOUT
+
+class StraightLayout:
+    '''Geometry of a tree drawn left to right. Per node, indexed by
+    preorder number:
+
+      parents: index of the parent, -1 for the root
+      y:       vertical position of the node's branch
+      left, right: horizontal start and end of the branch
+
+    Per leaf, in order: leaves (preorder number), text_y, label_widths.
+    Scale ticks are (x, text, text x) tuples in ticks, empty if there's no
+    scale. autoscale tells if the branch lengths set the scale, with ticks
+    every scale_step up to scale_max. Without it, scale_max is the height
+    of the tree in levels, and scale_step is None.'''
+
+    def get_node_count(self):
+        return len(self.parents)
+
+    def get_index(self):
+        'A spatial.LayoutIndex of the nodes, made on first use.'
+        if getattr(self, '_index', None) is None:
+            self._index = spatial.index_straight(self)
+        return self._index
+
+def straight_layout(tree, drawer, text_legend = None):
+    'Lays out the tree left to right, using drawer to measure text.'
+    from sprake import treeviz
+    straight = StraightLayout()
+
+    (parents, distances, labels) = flatten(tree)
+    count = len(parents)
+    is_leaf = [True] * count
+    for parent in parents[1 : ]:
+        is_leaf[parent] = False
+    leaves = [ix for ix in range(count) if is_leaf[ix]]
+
+    (text_height, text_width) = drawer.get_text_size('A')
+    label_widths = [drawer.get_text_size(labels[ix])[1] for ix in leaves]
+    text_width = max([text_width] + label_widths)
+
+    gap = text_height * treeviz.TEXT_SPACING_FACTOR
+    margin = 20
+    tree_width = 1000
+    scale_height = text_height + gap * 4
+
+    tree_height = (text_height + gap) * len(leaves)
+    straight.height = margin + scale_height + tree_height + margin
+    straight.width = margin + tree_width + gap + text_width + margin
+    straight.margin = margin
+    straight.tree_width = tree_width
+    straight.scale_height = scale_height
+    straight.text_height = text_height
+    straight.text_width = text_width
+    straight.gap = gap
+
+    distances[0] = get_root_distance(tree)
+    if distances[0] != None:
+        draw_scale = True
+        distance_height = max([child.get_distance_height()
+                               for child in tree.get_children()]) + distances[0]
+        (biggest, increment) = calibrate_scale(distance_height)
+    else:
+        draw_scale = False
+        biggest = tree.get_height()
+        increment = None
+
+    straight.autoscale = draw_scale
+    straight.scale_max = biggest
+    straight.scale_step = increment
+
+    # the leaves
+    straight.leaves = leaves
+    straight.label_widths = label_widths
+    straight.text_x = margin + tree_width + gap
+    straight.text_y = [margin + scale_height + gap * ix + text_height * (ix + 1)
+                       for ix in range(len(leaves))]
+
+    # the tree
+    straight.right_edge = margin + tree_width
+    vstep = text_height + gap
+    hstep = float(tree_width) / biggest # use biggest to match scale line
+
+    leaf_count = [1 if leaf else 0 for leaf in is_leaf]
+    for ix in range(count - 1, 0, -1):
+        leaf_count[parents[ix]] += leaf_count[ix]
+
+    dists = [distance if distance != None else 1.0 for distance in distances]
+    depth = [0.0] * count
+    depth[0] = biggest - (distance_height if draw_scale else (tree.get_height() + 1))
+    y = [0] * count
+    y[0] = int(round(margin + scale_height + 0.5 * tree_height))
+    cursor = [0] * count # moves down past the children as they're placed
+    left = [0.0] * count
+    right = [0.0] * count
+    for ix in range(count):
+        parent = parents[ix]
+        if parent != -1:
+            depth[ix] = depth[parent] + dists[parent]
+            ydelta = int(round(vstep * leaf_count[ix] / 2))
+            y[ix] = cursor[parent] + ydelta
+            cursor[parent] += ydelta * 2
+
+        left[ix] = margin + depth[ix] * hstep
+        right[ix] = margin + (depth[ix] + dists[ix]) * hstep
+        # this is the top of the vertical area the children fill
+        cursor[ix] = y[ix] - int(round(vstep * leaf_count[ix] / 2))
+
+    straight.parents = parents
+    straight.y = y
+    straight.left = left
+    straight.right = right
+
+    # the scale (if we have distances in the tree)
+    straight.ticks = []
+    if draw_scale:
+        v = biggest
+        while v >= 0.0:
+            x = margin + int(round((1.0 - (v / biggest)) * tree_width))
+            txt = nicely_float_to_str(v)
+            w2 = int(round(drawer.get_text_size(txt)[1] / 2.0))
+            straight.ticks.append((x, txt, x - w2))
+            v -= increment
+
+    return straight
+
+def get_root_distance(tree):
+    'The distance of the root, or None if the tree has no distances.'
+    if tree.get_distance() != None:
+        return tree.get_distance()
+
+    # sometimes the root doesn't have a distance, but the other nodes do.
+    # then we use the average of the children. the tree isn't changed, so
+    # that layouts can be cached by the distances in the tree
+    if all([c.get_distance() != None for c in tree.get_children()]):
+        return sum([c.get_distance() for c in tree.get_children()]) / float(len(tree.get_children()))
+
+def nicely_float_to_str(v):
+    return str(Decimal(str(v)).quantize(Decimal('0.1')))
+
+# 0 is assumed smallest
+def calibrate_scale(topval):
+    #scale = 10 # factor to get to 1.0
+    scale = 1.0 / topval
+
+    biggest = math.ceil(topval * scale) / scale # largest number on scale
+    increments = 1.0 / scale
+    return (biggest, increments)
+
+# ===========================================================================
+# UTILITIES
+
+def flatten(tree):
+    'Returns (parent indexes, distances, labels) for the nodes in preorder.'
+    parents = []
+    distances = []
+    labels = []
+    stack = [(tree, -1)]
+    while stack:
+        (node, parent) = stack.pop()
+        ix = len(parents)
+        parents.append(parent)
+        distances.append(node.get_distance())
+        labels.append(node.get_label())
+        for child in reversed(node.get_children()):
+            stack.append((child, ix))
+    return (parents, distances, labels)
+
+def get_tree_height(tree):
+    distance_height = tree.get_distance_height()
+    if distance_height is None:
+        return tree.get_height()
+    else:
+        return distance_height
+
+def compute_legend_size(drawer, text_legend):
+    if not text_legend:
+        return (0, 0)
+
+    text_height = drawer.get_text_size('X')[0]
+    offset = text_height * 2
+    gap = text_height / 3.0
+
+    max_width = max([drawer.get_text_size(name)[1] for name in text_legend.keys()])
+
+    return (offset + (gap + text_height) * len(text_legend), offset + max_width)
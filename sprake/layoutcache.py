@@ -0,0 +1,80 @@
+'''
+Cache of tree layouts, so that restyling a tree only has to redo the
+styling and the drawing.
+
+Layouts are keyed by a hash of everything they depend on: the topology,
+branch lengths and labels of the tree, the text measurements of the
+output format, the legend, the layout constants, and the version of the
+layout classes.
+'''
+
+import collections, hashlib, os, pickle, tempfile, threading
+from sprake import layout, treeviz
+
+class LayoutCache:
+    '''Thread-safe, so one cache can be shared by renders in threads. Two
+    threads wanting the same new layout may both compute it.'''
+
+    def __init__(self, directory = None, max_entries = 16):
+        'With a directory the layouts are also kept on disk, as pickles.'
+        self._directory = directory
+        self._max_entries = max_entries
+        self._memory = collections.OrderedDict() # least recently used first
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok = True)
+
+    def get_layout(self, compute, tree, drawer, text_legend = None):
+        'Returns the cached layout, or computes it with compute and caches it.'
+        key = layout_key(compute.__name__, tree, drawer, text_legend)
+        cached = self.get(key)
+        if cached is None:
+            cached = compute(tree, drawer, text_legend)
+            self.put(key, cached)
+        return cached
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        if self._directory:
+            filename = self._get_filename(key)
+            if os.path.exists(filename):
+                with open(filename, 'rb') as inf:
+                    cached = pickle.load(inf)
+                self._remember(key, cached)
+                return cached
+
+    def put(self, key, cached):
+        self._remember(key, cached)
+        if self._directory:
+            # write to a temporary file first, so that other processes
+            # never see half-written layouts
+            (fd, tmpname) = tempfile.mkstemp(dir = self._directory)
+            with os.fdopen(fd, 'wb') as outf:
+                pickle.dump(cached, outf, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpname, self._get_filename(key))
+
+    def _remember(self, key, cached):
+        with self._lock:
+            self._memory[key] = cached
+            self._memory.move_to_end(key)
+            while len(self._memory) > self._max_entries:
+                self._memory.popitem(last = False)
+
+    def _get_filename(self, key):
+        return os.path.join(self._directory, key + '.layout')
+
+def layout_key(mode, tree, drawer, text_legend = None):
+    (parents, distances, labels) = layout.flatten(tree)
+    params = (layout.LAYOUT_VERSION, mode, type(drawer).__name__, drawer.get_font_size(),
+              treeviz.SCALE_FACTOR, treeviz.MIN_CIRCUMFERENCE,
+              treeviz.EMPTY_CENTER_FACTOR, treeviz.TEXT_SPACING_FACTOR,
+              sorted(text_legend or []))
+
+    thehash = hashlib.sha256()
+    for values in (params, parents, distances, labels):
+        thehash.update(repr(values).encode('utf-8'))
+    return thehash.hexdigest()
@@ -0,0 +1,120 @@
+'''
+Loader for the metadata tables used by the style rules.
+
+The tables can be much bigger than what a style needs, so only the
+columns the rules refer to are kept, and only the rows for labels in the
+tree. The file is read on first use, one row (or record batch) at a
+time.
+
+CSV and TSV are read with the csv module; Parquet and Arrow/Feather
+files need pyarrow.
+'''
+
+import csv, os
+
+# extension -> format
+FORMATS = {
+    '.csv'     : 'CSV',
+    '.tsv'     : 'TSV',
+    '.tab'     : 'TSV',
+    '.parquet' : 'PARQUET',
+    '.pq'      : 'PARQUET',
+    '.arrow'   : 'ARROW',
+    '.feather' : 'ARROW',
+}
+
+class Metadata:
+    '''Rows of a metadata table by ID, for style.apply_rules. fields and
+    ids limit the columns and rows that are kept; None keeps all.'''
+
+    def __init__(self, filename, id_field = 'ID', fields = None, ids = None,
+                 format = None):
+        self._filename = filename
+        self._id_field = id_field
+        self._fields = None if fields is None else sorted(set(fields))
+        self._ids = None if ids is None else set(ids)
+        self._format = format or get_format(filename)
+        self._rows = None
+
+    def get(self, ident, default = None):
+        return self._get_rows().get(ident, default)
+
+    def __contains__(self, ident):
+        return ident in self._get_rows()
+
+    def __len__(self):
+        return len(self._get_rows())
+
+    def _get_rows(self):
+        if self._rows is None:
+            if self._format in ('CSV', 'TSV'):
+                delimiter = ',' if self._format == 'CSV' else '\t'
+                rows = read_delimited(self._filename, self._id_field,
+                                      self._fields, self._ids, delimiter)
+            elif self._format in ('PARQUET', 'ARROW'):
+                rows = read_arrow(self._filename, self._id_field, self._fields,
+                                  self._ids, self._format)
+            else:
+                assert False, 'Unknown metadata format "%s"' % self._format
+            self._rows = rows
+        return self._rows
+
+def get_format(filename):
+    (base, ext) = os.path.splitext(filename.lower())
+    return FORMATS.get(ext, 'CSV')
+
+def get_tree_ids(tree):
+    'The labels in the tree, which are the IDs the style rules look up.'
+    return {node.get_label() for node in tree.iter_preorder()
+            if node.get_label() is not None}
+
+def read_delimited(filename, id_field, fields, ids, delimiter = ','):
+    with open(filename, newline = '', encoding = 'utf-8-sig') as inf:
+        reader = csv.reader(inf, delimiter = delimiter)
+        header = next(reader, [])
+        assert id_field in header, 'No column "%s" in %s' % (id_field, filename)
+
+        id_ix = header.index(id_field)
+        columns = [(name, ix) for (ix, name) in enumerate(header)
+                   if fields is None or name in fields or name == id_field]
+        rows = {}
+        for row in reader:
+            if len(row) <= id_ix or (ids is not None and row[id_ix] not in ids):
+                continue
+            rows[row[id_ix]] = {name : row[ix] for (name, ix) in columns
+                                if ix < len(row)}
+        return rows
+
+def read_arrow(filename, id_field, fields, ids, format):
+    import pyarrow, pyarrow.compute, pyarrow.ipc, pyarrow.parquet
+
+    if format == 'PARQUET':
+        parquet = pyarrow.parquet.ParquetFile(filename)
+        names = parquet.schema_arrow.names
+        batches = lambda columns: parquet.iter_batches(columns = columns)
+    else:
+        reader = pyarrow.ipc.open_file(pyarrow.memory_map(filename))
+        names = reader.schema.names
+        batches = lambda columns: (reader.get_batch(ix).select(columns)
+                                   for ix in range(reader.num_record_batches))
+    assert id_field in names, 'No column "%s" in %s' % (id_field, filename)
+
+    columns = [name for name in names
+               if fields is None or name in fields or name == id_field]
+    value_set = None if ids is None else pyarrow.array(sorted(ids))
+    rows = {}
+    for batch in batches(columns):
+        if value_set is not None:
+            # compare as strings, the way they would be read from CSV
+            idcol = pyarrow.compute.cast(batch.column(id_field), pyarrow.string())
+            batch = batch.filter(pyarrow.compute.is_in(idcol, value_set = value_set))
+        for row in batch.to_pylist():
+            rows[str(row[id_field])] = {name : _to_text(value)
+                                        for (name, value) in row.items()}
+    return rows
+
+def _to_text(value):
+    'The style rules compare values as text, as they are in CSV files.'
+    if value is None or isinstance(value, str):
+        return value
+    return str(value)
@@ -2,19 +2,24 @@
 Parser for Newick format files.
 '''
 
-import sys
+import bz2, codecs, gc, gzip, io, re, sys
 from sprake import style
 
 # distance here means distance to parent
 class NewickNode:
+    # defaults are class attributes, so that creating the (potentially
+    # millions of) nodes is cheap. they become instance attributes when set
+    _bootstrap = None
+    _summary = None
+    _radian_summary = None
 
     def __init__(self, parent, label = None, distance = None, bootstrap = None):
         self._parent = parent
         self._children = []
         self._label = label
         self._distance = distance
-        self._bootstrap = bootstrap
-        self._graph_init()
+        if bootstrap is not None:
+            self._bootstrap = bootstrap
 
     def get_parent(self):
         return self._parent
@@ -34,59 +39,84 @@ class NewickNode:
     def get_bootstrap(self):
         return self._bootstrap
 
-    # max sum of distances to bottom
+    # max sum of distances to bottom. None if some distance is missing
     def get_distance_height(self):
-        if not self._children:
-            return self._distance
-        return max([ch.get_distance_height() for ch in self._children]) + self._distance
+        return self._get_summary()[3]
 
     def add_child(self, child):
         self._children.append(child)
+        self._invalidate()
 
     def set_label(self, label):
         self._label = label
 
     def set_distance(self, distance):
         self._distance = distance
+        self._invalidate()
 
     def set_bootstrap(self, bootstrap):
         self._bootstrap = bootstrap
 
     def get_leaves(self):
-        thelist = []
-        self._get_leaves(thelist)
-        return thelist
-
-    def _get_leaves(self, thelist):
-        if len(self._children) == 0:
-            thelist.append(self)
-        else:
-            for ch in self._children:
-                ch._get_leaves(thelist)
+        return [node for node in self.iter_preorder() if not node._children]
 
     def get_all_nodes(self):
-        nodes = []
-        self._get_all_nodes(nodes)
-        return nodes
-
-    def _get_all_nodes(self, nodes):
-        nodes.append(self)
-        for ch in self._children:
-            ch._get_all_nodes(nodes)
+        return list(self.iter_preorder())
+
+    # the traversals use explicit stacks rather than recursion, so that
+    # very deep trees don't run into the recursion limit
+
+    def iter_preorder(self):
+        'Yields every node in the subtree, parents before children'
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node._children))
+
+    def iter_postorder(self):
+        'Yields every node in the subtree, children before parents'
+        stack = [(self, iter(self._children))]
+        while stack:
+            (node, children) = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                yield node
+            else:
+                stack.append((child, iter(child._children)))
 
     def get_height(self):
-        if not self._children:
-            return 0
-        return max([ch.get_height() for ch in self._children]) + 1
+        return self._get_summary()[2]
+
+    def get_leaf_count(self):
+        return self._get_summary()[0]
+
+    def get_leaf_range(self):
+        'Returns (first, last) index of the subtree in the leaves of the root'
+        # leaf indexes depend on the whole tree, so a change anywhere can
+        # make them stale. the root is always invalidated, so check that
+        root = self
+        while root._parent:
+            root = root._parent
+        root._get_summary()
+
+        (count, first, _, _) = self._summary
+        return (first, first + count - 1)
 
     def find_common_parent_of(self, criterion):
-        own = self._count_leaves_satisfying(criterion)
-        for child in self.get_children():
-            sub = child._count_leaves_satisfying(criterion)
-            if sub > 0 and sub < own:
-                return self
-            elif sub == own:
-                return child.find_common_parent_of(criterion)
+        node = self
+        while node:
+            own = node._count_leaves_satisfying(criterion)
+            for child in node.get_children():
+                sub = child._count_leaves_satisfying(criterion)
+                if sub > 0 and sub < own:
+                    return node
+                elif sub == own:
+                    node = child
+                    break
+            else:
+                return None
 
     def _count_leaves_satisfying(self, criterion):
         return len([leaf for leaf in self.get_leaves()
@@ -94,53 +124,121 @@ class NewickNode:
 
     # graphical stuff
 
-    def _graph_init(self):
-        # set during drawing
-        self.degrees = None
-        self.radians = None
+    # set during drawing
+    degrees = None
+    radians = None
 
-        # configurable graphical styling
-        self.dotcolour = None
-        self.linestroke = 1
-        self.linecolor = style.BLACK
-        self.textcolor = style.BLACK
-        self.bannercolor = None # node title becomes banner title
+    # configurable graphical styling
+    dotcolour = None
+    linestroke = 1
+    linecolor = style.BLACK
+    textcolor = style.BLACK
+    bannercolor = None # node title becomes banner title
 
     def get_radian_span(self):
-        leaves = [l.radians for l in self.get_leaves()]
-        return (min(leaves), max(leaves))
+        (lowest, highest, _) = self._get_radian_summary()
+        return (lowest, highest)
 
     def get_average_radians(self):
-        leaves = self.get_leaves()
-        return sum([l.radians for l in leaves]) / len(leaves)
+        (_, _, total) = self._get_radian_summary()
+        return total / self.get_leaf_count()
+
+    def summarize_radians(self):
+        '''Caches min/max/sum of leaf radians for every node in the subtree.
+        Must be called again after the leaf radians have been changed.'''
+        for node in self.iter_postorder():
+            if not node._children:
+                node._radian_summary = (node.radians, node.radians, node.radians)
+                continue
+
+            lowest = highest = None
+            total = 0
+            for child in node._children:
+                (low, high, sub) = child._radian_summary
+                lowest = low if lowest is None else min(lowest, low)
+                highest = high if highest is None else max(highest, high)
+                total += sub
+
+            node._radian_summary = (lowest, highest, total)
+        return self._radian_summary
+
+    def _get_radian_summary(self):
+        if self._radian_summary is None:
+            self.summarize_radians()
+        return self._radian_summary
+
+    # --- subtree summaries
+
+    # _summary is (leaf count, index of first leaf, height, distance height).
+    # it's computed for the entire tree in one bottom-up pass from the root,
+    # and cleared from the changed node up to the root on every change.
+
+    def _get_summary(self):
+        if self._summary is None:
+            root = self
+            while root._parent:
+                root = root._parent
+            root._summarize()
+        return self._summary
+
+    def _summarize(self):
+        next_leaf = 0 # postorder visits the leaves in order
+        for node in self.iter_postorder():
+            if not node._children:
+                node._summary = (1, next_leaf, 0, node._distance)
+                next_leaf += 1
+                continue
+
+            leaf_count = 0
+            height = 0
+            distance_height = 0
+            for child in node._children:
+                (count, _, h, dh) = child._summary
+                leaf_count += count
+                height = max(height, h + 1)
+                if distance_height is None or dh is None:
+                    distance_height = None
+                else:
+                    distance_height = max(distance_height, dh)
 
-    def upmerge_linestyle(self):
-        if not self._children:
-            return
+            if distance_height is not None and node._distance is not None:
+                distance_height += node._distance
+            else:
+                distance_height = None
 
-        for child in self._children:
-            child.upmerge_linestyle()
+            first_leaf = node._children[0]._summary[1]
+            node._summary = (leaf_count, first_leaf, height, distance_height)
 
-        style = (self._children[0].linestroke, self._children[0].linecolor)
-        for child in self._children[1 : ]:
-            if style != (child.linestroke, child.linecolor):
-                style = None
-                break
+    def _invalidate(self):
+        node = self
+        while node and (node._summary or node._radian_summary):
+            node._summary = None
+            node._radian_summary = None
+            node = node._parent
 
-        if style:
-            (self.linestroke, self.linecolor) = style
+    def upmerge_linestyle(self):
+        # reversed preorder also has children before parents, and is much
+        # cheaper than iter_postorder
+        for node in reversed(list(self.iter_preorder())):
+            if not node._children:
+                continue
+
+            first = node._children[0]
+            style = (first.linestroke, first.linecolor)
+            for child in node._children[1 : ]:
+                if style != (child.linestroke, child.linecolor):
+                    style = None
+                    break
+
+            # skip the assignment when nothing changes, as storing the
+            # defaults on every node is expensive for big trees
+            if style and style != (node.linestroke, node.linecolor):
+                (node.linestroke, node.linecolor) = style
 
 # --- TREE NAVIGATION UTILS
 
 def get_all_nodes(tree):
-    allnodes = []
-    _add_all_nodes(tree, allnodes)
-    return allnodes
-
-def _add_all_nodes(node, allnodes):
-    allnodes.append(node)
-    for child in node.get_children():
-        _add_all_nodes(child, allnodes)
+    return list(tree.iter_preorder())
 
 def find_common_parent(n1, n2):
     n1parents = []
@@ -155,109 +253,179 @@ def find_common_parent(n1, n2):
 
 # --- PARSING
 
-def scan_while_not(data, pos, end_marker):
-    while data[pos] not in end_marker:
-        pos += 1
-    return pos
+# splits the input into alternating node text and punctuation, so the
+# node text ('label:distance[bootstrap]') can be handled as whole strings
+TOKENIZER = re.compile(r'([(),;])')
 
 def parse_string(data):
-    pos = 0
+    # the tree is full of parent/child reference cycles, so the cyclic
+    # garbage collector keeps rescanning it while it grows. no garbage is
+    # created while parsing, so the collector is paused
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _parse_tokens(TOKENIZER.split(data))
+    finally:
+        if enabled:
+            gc.enable()
+
+def _parse_tokens(tokens):
     root = None
     current = None
-    while data[pos] != ';':
-        if data[pos] == '(':
+    closed = None # the node just closed with ')', which gets the next text
+    for ix in range(0, len(tokens) - 1, 2):
+        text = tokens[ix]
+        if text:
+            (label, distance, bootstrap) = parse_node_text(text)
+            if closed:
+                if label:
+                    closed._label = label
+                closed._distance = distance
+                closed._bootstrap = bootstrap
+            else:
+                # nodes are new, so there are no summaries to invalidate
+                current._children.append(NewickNode(current, label, distance))
+
+        punct = tokens[ix + 1]
+        if punct == '(':
             node = NewickNode(current)
             if current:
-                current.add_child(node)
-            current = node
-            if not root:
+                current._children.append(node)
+            else:
                 root = node
-            pos += 1
-
-        elif data[pos] == ')':
-            pos += 1
-
-            ix = scan_while_not(data, pos, ':,);')
-            if ix != pos: # there was a label
-                current.set_label(data[pos : ix])
-                pos = ix
-
-            if data[pos] == ':':
-                ix = scan_while_not(data, pos, ',);[')
-
-                if data[ix] == '[':
-                    ix2 = scan_while_not(data, ix+1, ']')
-                    current.set_bootstrap(int(data[ix + 1 : ix2]))
-
-                current.set_distance(float(data[pos+1 : ix]))
-                # print float(data[pos+1 : ix]), current.get_label(), current
-
-                if data[ix] == '[':
-                    pos = ix2 + 1
-                else:
-                    pos = ix
-
-                if pos < len(data) and data[pos] == ',':
-                    pos += 1
+            current = node
+            closed = None
+        elif punct == ',':
+            closed = None
+        elif punct == ')':
+            closed = current
+            current = current._parent
+        else: # ';'
+            break
 
-            current = current.get_parent()
+    return root
 
-        elif data[pos] == ',':
-            pos += 1
+def parse_node_text(text):
+    'Returns (label, distance, bootstrap) from "label:distance[bootstrap]"'
+    if ':' not in text:
+        return (text or None, None, None)
 
-        else:
-            ix = scan_while_not(data, pos, ':,)')
-            if data[ix] == ':':
-                label = data[pos : ix] or None
-                pos = ix + 1
-                ix = scan_while_not(data, pos, ',)')
-                distance = float(data[pos : ix])
-            else:
-                label = data[pos : ix] or None
-                distance = None
+    (label, _, distance) = text.partition(':')
+    bootstrap = None
+    if '[' in distance:
+        (distance, _, bootstrap) = distance.partition('[')
+        bootstrap = int(bootstrap.rstrip(']'))
+    return (label or None, float(distance), bootstrap)
 
-            pos = ix
-            node = NewickNode(current, label, distance)
-            current.add_child(node)
+# the scanner of the original parser, which is in benchmarks.reference now
 
-            if data[pos] == ',':
-                pos += 1
+def scan_while_not(data, pos, end_marker):
+    while data[pos] not in end_marker:
+        pos += 1
+    return pos
 
-            # pos now on either '(', ')' or a label
+# --- STREAMING
+
+CHUNK_SIZE = 1024 * 1024
+
+def iter_trees(fileobj, chunk_size = CHUNK_SIZE):
+    '''Yields one tree per ';' in the file, reading it in chunks. fileobj
+    can be a file name or a text or binary file object, and may be gzip or
+    bzip2 compressed if it's binary.'''
+    for data in iter_tree_strings(fileobj, chunk_size):
+        yield parse_string(data)
+
+def iter_tree_strings(fileobj, chunk_size = CHUNK_SIZE):
+    'Like iter_trees, but yields the Newick text of each tree unparsed.'
+    if isinstance(fileobj, str):
+        with open(fileobj, 'rb') as inf:
+            yield from iter_tree_strings(inf, chunk_size)
+        return
+
+    parts = [] # text of the current tree, read so far
+    for chunk in _iter_chunks(fileobj, chunk_size):
+        # split once, since taking the trees off one at a time copies the
+        # rest of the chunk for each
+        pieces = chunk.split(';')
+        for piece in pieces[ : -1]:
+            parts.append(piece)
+            data = ''.join(parts).strip()
+            parts = []
+            if data:
+                yield data + ';'
+        parts.append(pieces[-1])
+
+    data = ''.join(parts).strip()
+    if data: # last tree is missing its ';'
+        yield data + ';'
+
+def _iter_chunks(fileobj, chunk_size):
+    if isinstance(fileobj, io.TextIOBase):
+        decode = lambda chunk, final = False: chunk
+    else:
+        # not a TextIOWrapper, since that would close fileobj when done
+        fileobj = _decompress(fileobj)
+        decode = codecs.getincrementaldecoder('utf-8')().decode
+
+    chunk = fileobj.read(chunk_size)
+    while chunk:
+        yield decode(chunk)
+        chunk = fileobj.read(chunk_size)
+    yield decode(chunk, final = True)
+
+def _decompress(fileobj):
+    if hasattr(fileobj, 'peek'):
+        magic = fileobj.peek(3)[ : 3]
+    elif fileobj.seekable():
+        pos = fileobj.tell()
+        magic = fileobj.read(3)
+        fileobj.seek(pos)
+    else:
+        return fileobj # can't look ahead, so assume it's not compressed
 
-    return root
+    if magic[ : 2] == b'\x1f\x8b':
+        return gzip.GzipFile(fileobj = fileobj)
+    elif magic == b'BZh':
+        return bz2.BZ2File(fileobj)
+    return fileobj
 
 def dump_tree(node, indent = 0):
-    print('%s%s %s' % (' ' * indent, node._label, node._distance))
-    for child in node._children:
-        dump_tree(child, indent + 2)
+    stack = [(node, indent)]
+    while stack:
+        (node, indent) = stack.pop()
+        print('%s%s %s' % (' ' * indent, node._label, node._distance))
+        stack.extend([(child, indent + 2) for child in reversed(node._children)])
 
 def to_newick(outf, tree):
     _write_node(outf, tree)
     outf.write(';')
 
 def _write_node(outf, node):
-    if node.has_children():
-        outf.write('(')
-
-        for (ix, child) in enumerate(node.get_children()):
-            if ix > 0:
-                outf.write(',')
-            _write_node(outf, child)
-
-        outf.write(')')
+    # the stack holds nodes still to be written, and the strings that go
+    # between them
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, str):
+            outf.write(node)
+            continue
+
+        if node.has_children():
+            outf.write('(')
+            stack.append(')' + _node_suffix(node))
+            children = node.get_children()
+            for ix in range(len(children) - 1, -1, -1):
+                stack.append(children[ix])
+                if ix > 0:
+                    stack.append(',')
+        else:
+            outf.write(_node_suffix(node))
 
-        if node.get_label():
-            outf.write(node.get_label())
-        if node.get_distance() != None:
-            outf.write(':')
-            outf.write(float_to_str(node.get_distance()))
-    else:
-        if node.get_label():
-            outf.write(node.get_label())
-        if node.get_distance() != None:
-            outf.write(':')
-            outf.write(float_to_str(node.get_distance()))
+def _node_suffix(node):
+    suffix = node.get_label() or ''
+    if node.get_distance() != None:
+        suffix += ':' + float_to_str(node.get_distance())
+    return suffix
 
 def float_to_str(f):
     # copied from StackOverflow. embarrassing that this is necessary
@@ -275,5 +443,5 @@ def float_to_str(f):
     return float_string
 
 if __name__ == '__main__':
-    tree = parse_string(open(sys.argv[1]).read())
-    dump_tree(tree)
+    for tree in iter_trees(sys.argv[1]):
+        dump_tree(tree)
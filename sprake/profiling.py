@@ -0,0 +1,186 @@
+'''
+Instrumentation of the render pipeline: the time, drawing primitives,
+text measurement and memory of each phase of a render.
+
+A Profile is passed to the functions that take one (style.apply_rules,
+treeviz.render_tree, ...), and they record their phases in it. They
+take None by default, which costs nothing. The peak memory per phase
+comes from tracemalloc, which slows everything down, so it's only
+traced on request; the peak size of the process is always recorded
+where the resource module exists.
+'''
+
+import contextlib, json, sys, time, tracemalloc
+from sprake import textmetrics
+
+try:
+    import resource
+except ImportError: # not on Windows
+    resource = None
+
+class Profile:
+    '''Records the phases of renders, which may be nested. With memory,
+    also traces the most memory Python had allocated during each phase,
+    in peak_bytes. callback is called with each phase record when the
+    phase ends.'''
+
+    def __init__(self, memory = False, callback = None):
+        self.phases = [] # records, in the order the phases started
+        self.notes = []
+        self._memory = memory
+        self._callback = callback
+        self._stack = [] # open records
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        record = {'name' : name, 'depth' : len(self._stack), 'seconds' : None,
+                  'counts' : {}}
+        self.phases.append(record)
+        if self._memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._pass_peak()
+            record['peak_bytes'] = 0
+        self._stack.append(record)
+        metrics = textmetrics.METRICS.get_stats()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            text = [now - before for (now, before)
+                    in zip(textmetrics.METRICS.get_stats(), metrics)]
+            if text[0] or text[1]:
+                record['text'] = {'measured' : text[0], 'cached' : text[1],
+                                  'seconds' : text[2]}
+            if self._memory:
+                self._pass_peak()
+            self._stack.pop()
+            if self._memory and self._stack:
+                self._stack[-1]['peak_bytes'] = max(
+                    self._stack[-1]['peak_bytes'], record['peak_bytes'])
+            if resource:
+                record['max_rss_bytes'] = get_max_rss()
+            if self._callback:
+                self._callback(record)
+
+    def _pass_peak(self):
+        'Gives the peak traced so far to the open phase, and starts over.'
+        if self._stack:
+            self._stack[-1]['peak_bytes'] = max(self._stack[-1]['peak_bytes'],
+                                                tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+
+    def count(self, kind, count = 1):
+        'Counts primitives of a kind, like "lines", in the current phase.'
+        if self._stack:
+            counts = self._stack[-1]['counts']
+            counts[kind] = counts.get(kind, 0) + count
+
+    def note(self, name, **values):
+        'Records something of interest, like a decision, with its values.'
+        values['name'] = name
+        values['phase'] = self._stack[-1]['name'] if self._stack else None
+        self.notes.append(values)
+
+    def stop(self):
+        'Stops tracing memory, if this started it.'
+        if self._memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def to_dict(self):
+        return {'phases' : self.phases, 'notes' : self.notes}
+
+    def write_json(self, filename):
+        with open(filename, 'w') as outf:
+            json.dump(self.to_dict(), outf, indent = 2)
+
+    def write_summary(self, out = sys.stderr):
+        out.write('%-24s %9s  %s\n' % ('phase', 'seconds', 'details'))
+        for record in self.phases:
+            out.write('%-24s %8.3fs  %s\n' % ('  ' * record['depth'] + record['name'],
+                                              record['seconds'] or 0,
+                                              format_details(record)))
+        for note in self.notes:
+            values = ['%s=%s' % (key, note[key]) for key in sorted(note)
+                      if key not in ('name', 'phase')]
+            out.write('%s (in %s): %s\n' % (note['name'], note['phase'],
+                                            ' '.join(values)))
+
+def format_details(record):
+    details = ['%s %s' % (count, kind)
+               for (kind, count) in sorted(record['counts'].items())]
+    if 'text' in record:
+        text = record['text']
+        details.append('measured %s texts in %.3fs, %s cached' %
+                       (text['measured'], text['seconds'], text['cached']))
+    if 'peak_bytes' in record:
+        details.append('peak %.1f MB' % (record['peak_bytes'] / 1000000.0))
+    if 'max_rss_bytes' in record:
+        details.append('max RSS %.1f MB' % (record['max_rss_bytes'] / 1000000.0))
+    return ', '.join(details)
+
+def get_max_rss():
+    'The peak size of the process so far, in bytes.'
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+# ===========================================================================
+# HOOKS TAKING None
+
+# these are what the pipeline calls, so that it needn't check for a profile
+
+def phase(profile, name):
+    'A context manager timing a phase, if there is a profile.'
+    if profile is None:
+        return contextlib.nullcontext()
+    return profile.phase(name)
+
+def note(profile, name, **values):
+    if profile is not None:
+        profile.note(name, **values)
+
+def count_primitives(profile, drawer):
+    'The drawer, counting what is drawn into profile if there is one.'
+    if profile is None:
+        return drawer
+    return CountingDrawer(drawer, profile)
+
+class CountingDrawer:
+    'Passes everything on to a drawer, counting the primitives drawn.'
+
+    def __init__(self, drawer, profile):
+        self._drawer = drawer
+        self._profile = profile
+
+    def __getattr__(self, name):
+        return getattr(self._drawer, name)
+
+    # the owner is set on the drawer, since a DisplayList records it
+    @property
+    def owner(self):
+        return self._drawer.owner
+
+    @owner.setter
+    def owner(self, owner):
+        self._drawer.owner = owner
+
+    def line(self, *args, **kwargs):
+        self._profile.count('lines')
+        self._drawer.line(*args, **kwargs)
+
+    def circle_segment(self, *args, **kwargs):
+        self._profile.count('arcs')
+        self._drawer.circle_segment(*args, **kwargs)
+
+    def circle(self, *args, **kwargs):
+        self._profile.count('circles')
+        self._drawer.circle(*args, **kwargs)
+
+    def draw_text(self, *args, **kwargs):
+        self._profile.count('texts')
+        self._drawer.draw_text(*args, **kwargs)
+
+    def draw_text_on_path(self, *args, **kwargs):
+        self._profile.count('texts on path')
+        self._drawer.draw_text_on_path(*args, **kwargs)
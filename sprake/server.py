@@ -0,0 +1,295 @@
+'''
+A long-running render server, for rendering many trees on request
+without starting a process for each.
+
+The server keeps everything it can warm between requests: the fonts and
+drawer modules, the compiled style rules and the metadata, and the
+recently rendered trees with their layouts and display lists, so that a
+tree rendered again with another style is only restyled (see
+incremental). Trees are known by a hash of their Newick text.
+
+  POST /render?format=PNG&mode=tree&style=NAME&data=NAME
+
+The body is the Newick text, and the response is the rendered file.
+style and data name the style and metadata files the server was started
+with; data defaults to the same name as style. GET /health describes the
+server as JSON.
+
+The renders run in a pool of worker processes, each with its own warm
+state. At most workers + queue requests are taken at a time, and the
+others get 503 Service Unavailable, so that a burst doesn't pile up.
+The server listens on TCP, or on a Unix socket.
+'''
+
+import collections, concurrent.futures, hashlib, http.server, json, os
+import socketserver, threading, urllib.parse
+from sprake import newick, style, metadata
+from sprake.incremental import IncrementalRenderer
+
+CONTENT_TYPES = {
+    'SVG'  : 'image/svg+xml',
+    'SVGZ' : 'image/svg+xml', # with Content-Encoding: gzip
+    'PDF'  : 'application/pdf',
+    'PNG'  : 'image/png',
+}
+
+MODES = ('tree', 'straight')
+
+# rendered trees kept by each worker
+MAX_TREES = 16
+
+# largest request body accepted, in bytes
+MAX_BODY = 256 * 1024 * 1024
+
+class RequestError(ValueError):
+    'A render request with bad arguments, answered with 400 Bad Request.'
+
+class RenderService:
+    '''Renders Newick text to bytes, keeping the style rules, the
+    metadata and the last max_trees trees between renders. styles and
+    data map names to style and metadata files. Not thread-safe: the
+    server gives each worker process its own.'''
+
+    def __init__(self, styles = None, data = None, id_field = 'ID',
+                 drawer_options = None, max_trees = MAX_TREES):
+        self._stylefiles = dict(styles or {})
+        self._datafiles = dict(data or {})
+        self._id_field = id_field
+        self._drawer_options = drawer_options
+        self._max_trees = max_trees
+        self._rules = {} # style name -> (rules, RuleIndex)
+        self._data = {} # (style name, data name) -> Metadata
+        self._renderers = collections.OrderedDict() # least recently used first
+
+    def render(self, data, format = 'SVG', mode = 'tree', stylename = None,
+               dataname = None):
+        'Renders the Newick text data, returning the file as bytes.'
+        if format not in CONTENT_TYPES:
+            raise RequestError('Unknown format "%s"' % format)
+        if mode not in MODES:
+            raise RequestError('Unknown mode "%s"' % mode)
+        (rules, data_by_id) = self._get_style(stylename, dataname)
+        renderer = self._get_renderer(data, format, mode)
+        return renderer.render(None, rules, data_by_id)
+
+    def warm_up(self):
+        '''Loads the styles and the metadata, and renders a small tree in
+        each format, so that the fonts and drawer modules are loaded
+        before the first request.'''
+        for name in self._stylefiles:
+            self._get_style(name, None)
+        for format in CONTENT_TYPES:
+            self.render('(A:1,B:1);', format)
+        self._renderers.clear()
+
+    def get_info(self):
+        return {'styles' : sorted(self._stylefiles),
+                'data' : sorted(self._datafiles),
+                'trees' : len(self._renderers)}
+
+    def _get_style(self, stylename, dataname):
+        'The rules (a RuleIndex) and the metadata for a request.'
+        if stylename is None:
+            return ([], {})
+        if stylename not in self._stylefiles:
+            raise RequestError('Unknown style "%s"' % stylename)
+        if stylename not in self._rules:
+            rules = style.parse_style(self._stylefiles[stylename])
+            self._rules[stylename] = (rules, style.compile_rules(rules))
+        (rules, index) = self._rules[stylename]
+
+        if dataname is None and stylename not in self._datafiles:
+            return (index, {}) # a style without metadata
+        dataname = dataname or stylename
+        key = (stylename, dataname)
+        if key not in self._data:
+            if dataname not in self._datafiles:
+                raise RequestError('Unknown data "%s"' % dataname)
+            # all the rows are kept, since they're shared by all the trees
+            self._data[key] = metadata.Metadata(
+                self._datafiles[dataname], self._id_field,
+                fields = style.get_data_fields(rules))
+            len(self._data[key]) # read it now
+        return (index, self._data[key])
+
+    def _get_renderer(self, data, format, mode):
+        key = (hashlib.sha256(data.encode('utf-8')).hexdigest(), format, mode)
+        renderer = self._renderers.get(key)
+        if renderer is not None:
+            self._renderers.move_to_end(key)
+            return renderer
+
+        tree = newick.parse_string(data)
+        if tree is None:
+            raise RequestError('No tree in the request')
+        renderer = IncrementalRenderer(tree, mode, format, self._drawer_options)
+        self._renderers[key] = renderer
+        while len(self._renderers) > self._max_trees:
+            self._renderers.popitem(last = False)
+        return renderer
+
+# ===========================================================================
+# WORKER PROCESSES
+
+# the service of a worker process, made once by _init_worker
+_worker_service = None
+
+def _init_worker(settings):
+    global _worker_service
+    _worker_service = RenderService(**settings)
+    _worker_service.warm_up()
+
+def _render_in_worker(data, format, mode, stylename, dataname):
+    return _worker_service.render(data, format, mode, stylename, dataname)
+
+def _get_info_in_worker():
+    return _worker_service.get_info()
+
+# ===========================================================================
+# HTTP SERVER
+
+class RenderServer:
+    '''The HTTP server, on (host, port) or on the Unix socket at
+    socket_path. workers is the number of render processes (by default
+    one per core), and queue the number of requests that may wait for
+    them. settings are the RenderService arguments.'''
+
+    def __init__(self, address = ('127.0.0.1', 8123), socket_path = None,
+                 workers = None, queue = None, verbose = False, **settings):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue = self.workers * 4 if queue is None else queue
+        self.verbose = verbose
+        self._settings = settings
+        self._lock = threading.Lock()
+        self._active = 0 # requests rendering or waiting for a worker
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers = self.workers, initializer = _init_worker,
+            initargs = (settings, ))
+        # start and warm up the workers now, rather than on the first
+        # requests
+        for future in [self._executor.submit(_get_info_in_worker)
+                       for ix in range(self.workers)]:
+            future.result()
+
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            self._httpd = _UnixHTTPServer(socket_path, _RenderHandler)
+        else:
+            self._httpd = http.server.ThreadingHTTPServer(address, _RenderHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.app = self
+        self._serving = False
+        self.socket_path = socket_path
+
+    @property
+    def server_address(self):
+        'The (host, port) the server listens on, or its socket path.'
+        return self._httpd.server_address
+
+    def serve_forever(self):
+        self._serving = True
+        self._httpd.serve_forever()
+
+    def start(self):
+        'Serves in a background thread.'
+        thread = threading.Thread(target = self.serve_forever, daemon = True)
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        if self._serving:
+            self._httpd.shutdown()
+        self._httpd.server_close()
+        self._executor.shutdown()
+        if self.socket_path and os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def render(self, data, format, mode, stylename, dataname):
+        '''Renders in a worker. Returns the bytes, or None if the server
+        is too busy to take the request.'''
+        with self._lock:
+            if self._active >= self.workers + self.queue:
+                return None
+            self._active += 1
+        try:
+            return self._executor.submit(_render_in_worker, data, format, mode,
+                                         stylename, dataname).result()
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def get_info(self):
+        return {'workers' : self.workers, 'queue' : self.queue,
+                'active' : self._active,
+                'styles' : sorted(self._settings.get('styles') or {}),
+                'data' : sorted(self._settings.get('data') or {})}
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    pass
+
+class _RenderHandler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if urllib.parse.urlsplit(self.path).path != '/health':
+            self._send_error(404, 'Not found')
+            return
+        self._send(200, 'application/json',
+                   json.dumps(self.server.app.get_info()).encode('utf-8'))
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != '/render':
+            self._send_error(404, 'Not found')
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY:
+            self._send_error(413, 'The tree is too big')
+            return
+        data = self.rfile.read(length)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        format = query.get('format', 'SVG').upper()
+
+        try:
+            result = self.server.app.render(data.decode('utf-8'), format,
+                                            query.get('mode', 'tree'),
+                                            query.get('style'),
+                                            query.get('data'))
+        except (AssertionError, ValueError) as e:
+            # RequestError is a ValueError, like the parser raises. the
+            # pipeline reports bad input with assertions
+            self._send_error(400, '%s: %s' % (type(e).__name__, e))
+            return
+        except Exception as e:
+            self._send_error(500, '%s: %s' % (type(e).__name__, e))
+            return
+
+        if result is None:
+            self._send_error(503, 'Too many requests, try again later',
+                             {'Retry-After' : '1'})
+        else:
+            headers = {'Content-Encoding' : 'gzip'} if format == 'SVGZ' else {}
+            self._send(200, CONTENT_TYPES[format], result, headers)
+
+    def _send_error(self, status, message, headers = None):
+        self._send(status, 'text/plain; charset=utf-8',
+                   (message + '\n').encode('utf-8'), headers)
+
+    def _send(self, status, content_type, body, headers = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for (name, value) in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'local'
+
+    def log_message(self, format, *args):
+        if self.server.app.verbose:
+            http.server.BaseHTTPRequestHandler.log_message(self, format, *args)
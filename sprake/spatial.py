@@ -0,0 +1,326 @@
+'''
+Spatial index for finding what is drawn in a region of the picture.
+
+The items are put in the cells of a uniform grid that their bounding
+boxes overlap, so a query only looks at the items in the cells it
+covers. Bounding boxes are (left, top, right, bottom), in picture
+coordinates, with y growing downwards.
+
+GridIndex holds anything with a bounding box, like the ops of a display
+list. LayoutIndex holds the parts of a laid-out tree by node, for
+culling the nodes outside a viewport and for hit-testing.
+'''
+
+import math
+
+# items covering more cells than this are kept in a list that every
+# query looks at, instead of in every one of the cells
+MAX_CELLS = 64
+
+class GridIndex:
+
+    def __init__(self, cell_size):
+        assert cell_size > 0, 'Cell size must be positive, not %s' % cell_size
+        self._cell_size = float(cell_size)
+        self._cells = {} # (col, row) -> list of items
+        self._large = [] # items covering more than MAX_CELLS cells
+        self._bounds = {} # item -> bbox
+
+    def __len__(self):
+        return len(self._bounds)
+
+    def insert(self, item, bbox, cells = None):
+        '''Adds item, which must be hashable, with its bounding box. cells
+        are the (col, row) of the cells it's in, if not all the cells
+        under the box, like from get_line_cells.'''
+        self._bounds[item] = bbox
+        if cells is None:
+            (col1, row1, col2, row2) = self._get_cells(bbox)
+            if (col2 - col1 + 1) * (row2 - row1 + 1) > MAX_CELLS:
+                self._large.append(item)
+                return
+            cells = [(col, row) for col in range(col1, col2 + 1)
+                     for row in range(row1, row2 + 1)]
+
+        grid = self._cells
+        for key in cells:
+            cell = grid.get(key)
+            if cell is None:
+                grid[key] = [item]
+            else:
+                cell.append(item)
+
+    def get_line_cells(self, start, end):
+        'The cells the line from start to end passes through, in order.'
+        ((x1, y1), (x2, y2)) = (start, end)
+        size = self._cell_size
+        (col, row) = (int(math.floor(x1 / size)), int(math.floor(y1 / size)))
+        (last_col, last_row) = (int(math.floor(x2 / size)),
+                                int(math.floor(y2 / size)))
+        cells = [(col, row)]
+        # step to the next column or row, whichever border the line
+        # crosses first. next_x and next_y are how far along the line
+        # the next borders are, as fractions of its length
+        (dx, dy) = (x2 - x1, y2 - y1)
+        (step_col, step_row) = (1 if dx > 0 else -1, 1 if dy > 0 else -1)
+        (next_x, delta_x) = (math.inf, math.inf)
+        if dx:
+            next_x = ((col + (dx > 0)) * size - x1) / dx
+            delta_x = size / abs(dx)
+        (next_y, delta_y) = (math.inf, math.inf)
+        if dy:
+            next_y = ((row + (dy > 0)) * size - y1) / dy
+            delta_y = size / abs(dy)
+        for step in range(abs(last_col - col) + abs(last_row - row)):
+            if next_x < next_y:
+                col += step_col
+                next_x += delta_x
+            else:
+                row += step_row
+                next_y += delta_y
+            cells.append((col, row))
+        return cells
+
+    def get_bounds(self, item):
+        return self._bounds[item]
+
+    def query(self, bbox):
+        '''Returns the items whose bounding boxes intersect bbox, sorted, so
+        that items that are drawing ops come in drawing order.'''
+        (left, top, right, bottom) = bbox
+        bounds = self._bounds
+        found = set()
+        for item in self._candidates(bbox):
+            if item in found:
+                continue
+            (x1, y1, x2, y2) = bounds[item]
+            if x1 <= right and x2 >= left and y1 <= bottom and y2 >= top:
+                found.add(item)
+        return sorted(found)
+
+    def query_point(self, x, y):
+        'Returns the items whose bounding boxes contain (x, y), sorted.'
+        return self.query((x, y, x, y))
+
+    def _candidates(self, bbox):
+        (col1, row1, col2, row2) = self._get_cells(bbox)
+        cells = self._cells
+        if (col2 - col1 + 1) * (row2 - row1 + 1) > len(cells):
+            # a query bigger than the index: cheaper to go through it all
+            for cell in cells.values():
+                yield from cell
+        else:
+            for col in range(col1, col2 + 1):
+                for row in range(row1, row2 + 1):
+                    yield from cells.get((col, row), ())
+        yield from self._large
+
+    def _get_cells(self, bbox):
+        'The (first col, first row, last col, last row) covered by bbox.'
+        size = self._cell_size
+        (left, top, right, bottom) = bbox
+        return (int(math.floor(left / size)), int(math.floor(top / size)),
+                int(math.floor(right / size)), int(math.floor(bottom / size)))
+
+def get_text_bounds(x, y, degree, size):
+    '''The box of text of size (height, width) drawn at (x, y), with room
+    below the baseline.'''
+    # the drawers turn upside-down text around, and rotate it
+    # counterclockwise from the left end of the baseline
+    if degree > 90 and degree < 270:
+        degree = degree - 180
+    (height, width) = size
+    rad = math.radians(degree)
+    (cos, sin) = (math.cos(rad), math.sin(rad))
+    xs = []
+    ys = []
+    for along in (0, width):
+        for up in (-height / 2.0, height): # descenders go below the baseline
+            xs.append(x + along * cos - up * sin)
+            ys.append(y - along * sin - up * cos)
+    return (min(xs), min(ys), max(xs), max(ys))
+
+def get_arc_bounds(cx, cy, start, end, r, stroke = 0):
+    # angles are clockwise from 3 o'clock, with y growing downwards. the
+    # box has the ends of the arc, and the points straight up, down,
+    # left, and right of the center that the arc passes
+    if end < start:
+        end += 2 * math.pi # the arc goes past 3 o'clock
+    angles = [start, end]
+    quarter = math.pi / 2
+    angle = math.ceil(start / quarter) * quarter
+    while angle < end and len(angles) < 6:
+        angles.append(angle)
+        angle += quarter
+    xs = [cx + r * math.cos(angle) for angle in angles]
+    ys = [cy + r * math.sin(angle) for angle in angles]
+    half = stroke / 2.0
+    return (min(xs) - half, min(ys) - half, max(xs) + half, max(ys) + half)
+
+# ===========================================================================
+# INDEX OF LAID-OUT TREES
+
+# kinds of shapes
+LINE = 0 # x1, y1, x2, y2
+ARC  = 1 # cx, cy, r, low, high (angles)
+BOX  = 2 # left, top, right, bottom
+
+class LayoutIndex:
+    '''The parts of a laid-out tree by node: the branches, what joins the
+    children, and the leaf labels, for finding the nodes in a region or
+    at a point. Long parts are split into pieces about a cell long, so
+    that each piece is in only a few cells.'''
+
+    def __init__(self, cell_size):
+        self._cell_size = float(cell_size)
+        self._grid = GridIndex(cell_size)
+        self._shapes = [] # piece number -> (node, kind, coordinates)
+
+    def add_line(self, node, start, end):
+        ((x1, y1), (x2, y2)) = (start, end)
+        self._add(node, LINE, (x1, y1, x2, y2),
+                  (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)),
+                  self._grid.get_line_cells(start, end))
+
+    def add_arc(self, node, center, r, low, high):
+        'An arc clockwise from angle low to high, in radians.'
+        (cx, cy) = center
+        pieces = self._count_pieces(r * (high - low))
+        for piece in range(pieces):
+            a = low + (high - low) * piece / float(pieces)
+            b = low + (high - low) * (piece + 1) / float(pieces)
+            self._add(node, ARC, (cx, cy, r, a, b),
+                      get_arc_bounds(cx, cy, a, b, r))
+
+    def add_box(self, node, bbox):
+        self._add(node, BOX, bbox, bbox)
+
+    def _count_pieces(self, length):
+        return max(1, int(math.ceil(length / self._cell_size)))
+
+    def _add(self, node, kind, coordinates, bbox, cells = None):
+        self._grid.insert(len(self._shapes), bbox, cells)
+        self._shapes.append((node, kind, coordinates))
+
+    def get_nodes(self, bbox):
+        '''The nodes with parts in bbox, sorted. Lines are checked exactly,
+        and arcs and labels by their bounding boxes, so nodes just outside
+        may be included.'''
+        nodes = set()
+        for piece in self._grid.query(bbox):
+            (node, kind, coordinates) = self._shapes[piece]
+            if kind != LINE or _line_meets_box(coordinates, bbox):
+                nodes.add(node)
+        return sorted(nodes)
+
+    def hit_test(self, x, y, tolerance = 3):
+        '''The node with the part closest to (x, y), or None if none is
+        within tolerance.'''
+        best = (tolerance, None)
+        for piece in self._grid.query((x - tolerance, y - tolerance,
+                                       x + tolerance, y + tolerance)):
+            (node, kind, coordinates) = self._shapes[piece]
+            distance = _get_distance(kind, coordinates, x, y)
+            if distance < best[0] or (distance == best[0] and best[1] is None):
+                best = (distance, node)
+        return best[1]
+
+def _line_meets_box(line, bbox):
+    # clips the line to the box, Liang-Barsky style: t is how far along
+    # the line, and the part inside each edge of the box is narrowed down
+    (x1, y1, x2, y2) = line
+    (left, top, right, bottom) = bbox
+    (dx, dy) = (x2 - x1, y2 - y1)
+    (low, high) = (0.0, 1.0)
+    for (p, q) in ((-dx, x1 - left), (dx, right - x1),
+                   (-dy, y1 - top), (dy, bottom - y1)):
+        if p == 0:
+            if q < 0:
+                return False # parallel to the edge, and outside it
+        elif p < 0:
+            low = max(low, q / p)
+        else:
+            high = min(high, q / p)
+    return low <= high
+
+def _get_distance(kind, coordinates, x, y):
+    if kind == LINE:
+        (x1, y1, x2, y2) = coordinates
+        (dx, dy) = (x2 - x1, y2 - y1)
+        length = dx * dx + dy * dy
+        t = 0.0
+        if length:
+            t = max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / length))
+        return math.hypot(x - (x1 + t * dx), y - (y1 + t * dy))
+    elif kind == ARC:
+        (cx, cy, r, low, high) = coordinates
+        angle = math.atan2(y - cy, x - cx)
+        angle = low + (angle - low) % (2 * math.pi)
+        if angle <= high:
+            return abs(math.hypot(x - cx, y - cy) - r)
+        return min(math.hypot(x - cx - r * math.cos(end),
+                              y - cy - r * math.sin(end))
+                   for end in (low, high))
+    else:
+        (left, top, right, bottom) = coordinates
+        return math.hypot(max(left - x, 0, x - right), max(top - y, 0, y - bottom))
+
+def index_radial(radial, cell_size = None):
+    '''A LayoutIndex of a layout from layout.radial_layout. cell_size is
+    in pixels, and by default gives about one cell per node.'''
+    count = radial.get_node_count()
+    index = LayoutIndex(cell_size or _get_cell_size(radial.width, radial.width,
+                                                    count))
+    center = radial.center
+    (parents, angles, used) = (radial.parents, _to_list(radial.angles),
+                               _to_list(radial.used))
+    (outer_x, outer_y) = (_to_list(radial.outer_x), _to_list(radial.outer_y))
+    (arc_low, arc_high) = (_to_list(radial.arc_low), _to_list(radial.arc_high))
+    for ix in range(count):
+        parent = parents[ix]
+        inner = radial.point(angles[ix], used[parent]) if parent != -1 \
+                else (center, center)
+        index.add_line(ix, inner, (outer_x[ix], outer_y[ix]))
+        if arc_low[ix] <= arc_high[ix]: # it has children
+            index.add_arc(ix, (center, center), used[ix], arc_low[ix],
+                          arc_high[ix])
+
+    dotsize = radial.auto_dotsize
+    (text_x, text_y) = (_to_list(radial.text_x), _to_list(radial.text_y))
+    degrees = _to_list(radial.degrees)
+    for (pos, leaf) in enumerate(radial.leaves):
+        # the dashed line out to the labels, and the dot
+        (x, y) = radial.point(angles[leaf], radial.radius)
+        index.add_line(leaf, radial.point(angles[leaf], used[leaf]), (x, y))
+        index.add_box(leaf, (x - dotsize, y - dotsize, x + dotsize, y + dotsize))
+        index.add_box(leaf, get_text_bounds(
+            int(text_x[pos]), int(text_y[pos]), degrees[pos],
+            (radial.text_height, radial.label_widths[pos])))
+    return index
+
+def index_straight(straight, cell_size = None):
+    'Like index_radial, for a layout from layout.straight_layout.'
+    count = straight.get_node_count()
+    index = LayoutIndex(cell_size or _get_cell_size(straight.width,
+                                                    straight.height, count))
+    (parents, y, left, right) = (straight.parents, straight.y, straight.left,
+                                 straight.right)
+    for ix in range(count):
+        parent = parents[ix]
+        if parent != -1:
+            index.add_line(ix, (right[parent], y[parent]), (right[parent], y[ix]))
+        index.add_line(ix, (left[ix], y[ix]), (right[ix], y[ix]))
+
+    for (pos, leaf) in enumerate(straight.leaves):
+        index.add_line(leaf, (right[leaf], y[leaf]), (straight.right_edge, y[leaf]))
+        index.add_box(leaf, get_text_bounds(
+            straight.text_x, straight.text_y[pos], 0,
+            (straight.text_height, straight.label_widths[pos])))
+    return index
+
+def _get_cell_size(width, height, count):
+    return max(1.0, math.sqrt(width * height / float(count)))
+
+def _to_list(values):
+    # plain floats are much faster than numpy scalars, one at a time
+    return values.tolist() if hasattr(values, 'tolist') else values
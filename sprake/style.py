@@ -2,6 +2,8 @@
 Parser for style rules and object structure for the configuration.
 '''
 
+from sprake import profiling
+
 # ===========================================================================
 # COLOR HANDLING
 
@@ -26,7 +28,16 @@ class Color:
         return '#%s%s%s' % (tohex(self._red), tohex(self._green), tohex(self._blue))
 
     def to_rgb_tuple(self):
-        return (self._red, self._green, self._red)
+        return (self._red, self._green, self._blue)
+
+    # colors are equal by value, so that the same color from different
+    # rules (or style files) counts as the same style
+    def __eq__(self, other):
+        return isinstance(other, Color) and \
+            self.to_rgb_tuple() == other.to_rgb_tuple()
+
+    def __hash__(self):
+        return hash(self.to_rgb_tuple())
 
 HEXDIGIT = '0123456789abcdef'
 def tohex(num):
@@ -44,6 +55,10 @@ class AbstractRule:
         self._prop = prop
         self._setval = setval
 
+    def get_property(self):
+        'The node property the rule sets, like "textcolor".'
+        return self._prop
+
     def update(self, node, data):
         if self._prop == 'textcolor':
             node.textcolor = self._setval
@@ -55,10 +70,35 @@ class AbstractRule:
             node.dotcolour = self._setval
         elif self._prop == 'label':
             if data:
-                node._label = data.get(self._setval) or node._label
+                node.set_label(data.get(self._setval) or node.get_label())
         else:
             assert False, 'No implementation of rule property %s' % self._prop
 
+    def get_setter(self):
+        'Returns a function (node, data) doing the same as update.'
+        setval = self._setval
+        if self._prop == 'label':
+            def set_label(node, data):
+                if data:
+                    node.set_label(data.get(setval) or node.get_label())
+            return set_label
+
+        if self._prop == 'linewidth':
+            setval = int(setval)
+        attribute = NODE_ATTRIBUTES.get(self._prop)
+        assert attribute, 'No implementation of rule property %s' % self._prop
+        def set_attribute(node, data):
+            setattr(node, attribute, setval)
+        return set_attribute
+
+# rule property -> node attribute
+NODE_ATTRIBUTES = {
+    'textcolor' : 'textcolor',
+    'linecolor' : 'linecolor',
+    'linewidth' : 'linestroke',
+    'dotcolor'  : 'dotcolour',
+}
+
 class AllRule(AbstractRule):
     def __init__(self, prop, setval):
         AbstractRule.__init__(self, prop, setval)
@@ -128,17 +168,84 @@ def parse_style(filename):
 # ===========================================================================
 # STYLE ENGINE
 
-def apply_rules(tree, rules, data_by_id):
-    for node in tree.get_all_nodes():
-        data = data_by_id.get(node.get_label())
-        for rule in rules:
-            if rule.matches(data):
-                rule.update(node, data)
-
-    tree.upmerge_linestyle()
-
+class RuleIndex:
+    '''Rules compiled for matching: the setters of the EqualsRules are
+    found with one dict lookup per field, instead of trying every rule
+    on every node.'''
+
+    def __init__(self, rules):
+        self.rules = rules
+        self._all = [] # (order, setter) for the AllRules
+        self._by_value = {} # (field, value) -> [(order, setter), ...]
+        self._fields = []
+        self._merged = {} # matched keys -> setters, in rule order
+        for (order, rule) in enumerate(rules):
+            setter = (order, rule.get_setter())
+            if isinstance(rule, EqualsRule):
+                if rule._field not in self._fields:
+                    self._fields.append(rule._field)
+                key = (rule._field, rule._value)
+                self._by_value.setdefault(key, []).append(setter)
+            else:
+                self._all.append(setter)
+
+    def get_setters(self, data):
+        'Returns (order, setter) for the rules matching data, in rule order.'
+        if not data:
+            return self._all
+
+        matched = []
+        for field in self._fields:
+            key = (field, data.get(field))
+            if key in self._by_value:
+                matched.append(key)
+        if not matched:
+            return self._all
+
+        matched = tuple(matched)
+        setters = self._merged.get(matched)
+        if setters is None:
+            setters = self._all + [setter for key in matched
+                                   for setter in self._by_value[key]]
+            # later rules override earlier ones, so the order must be kept
+            setters.sort(key = lambda setter: setter[0])
+            self._merged[matched] = setters
+        return setters
+
+    def sets_labels(self):
+        'Whether some rule changes the labels, which changes the layout.'
+        return any(rule.get_property() == 'label' for rule in self.rules)
+
+def compile_rules(rules):
+    return RuleIndex(rules)
+
+def apply_rules(tree, rules, data_by_id, profile = None):
+    '''rules is a list of rules, or a RuleIndex from compile_rules.
+    profile is a profiling.Profile to record the phases in.'''
+    with profiling.phase(profile, 'apply rules'):
+        index = rules if isinstance(rules, RuleIndex) else compile_rules(rules)
+        for node in tree.iter_preorder():
+            data = data_by_id.get(node.get_label())
+            for (order, setter) in index.get_setters(data):
+                setter(node, data)
+
+    with profiling.phase(profile, 'upmerge line styles'):
+        tree.upmerge_linestyle()
+    return get_legends(index.rules)
+
+def get_legends(rules):
     text_legend = {rule._value : rule._setval for rule in rules
                    if rule._prop == 'textcolor' and hasattr(rule, '_value')}
     dot_legend = {rule._value : rule._setval for rule in rules
                    if rule._prop == 'dotcolor' and hasattr(rule, '_value')}
     return (text_legend, dot_legend)
+
+def get_data_fields(rules):
+    'The metadata fields the rules read, so only those need loading.'
+    fields = set()
+    for rule in rules:
+        if isinstance(rule, EqualsRule):
+            fields.add(rule._field)
+        if rule._prop == 'label':
+            fields.add(rule._setval)
+    return fields
@@ -0,0 +1,58 @@
+'''
+Cache of text measurements, shared by all the drawers in the process.
+
+Labels are measured several times per render (for the layout, for the
+flipped labels, for the legends), and the same labels come back when a
+tree is rendered again, so the sizes are kept per (font, text) in a
+bounded least-recently-used cache.
+'''
+
+import collections, threading, time
+
+MAX_ENTRIES = 200000
+
+class TextMetrics:
+
+    def __init__(self, max_entries = MAX_ENTRIES):
+        self._max_entries = max_entries
+        self._sizes = collections.OrderedDict() # least recently used first
+        self._lock = threading.Lock()
+        self._measured = 0
+        self._cached = 0
+        self._seconds = 0.0 # spent measuring
+
+    def get_text_size(self, font, text, measure):
+        '''Returns the (height, width) of text, calling measure(text) if it
+        isn't cached. font is a hashable key for the font and its size.'''
+        key = (font, text)
+        with self._lock:
+            size = self._sizes.get(key)
+            if size is not None:
+                self._sizes.move_to_end(key)
+                self._cached += 1
+                return size
+
+        start = time.perf_counter()
+        size = measure(text)
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self._measured += 1
+            self._seconds += seconds
+            self._sizes[key] = size
+            if len(self._sizes) > self._max_entries:
+                self._sizes.popitem(last = False)
+        return size
+
+    def get_stats(self):
+        '''(texts measured, texts found in the cache, seconds spent
+        measuring), since the start.'''
+        return (self._measured, self._cached, self._seconds)
+
+    def clear(self):
+        with self._lock:
+            self._sizes.clear()
+
+    def __len__(self):
+        return len(self._sizes)
+
+METRICS = TextMetrics()
@@ -1,13 +1,17 @@
 
-import sys, math
+import io, os, sys, math
 from decimal import Decimal
-from sprake import newick, style
+from sprake import newick, style, layout, profiling
+from sprake.displaylist import DisplayList, NO_OWNER, optimize
+from sprake.layout import get_tree_height, compute_legend_size, \
+    get_root_distance, nicely_float_to_str, calibrate_scale
 
 SCALE_FACTOR        = 0.35
 FONT_SIZE           = 12
 MIN_CIRCUMFERENCE   = 300
 EMPTY_CENTER_FACTOR = 0.25
 TEXT_SPACING_FACTOR = 0.1
+SVGZ_COMPRESSLEVEL  = 6
 
 # draw_png.PNGDrawer
 # draw_svg.SVGDrawer # no deps
@@ -27,93 +31,174 @@ class DrawingContext:
     def get_circle_point(self, deg, r):
         return get_circle_point(self.center, self.center, deg, r)
 
-def get_drawer(outfile, format, font_size):
-    if format == 'SVG':
-        from sprake.draw_svg import SVGDrawer
-        drawer = SVGDrawer(outfile, font_size)
+# outfile: a filename, or a file object, which the drawer writes to and
+# leaves open. SVG can be written to text or binary files, the other
+# formats to binary files.
+# options: keyword arguments for the drawer. for SVG, compact = True
+# writes smaller files with CompactSVGDrawer. SVGZ is gzipped SVG, and
+# takes compresslevel. the SVG options are ignored by the other formats.
+# TILES writes a tile pyramid to the directory outfile, with draw_tiles
+def get_drawer(outfile, format, font_size, options = None):
+    options = dict(options or {})
+    compact = options.pop('compact', False)
+    compresslevel = options.pop('compresslevel', None)
+    scale = options.pop('scale', 1)
+
+    if format in ('SVG', 'SVGZ'):
+        from sprake.draw_svg import SVGDrawer, CompactSVGDrawer
+        if format == 'SVGZ':
+            options['compresslevel'] = compresslevel or SVGZ_COMPRESSLEVEL
+        if compact:
+            drawer = CompactSVGDrawer(outfile, font_size, **options)
+        else:
+            drawer = SVGDrawer(outfile, font_size, **options)
     elif format == 'PNG':
         from sprake.draw_png import PNGDrawer
-        drawer = PNGDrawer(outfile, font_size)
+        drawer = PNGDrawer(outfile, font_size, scale = scale, **options)
+    elif format == 'TILES':
+        assert isinstance(outfile, (str, os.PathLike)), \
+               'TILES needs a directory to write to'
+        from sprake.draw_tiles import TiledDrawer
+        drawer = TiledDrawer(outfile, font_size, **options)
     elif format == 'PDF':
         from sprake.draw_pdf import PDFDrawer
-        drawer = PDFDrawer(outfile, font_size)
+        drawer = PDFDrawer(outfile, font_size, **options)
     else:
         assert False, 'Unknown format "%s"' % format
     return drawer
 
+def compute_layout(compute, tree, drawer, text_legend, layout_cache = None):
+    if layout_cache:
+        return layout_cache.get_layout(compute, tree, drawer, text_legend)
+    return compute(tree, drawer, text_legend)
+
+def get_target(outfile, format):
+    '''What to give get_drawer for outfile, and the BytesIO the output
+    goes to if outfile is None, for returning it as bytes.'''
+    if outfile is not None:
+        return (outfile, None)
+    assert format != 'TILES', 'TILES can\'t be returned as bytes'
+    buffer = io.BytesIO()
+    return (buffer, buffer)
+
+# outfile: as for get_drawer, or None to return the output as bytes.
+# viewport: (left, top, right, bottom). if given, only the nodes in it
+# are drawn, though the picture has the size of the whole tree.
+# profile: a profiling.Profile recording the phases of the render
 def render_tree(outfile, tree, dot_legend = None, text_legend = None,
-                format = 'SVG', banners = []):
-    drawer = get_drawer(outfile, format, FONT_SIZE)
-    (text_height, text_width) = drawer.get_text_size('A')
-
-    (legend_h, legend_w) = compute_legend_size(drawer, text_legend)
-
-    leaves = tree.get_leaves()
-
-    for node in tree.get_leaves():
-        text_width = max(text_width, drawer.get_text_size(node.get_label())[1])
-    text_width = max(text_width, legend_h, legend_w) # ensure room for legend
-
-    gap = text_height * TEXT_SPACING_FACTOR
-
-    circumference = len(leaves) * (text_height + gap) * SCALE_FACTOR
-    circumference = max(MIN_CIRCUMFERENCE, circumference)
-
-    diameter = circumference / math.pi
-    width = int(circumference + (text_width * 2) + gap * 2) + 250
-    drawer.create(width, width)
-
-    center = width / 2
-    radius = circumference / 2
-    deg_step = (math.pi * 2) / len(leaves)
+                format = 'SVG', banners = [], layout_cache = None,
+                drawer_options = None, viewport = None, profile = None):
+    (target, buffer) = get_target(outfile, format)
+    drawer = get_drawer(target, format, FONT_SIZE, drawer_options)
+    with profiling.phase(profile, 'layout'):
+        radial = compute_layout(layout.radial_layout, tree, drawer,
+                                text_legend, layout_cache)
+    with profiling.phase(profile, 'draw'):
+        draw_radial(radial, tree, profiling.count_primitives(profile, drawer),
+                    dot_legend, text_legend, banners, viewport)
+    with profiling.phase(profile, 'save'):
+        drawer.save()
+    if buffer is not None:
+        return buffer.getvalue()
+
+def render_tree_formats(targets, tree, dot_legend = None, text_legend = None,
+                        banners = [], layout_cache = None,
+                        drawer_options = None, passes = (), profile = None):
+    '''Renders the tree to each (outfile, format) in targets, doing the
+    layout and drawing the tree only once, into a display list. The text
+    is measured with the drawer of the first target. passes are the
+    displaylist optimisation passes to run. Returns a list with the
+    output as bytes for the targets where outfile is None, and None for
+    the others.'''
+    outputs = [get_target(outfile, format) for (outfile, format) in targets]
+    drawers = [get_drawer(target, format, FONT_SIZE, drawer_options)
+               for ((target, buffer), (outfile, format)) in zip(outputs, targets)]
+    with profiling.phase(profile, 'layout'):
+        radial = compute_layout(layout.radial_layout, tree, drawers[0],
+                                text_legend, layout_cache)
+    with profiling.phase(profile, 'record'):
+        display = build_radial(radial, tree, drawers[0], dot_legend,
+                               text_legend, banners, passes)
+    return replay_formats(display, targets, drawers, outputs, profile)
+
+def replay_formats(display, targets, drawers, outputs, profile = None):
+    '''Replays the display list into the drawers of targets, and saves
+    them. Returns the outputs as bytes, like render_tree_formats.'''
+    for ((outfile, format), drawer) in zip(targets, drawers):
+        with profiling.phase(profile, 'draw %s' % format):
+            display.replay(profiling.count_primitives(profile, drawer))
+        with profiling.phase(profile, 'save %s' % format):
+            drawer.save()
+    return [None if buffer is None else buffer.getvalue()
+            for (target, buffer) in outputs]
+
+def build_radial(radial, tree, measurer, dot_legend = None, text_legend = None,
+                 banners = [], passes = ()):
+    '''Returns the display list of the tree, with a layout from
+    layout.radial_layout. measurer is the drawer used to measure text.'''
+    display = DisplayList(measurer)
+    draw_radial(radial, tree, display, dot_legend, text_legend, banners)
+    return optimize(display, passes)
+
+def get_visible(thelayout, viewport):
+    '''The set of nodes with something to draw in the viewport, or None
+    for all the nodes if there's no viewport.'''
+    if viewport is None:
+        return None
+    return set(thelayout.get_index().get_nodes(viewport))
+
+# the draw_ functions draw into a drawer or a DisplayList. they set the
+# owner before drawing each node, which only the DisplayList makes use of
+
+# owner of the ops drawing the legends, which change with the style alone
+LEGEND_OWNER = -2
+
+def draw_radial(radial, tree, drawer, dot_legend = None, text_legend = None,
+                banners = [], viewport = None):
+    '''Draws the tree with a layout from layout.radial_layout. With a
+    viewport, only the nodes in it are drawn.'''
+    drawer.create(radial.width, radial.width)
+    visible = get_visible(radial, viewport)
+    center = radial.center
+    radius = radial.radius
+    auto_dotsize = radial.auto_dotsize
     ctx = DrawingContext(radius, center, drawer)
-
-    # degrees to step further from node to center text on node
-    text_step = ((math.pi * text_height) / circumference) * 0.3
-
-    auto_dotsize = (circumference / len(leaves)) * 1.4
+    nodes = tree.get_all_nodes()
 
     # draw the leaves
-    for ix in range(len(leaves)):
-        deg = (deg_step * ix)
-
-        node = leaves[ix]
-        (x, y) = ctx.get_circle_point(deg, radius)
-        node.x = x
-        node.y = y
-        (textx, texty) = ctx.get_circle_point(deg + text_step, radius + auto_dotsize + 2)
-
-        degree = 360 - (deg / (math.pi*2)) * 360
-        node.degrees = degree
-        node.radians = deg
-        if degree > 90 and degree < 270:
-            # degree = degree - 180
-            width = drawer.get_text_size(node.get_label())[1]
-            (textx, texty) = ctx.get_circle_point(deg - (text_step * 0.5), radius + width + auto_dotsize + 2)
-
-        drawer.draw_text((textx, texty), node.get_label(), degree,
-                         node.textcolor)
-        if node.dotcolour:
-            drawer.circle((x, y), auto_dotsize, node.dotcolour)
-
-    # draw the tree
-    empty_part = radius * EMPTY_CENTER_FACTOR
-    h = get_tree_height(tree)
-    step = (radius - empty_part) / float(h)
-    deg = tree.get_average_radians()
-    drawer.line((center, center), ctx.get_circle_point(deg, empty_part),
-                color = tree.linecolor, stroke = tree.linestroke)
-    draw_node(tree, 1, empty_part, ctx, step, auto_dotsize)
-
-    # draw legends
-    if dot_legend:
-        draw_dot_legend(ctx, drawer, dot_legend, auto_dotsize)
-    if text_legend:
-        draw_text_legend(drawer, text_legend)
+    for (ix, leaf) in enumerate(radial.leaves):
+        node = nodes[leaf]
+        (node.x, node.y) = radial.point(radial.angles[leaf], radius)
+        node.degrees = float(radial.degrees[ix])
+        node.radians = float(radial.angles[leaf])
+
+        if visible is None or leaf in visible:
+            drawer.owner = leaf
+            draw_radial_leaf(radial, drawer, nodes, ix)
+    tree.summarize_radians()
+
+    # draw the tree. the arc joining the children of a node is drawn after
+    # them, so the nodes whose arcs are still to come are kept on a stack
+    parents = radial.parents
+    open_arcs = []
+    for ix in (range(len(nodes)) if visible is None else sorted(visible)):
+        while open_arcs and open_arcs[-1] != parents[ix]:
+            drawer.owner = open_arcs[-1]
+            draw_radial_arc(radial, drawer, nodes, open_arcs.pop())
+        drawer.owner = ix
+        draw_radial_branch(radial, drawer, nodes, ix)
+        if nodes[ix].has_children():
+            open_arcs.append(ix)
+    while open_arcs:
+        drawer.owner = open_arcs[-1]
+        draw_radial_arc(radial, drawer, nodes, open_arcs.pop())
+
+    draw_radial_legends(radial, drawer, dot_legend, text_legend)
+    drawer.owner = NO_OWNER
 
     # draw banners
     for (n1, n2, title, color) in banners:
-        r = ctx.radius + text_width + auto_dotsize + 50
+        r = ctx.radius + radial.text_width + auto_dotsize + 50
         (lowest1, highest1) = n1.get_radian_span()
         (lowest2, highest2) = n2.get_radian_span()
 
@@ -123,49 +208,65 @@ def render_tree(outfile, tree, dot_legend = None, text_legend = None,
                                   color = color, id = theid)
         ctx.drawer.draw_text_on_path(node.get_label(), theid, ctx.drawer.get_font_size() * 2)
 
-    drawer.save()
-
-def get_tree_height(tree):
-    if any([n.get_distance() == None for n in tree.get_all_nodes()]):
-        return tree.get_height()
+def draw_radial_leaf(radial, drawer, nodes, pos):
+    'Draws the label and the dot of the leaf at pos in radial.leaves.'
+    leaf = radial.leaves[pos]
+    node = nodes[leaf]
+    drawer.draw_text((int(radial.text_x[pos]), int(radial.text_y[pos])),
+                     node.get_label(), float(radial.degrees[pos]),
+                     node.textcolor)
+    if node.dotcolour:
+        drawer.circle(radial.point(radial.angles[leaf], radial.radius),
+                      radial.auto_dotsize, node.dotcolour)
+
+def draw_radial_node(radial, drawer, nodes, ix):
+    'Draws the branch leading to the node, and what joins its children.'
+    draw_radial_branch(radial, drawer, nodes, ix)
+    draw_radial_arc(radial, drawer, nodes, ix)
+
+def draw_radial_branch(radial, drawer, nodes, ix):
+    'Draws the branch leading to the node, dashed on to the leaf label.'
+    node = nodes[ix]
+    angle = radial.angles[ix]
+    outer = (int(radial.outer_x[ix]), int(radial.outer_y[ix]))
+    parent = radial.parents[ix]
+    if parent == -1:
+        drawer.line((radial.center, radial.center), outer,
+                    color = node.linecolor, stroke = node.linestroke)
     else:
-        return tree.get_distance_height()
-
-def draw_node(node, level, used_radius, ctx, step, auto_dotsize):
-    if (not node.get_children()):
-        if used_radius >= ctx.radius - auto_dotsize:
-            return
-
-        deg2 = node.radians
-        start = ctx.get_circle_point(deg2, used_radius)
+        # the branch is styled like the parent, so it merges with its arc
+        pnode = nodes[parent]
+        inner = radial.point(angle, radial.used[parent] - pnode.linestroke / 2.0)
+        drawer.line(inner, outer, stroke = pnode.linestroke,
+                    color = pnode.linecolor)
+
+    used = radial.used[ix]
+    if not node.has_children() and used < radial.radius - radial.auto_dotsize:
+        start = radial.point(angle, used)
         dot = 0
         if node.dotcolour:
-            dot = auto_dotsize + 5 # FIXME: this factor needs scaling
-        end = ctx.get_circle_point(deg2, ctx.radius - dot)
-        ctx.drawer.line(start, end, stroke = node.linestroke,
-                        color = node.linecolor, dash = True)
-        return
-
-    lowest = 10
-    highest = 0
-    for child in node.get_children():
-        deg2 = child.get_average_radians()
-
-        length = step * (node.get_distance() if node.get_distance() != None else 1.0)
-        inner = ctx.get_circle_point(deg2, used_radius - node.linestroke / 2.0)
-        outer = ctx.get_circle_point(deg2, min(used_radius + length, ctx.radius - auto_dotsize))
-        ctx.drawer.line(inner, outer, stroke = node.linestroke,
-                        color = node.linecolor)
-
-        lowest = min(lowest, deg2)
-        highest = max(highest, deg2)
-
-        draw_node(child, level + 1, used_radius + length, ctx, step, auto_dotsize)
-
-    r = used_radius
-    (x, y) = (ctx.center, ctx.center)
-    ctx.drawer.circle_segment(x, y, lowest, highest, r,
-                              stroke = node.linestroke, color = node.linecolor)
+            dot = radial.auto_dotsize + 5 # FIXME: this factor needs scaling
+        end = radial.point(angle, radial.radius - dot)
+        drawer.line(start, end, stroke = node.linestroke,
+                    color = node.linecolor, dash = True)
+
+def draw_radial_arc(radial, drawer, nodes, ix):
+    'Draws the arc joining the children of the node, if it has any.'
+    node = nodes[ix]
+    if node.has_children():
+        drawer.circle_segment(radial.center, radial.center,
+                              radial.arc_low[ix], radial.arc_high[ix],
+                              radial.used[ix], stroke = node.linestroke,
+                              color = node.linecolor)
+
+def draw_radial_legends(radial, drawer, dot_legend, text_legend):
+    'Draws the legends, owned by LEGEND_OWNER.'
+    drawer.owner = LEGEND_OWNER
+    if dot_legend:
+        ctx = DrawingContext(radial.radius, radial.center, drawer)
+        draw_dot_legend(ctx, drawer, dot_legend, radial.auto_dotsize)
+    if text_legend:
+        draw_text_legend(drawer, text_legend)
 
 def draw_dot_legend(ctx, drawer, dot_legend, dotsize):
     text_height = drawer.get_text_size('X')[0]
@@ -199,127 +300,104 @@ def draw_text_legend(drawer, text_legend):
 
     # FIXME: could draw a box around it?
 
-def compute_legend_size(drawer, text_legend):
-    if not text_legend:
-        return (0, 0)
-
-    text_height = drawer.get_text_size('X')[0]
-    offset = text_height * 2
-    gap = text_height / 3.0
-
-    max_width = max([drawer.get_text_size(name)[1] for name in text_legend.keys()])
-
-    return (offset + (gap + text_height) * len(text_legend), offset + max_width)
-
 # ===== STRAIGHT RENDERING MODE
 
 def render_straight(outfile, tree, dot_legend = None, text_legend = None,
-                    format = 'SVG'):
-    leaves = tree.get_leaves()
-
-    drawer = get_drawer(outfile, format, FONT_SIZE)
-    (text_height, text_width) = drawer.get_text_size('A')
-
-    for node in tree.get_leaves():
-        text_width = max(text_width, drawer.get_text_size(node.get_label())[1])
-
-    gap = text_height * TEXT_SPACING_FACTOR
-    margin = 20
-    tree_width = 1000
-    scale_height = text_height + gap * 4
-
-    tree_height = (text_height + gap) * len(leaves)
-    height = margin + scale_height + tree_height + margin
-    width = margin + tree_width + gap + text_width + margin
-
-    drawer.create(height, width)
-
-    if does_tree_have_distances(tree):
-        print('AUTOSCALE')
-        draw_scale = True
-        (biggest, increment) = calibrate_scale(tree.get_distance_height())
-        print(biggest, increment)
-    else:
-        print('STILL NO AUTOSCALE')
-        draw_scale = False
-        biggest = tree.get_height()
-        increment = None
+                    format = 'SVG', layout_cache = None,
+                    drawer_options = None, viewport = None, profile = None):
+    (target, buffer) = get_target(outfile, format)
+    drawer = get_drawer(target, format, FONT_SIZE, drawer_options)
+    straight = compute_straight_layout(tree, drawer, text_legend,
+                                       layout_cache, profile)
+    with profiling.phase(profile, 'draw'):
+        draw_straight(straight, tree, profiling.count_primitives(profile, drawer),
+                      viewport)
+    with profiling.phase(profile, 'save'):
+        drawer.save()
+    if buffer is not None:
+        return buffer.getvalue()
+
+def render_straight_formats(targets, tree, dot_legend = None,
+                            text_legend = None, layout_cache = None,
+                            drawer_options = None, passes = (),
+                            profile = None):
+    'Like render_tree_formats, for the straight layout.'
+    outputs = [get_target(outfile, format) for (outfile, format) in targets]
+    drawers = [get_drawer(target, format, FONT_SIZE, drawer_options)
+               for ((target, buffer), (outfile, format)) in zip(outputs, targets)]
+    straight = compute_straight_layout(tree, drawers[0], text_legend,
+                                       layout_cache, profile)
+    with profiling.phase(profile, 'record'):
+        display = build_straight(straight, tree, drawers[0], passes)
+    return replay_formats(display, targets, drawers, outputs, profile)
+
+def compute_straight_layout(tree, drawer, text_legend, layout_cache = None,
+                            profile = None):
+    with profiling.phase(profile, 'layout'):
+        straight = compute_layout(layout.straight_layout, tree, drawer,
+                                  text_legend, layout_cache)
+        profiling.note(profile, 'scale', autoscale = straight.autoscale,
+                       scale_max = straight.scale_max,
+                       scale_step = straight.scale_step)
+    return straight
+
+def build_straight(straight, tree, measurer, passes = ()):
+    '''Returns the display list of the tree, with a layout from
+    layout.straight_layout.'''
+    display = DisplayList(measurer)
+    draw_straight(straight, tree, display)
+    return optimize(display, passes)
+
+def draw_straight(straight, tree, drawer, viewport = None):
+    'Like draw_radial, with a layout from layout.straight_layout.'
+    drawer.create(straight.height, straight.width)
+    nodes = tree.get_all_nodes()
+    visible = get_visible(straight, viewport)
 
     # draw the leaves
-    x = margin + tree_width + gap
-    for (ix, leaf) in enumerate(leaves):
-        y = margin + scale_height + gap * ix + text_height * (ix + 1)
-        drawer.draw_text((x, y), leaf.get_label(), 0, leaf.textcolor)
+    for (ix, leaf) in enumerate(straight.leaves):
+        if visible is None or leaf in visible:
+            drawer.owner = leaf
+            draw_straight_leaf(straight, drawer, nodes, ix)
 
     # draw the tree
-    right_edge = margin + tree_width
-    vstep = text_height + gap
-    hstep = float(tree_width) / biggest # use biggest to match scale line
-    y = int(round(margin + scale_height + 0.5 * tree_height))
-    hpos = biggest - (tree.get_distance_height() if tree.get_distance() != None else (tree.get_height() + 1))
-    draw_straight_node(drawer, tree, margin, y, hpos, vstep, hstep, right_edge)
+    for ix in (range(len(nodes)) if visible is None else sorted(visible)):
+        drawer.owner = ix
+        draw_straight_node(straight, drawer, nodes, ix)
+    drawer.owner = NO_OWNER
 
     # draw the scale (if we have distances in the tree)
-    if draw_scale:
-        btmy = margin + scale_height
-        drawer.line((margin, btmy), (margin + tree_width, btmy))
-        v = biggest
-        while v >= 0.0:
-            x = margin + int(round((1.0 - (v / biggest)) * tree_width))
+    if straight.ticks:
+        margin = straight.margin
+        gap = straight.gap
+        btmy = margin + straight.scale_height
+        drawer.line((margin, btmy), (margin + straight.tree_width, btmy))
+        for (x, txt, textx) in straight.ticks:
             drawer.line((x, btmy), (x, btmy - gap * 3))
-
-            txt = nicely_float_to_str(v)
-            w2 = int(round(drawer.get_text_size(txt)[1] / 2.0))
-            drawer.draw_text((x - w2, btmy - gap * 4), txt)
-
-            v -= increment
-
-    drawer.save()
-
-def does_tree_have_distances(tree):
-    if tree.get_distance() != None:
-        return True
-
-    # sometimes the root doesn't have a distance, but the other nodes do.
-    # we handle that here
-    if all([c.get_distance() != None for c in tree.get_children()]):
-        # so all the children of the root have distances
-        tree._distance = (sum([c.get_distance() for c in tree.get_children()]) / float(len(tree.get_children())))
-        return True
-
-def nicely_float_to_str(v):
-    return str(Decimal(str(v)).quantize(Decimal('0.1')))
-
-# 0 is assumed smallest
-def calibrate_scale(topval):
-    #scale = 10 # factor to get to 1.0
-    scale = 1.0 / topval
-
-    biggest = math.ceil(topval * scale) / scale # largest number on scale
-    increments = 1.0 / scale
-    return (biggest, increments)
-
-def draw_straight_node(drawer, node, margin, y, depth, vstep, hstep, right_edge):
-    dist = node.get_distance() if node.get_distance() != None else 1.0
+            drawer.draw_text((textx, btmy - gap * 4), txt)
+
+def draw_straight_leaf(straight, drawer, nodes, pos):
+    'Draws the label of the leaf at pos in straight.leaves.'
+    node = nodes[straight.leaves[pos]]
+    drawer.draw_text((straight.text_x, straight.text_y[pos]),
+                     node.get_label(), 0, node.textcolor)
+
+def draw_straight_node(straight, drawer, nodes, ix):
+    'Draws the line from the parent, and the branch of the node.'
+    node = nodes[ix]
+    y = straight.y[ix]
+    parent = straight.parents[ix]
+    if parent != -1:
+        x = straight.right[parent]
+        drawer.line((x, straight.y[parent]), (x, y), stroke = node.linestroke,
+                    color = node.linecolor)
 
     # adjust by linestroke to make overlaps look better
-    x1 = (margin + depth * hstep) - (node.linestroke / 2.0)
-    x2 = margin + (depth + dist) * hstep
+    x1 = straight.left[ix] - (node.linestroke / 2.0)
+    x2 = straight.right[ix]
     drawer.line((x1, y), (x2, y),
                 stroke = node.linestroke, color = node.linecolor)
 
-    # this is the top of the vertical area the children fill
-    depth += dist
-    cy = y - int(round(vstep * len(node.get_leaves()) / 2))
-    for child in node.get_children():
-        ydelta = int(round(vstep * len(child.get_leaves()) / 2))
-        cy += ydelta
-        drawer.line((x2, y), (x2, cy), stroke = child.linestroke,
-                color = child.linecolor)
-        draw_straight_node(drawer, child, margin, cy, depth, vstep, hstep, right_edge)
-
-        cy += ydelta
-
-    if not node.get_children():
-        drawer.line((x2, y), (right_edge, y), stroke = node.linestroke,
+    if not node.has_children():
+        drawer.line((x2, y), (straight.right_edge, y), stroke = node.linestroke,
                     color = node.linecolor)
@@ -1,5 +1,6 @@
 
 from sprake import style
+from benchmarks import reference
 
 def test_color_1():
     color = style.parse_color('#4dab4d')
@@ -8,3 +9,44 @@ def test_color_1():
 def test_color_2():
     color = style.parse_color('#b3059e')
     assert '#b3059e' == color.to_html_rgb()
+
+def test_compiled_rules_keep_order():
+    rules = [
+        style.AllRule('linewidth', '3'),
+        style.EqualsRule('Clade', 'Bread', 'textcolor', style.WHITE),
+        style.EqualsRule('Source', 'Soil', 'textcolor', style.BLACK),
+        style.EqualsRule('Clade', 'Bread', 'linewidth', '5'),
+    ]
+    index = style.compile_rules(rules)
+    setters = index.get_setters({'Clade' : 'Bread', 'Source' : 'Soil'})
+    assert [order for (order, setter) in setters] == [0, 1, 2, 3]
+    assert [order for (order, setter) in index.get_setters({'Clade' : 'Ale'})] == [0]
+    assert [order for (order, setter) in index.get_setters(None)] == [0]
+
+def test_sets_labels():
+    rules = [style.EqualsRule('Clade', 'Bread', 'textcolor', style.WHITE)]
+    assert not style.compile_rules(rules).sets_labels()
+    rules.append(style.AllRule('label', 'Name'))
+    assert style.compile_rules(rules).sets_labels()
+
+def test_indexed_engine_matches_naive():
+    import csv
+    from sprake import newick
+
+    results = []
+    for engine in (style.apply_rules, reference.apply_rules_naive):
+        tree = newick.parse_string(open('examples/scer-x-skud.nwk').read())
+        rules = style.parse_style('examples/scer-x-skud.style')
+        data_by_id = {row['ID'] : row for row in
+                      csv.DictReader(open('examples/scer-x-skud.csv'))}
+        (text_legend, dot_legend) = engine(tree, rules, data_by_id)
+        results.append((sorted(text_legend), sorted(dot_legend), [
+            (node.get_label(), html(node.textcolor), html(node.linecolor),
+             node.linestroke, html(node.dotcolour))
+            for node in tree.iter_preorder()
+        ]))
+
+    assert results[0] == results[1]
+
+def html(color):
+    return color and color.to_html_rgb()
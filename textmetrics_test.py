@@ -0,0 +1,38 @@
+
+from sprake import textmetrics
+from sprake.draw_svg import SVGDrawer, estimate_char_width, CHAR_WIDTHS
+
+def test_cached():
+    metrics = textmetrics.TextMetrics()
+    calls = []
+    def measure(text):
+        calls.append(text)
+        return (10, len(text))
+
+    assert metrics.get_text_size('font', 'abc', measure) == (10, 3)
+    assert metrics.get_text_size('font', 'abc', measure) == (10, 3)
+    assert metrics.get_text_size('other', 'abc', measure) == (10, 3)
+    assert calls == ['abc', 'abc']
+
+def test_bounded():
+    metrics = textmetrics.TextMetrics(max_entries = 2)
+    measure = lambda text: (1, len(text))
+    for text in ('a', 'bb', 'a', 'ccc'):
+        metrics.get_text_size('font', text, measure)
+
+    assert len(metrics) == 2
+    # 'bb' was least recently used, so it's the one that went
+    calls = []
+    metrics.get_text_size('font', 'a', lambda text: calls.append(text))
+    assert calls == []
+
+def test_char_width_table():
+    for ch in 'AOMi5_ (x#':
+        assert CHAR_WIDTHS[ch] == estimate_char_width(ch)
+
+def test_svg_text_size(tmp_path):
+    drawer = SVGDrawer(str(tmp_path / 'dummy.svg'), 10)
+    (height, width) = drawer.get_text_size('Ail')
+    assert height == 10
+    assert abs(width - (10 * (0.75 + 0.2 + 0.2) + 2 * 0.06 * 10)) < 0.000001
+    assert drawer.get_text_size('Bøø') == drawer.get_text_size('Bøø')
@@ -1,5 +1,106 @@
 
-from sprake import treeviz
+import gzip, io, os
+from sprake import newick, treeviz
 
 # we don't actually have any meaningful tests that we can do, but at least
 # we can do this
+
+def test_render_deep_tree(tmp_path):
+    depth = 3000
+    data = '(' * depth + 'L0' + ''.join([',L%s:1)' % ix for ix in range(1, depth + 1)]) + ';'
+    tree = newick.parse_string(data)
+    tree.upmerge_linestyle()
+
+    treeviz.render_tree(os.path.join(tmp_path, 'tree.svg'), tree)
+    treeviz.render_straight(os.path.join(tmp_path, 'straight.svg'), tree)
+
+def test_render_formats_matches_single(tmp_path):
+    data = open('examples/scer-x-skud.nwk').read()
+    for (single, multi) in [(treeviz.render_tree, treeviz.render_tree_formats),
+                            (treeviz.render_straight, treeviz.render_straight_formats)]:
+        single(str(tmp_path / 'single.svg'), newick.parse_string(data))
+        targets = [(str(tmp_path / 'multi.svg'), 'SVG'),
+                   (str(tmp_path / 'multi.pdf'), 'PDF'),
+                   (str(tmp_path / 'multi.png'), 'PNG')]
+        multi(targets, newick.parse_string(data))
+
+        assert open(str(tmp_path / 'multi.svg')).read() == \
+            open(str(tmp_path / 'single.svg')).read()
+        assert os.path.getsize(str(tmp_path / 'multi.pdf')) > 0
+        assert os.path.getsize(str(tmp_path / 'multi.png')) > 0
+
+def test_render_in_memory(tmp_path):
+    data = open('examples/scer-x-skud.nwk').read()
+    for render in (treeviz.render_tree, treeviz.render_straight):
+        for format in ('SVG', 'PNG', 'PDF'):
+            filename = str(tmp_path / ('tree.' + format.lower()))
+            assert render(filename, newick.parse_string(data), format = format) is None
+            output = render(None, newick.parse_string(data), format = format)
+            if format == 'PDF': # it has the time in it
+                assert output.startswith(b'%PDF')
+            else:
+                assert output == open(filename, 'rb').read(), format
+
+        # file objects are written to, and left open
+        svg = open(str(tmp_path / 'tree.svg')).read()
+        text = io.StringIO()
+        render(text, newick.parse_string(data))
+        assert text.getvalue() == svg
+        compressed = io.BytesIO()
+        render(compressed, newick.parse_string(data), format = 'SVGZ')
+        assert gzip.decompress(compressed.getvalue()).decode('utf-8') == svg
+        compact = io.BytesIO()
+        render(compact, newick.parse_string(data),
+               drawer_options = {'compact' : True})
+        assert compact.getvalue().startswith(b'<svg')
+
+    targets = [(None, 'SVG'), (str(tmp_path / 'multi.png'), 'PNG'), (None, 'PNG')]
+    outputs = treeviz.render_tree_formats(targets, newick.parse_string(data))
+    assert outputs[0] == treeviz.render_tree(None, newick.parse_string(data))
+    assert outputs[1] is None
+    assert outputs[2] == open(str(tmp_path / 'multi.png'), 'rb').read()
+
+def test_render_tiles_matches_png(tmp_path):
+    # the most detailed level, stitched together, is the PNG. arcs end a
+    # pixel off here and there, since PIL rounds them differently
+    import json
+    from PIL import Image, ImageChops
+
+    data = open('examples/scer-x-skud.nwk').read()
+    for render in (treeviz.render_tree, treeviz.render_straight):
+        png = os.path.join(tmp_path, 'tree.png')
+        tiles = os.path.join(tmp_path, 'tiles')
+        render(png, newick.parse_string(data), format = 'PNG')
+        render(tiles, newick.parse_string(data), format = 'TILES',
+               drawer_options = {'tile_size' : 64})
+
+        info = json.load(open(os.path.join(tiles, 'tiles.json')))
+        size = info['tile_size']
+        full = Image.open(png).convert('RGB')
+        stitched = Image.new('RGB', full.size, (255, 255, 255))
+        level = os.path.join(tiles, str(info['levels'] - 1))
+        for col in os.listdir(level):
+            for name in os.listdir(os.path.join(level, col)):
+                tile = Image.open(os.path.join(level, col, name))
+                stitched.paste(tile, (int(col) * size, int(name[ : -4]) * size))
+
+        assert os.path.exists(os.path.join(tiles, '0', '0', '0.png'))
+        diff = ImageChops.difference(stitched, full).convert('L')
+        assert diff.histogram()[0] > full.width * full.height * 0.995
+
+def test_arcs_drawn_after_children(tmp_path):
+    # like the recursive drawing did: the branches in preorder, and the arc
+    # joining the children of a node after them
+    from sprake import displaylist, layout
+    from sprake.draw_svg import SVGDrawer
+    tree = newick.parse_string('((A:1,B:1):1,C:1);')
+    measurer = SVGDrawer(str(tmp_path / 'dummy.svg'), 12)
+    radial = layout.radial_layout(tree, measurer)
+    display = treeviz.build_radial(radial, tree, measurer)
+
+    tree_ops = [(display.ops[ix], display.owners[ix]) for ix in range(len(display))
+                if display.ops[ix] in (displaylist.LINE, displaylist.ARC)]
+    assert tree_ops == [(displaylist.LINE, 0), (displaylist.LINE, 1),
+                        (displaylist.LINE, 2), (displaylist.LINE, 3),
+                        (displaylist.ARC, 1), (displaylist.LINE, 4),
+                        (displaylist.ARC, 0)]